@@ -1,13 +1,81 @@
 import copy
-import itertools
 
-from puzzle import SolutionError, DIGITS, BANDS, ROW_ITER, COL_ITER, BLOCK_ITER
+from puzzle import SolutionError, ALL_CANDIDATES, BIT_INDEX, DIGIT_MASKS, POPCOUNT, UNITS, CELL_POSITIONS, PEERS, \
+    UNIT_PEERS, lowest_bit
+
+UNIT_TYPES = {'row': 0, 'column': 1, 'block': 2}
+
+
+def propagate(puzzle, solved):
+    """Remove the values of solved cells from the candidate masks of their peers.
+
+    This is the propagation core every technique shares. Peers solved along the way are pushed onto the worklist
+    and their values removed from their own peers in turn, so long chains of singles don't recurse.
+
+    :param puzzle: Puzzle object
+    :param solved: list of flat indices of solved cells whose peers need updating. Used as the worklist and left
+                   empty
+    :raise SolutionError: if a peer is left without candidates
+    """
+    masks = puzzle.masks
+    remove_candidates = puzzle.remove_candidates
+    while solved:
+        index = solved.pop()
+        mask = masks[index]
+        for peer in PEERS[index]:
+            if masks[peer] & mask and POPCOUNT[remove_candidates(peer, mask)] == 1:
+                solved.append(peer)
+
+
+def remove_from_peers(puzzle, peers, mask):
+    """Remove a solved cell's value from the candidate masks of its peers.
+
+    If removing a candidate solves a peer, that peer's peers are updated too, see propagate().
+
+    :param puzzle: Puzzle object
+    :param peers: list of flat cell indices to update
+    :param mask: candidate mask of the solved value
+    """
+    masks = puzzle.masks
+    solved = []
+    for peer in peers:
+        if masks[peer] & mask and POPCOUNT[puzzle.remove_candidates(peer, mask)] == 1:
+            solved.append(peer)
+    propagate(puzzle, solved)
+
+
+def eliminate(puzzle, index, mask, technique=None):
+    """Remove candidates from a cell's candidate mask and update the cell's peers if that solves it.
+
+    :param puzzle: Puzzle object
+    :param index: flat index of the cell, 0-80
+    :param mask: candidate mask of the values to remove
+    :param technique: optional name of the technique to count the eliminations for in puzzle.stats
+    """
+    if puzzle.masks[index] & mask:
+        if technique and puzzle.stats is not None:
+            puzzle.stats.technique = technique
+        if POPCOUNT[puzzle.remove_candidates(index, mask)] == 1:
+            propagate(puzzle, [index])
+
+
+def assign(puzzle, index, val):
+    """Solve a cell with a value and remove the value from the cell's peers.
+
+    :param puzzle: Puzzle object
+    :param index: flat index of the cell, 0-80
+    :param val: candidate mask of the value
+    :raise SolutionError: if the value isn't a candidate of the cell, or removing it from the peers leaves one
+                          without candidates
+    """
+    puzzle.set_candidates(index, val)
+    propagate(puzzle, [index])
 
 
 def update_peers(puzzle, row, col, val, unit_type=''):
     """Remove a value from the candidate lists of a cell's peers.
 
-    If removing a candidate solves a cell, recursively update that cell's peers.
+    If removing a candidate solves a cell, that cell's peers are updated too, see propagate().
 
     :param puzzle: Puzzle object
     :param row: int identifying the row the cell is in
@@ -15,46 +83,12 @@ def update_peers(puzzle, row, col, val, unit_type=''):
     :param val: The value that needs to be removed from the cell's peers
     :param unit_type: Optional str argument to only update one of the cell's units. Either 'row', 'column', or 'block'
     """
-    # Rows #
-    if unit_type == '' or unit_type == 'row':
-        for inner_row, inner_col in ROW_ITER[row]:
-            if inner_col != col:
-                cell = puzzle.cell_array[inner_row][inner_col]
-                previously_solved = cell.is_solved()
-                cell.remove_candidate(val)
-                if cell.is_solved() and not previously_solved:
-                    update_peers(puzzle, inner_row, inner_col, cell.last_candidate())
-
-    # Columns #
-    if unit_type == '' or unit_type == 'column':
-        for inner_row, inner_col in COL_ITER[col]:
-            if inner_row != row:
-                cell = puzzle.cell_array[inner_row][inner_col]
-                previously_solved = cell.is_solved()
-                cell.remove_candidate(val)
-                if cell.is_solved() and not previously_solved:
-                    update_peers(puzzle, inner_row, inner_col, cell.last_candidate())
-
-    # Blocks #
-    if unit_type == '' or unit_type == 'block':
-        rows, cols = [], []
-        for horizontal_band in BANDS:
-            if row in horizontal_band:
-                rows = horizontal_band[:]
-                break
-        for vertical_band in BANDS:
-            if col in vertical_band:
-                cols = vertical_band[:]
-                break
-        # 4 of the cells in the block were updated with the row and column. Don't update again
-        rows.remove(row)
-        cols.remove(col)
-        for x_pos, y_pos in itertools.product(rows, cols):
-            cell = puzzle.cell_array[x_pos][y_pos]
-            previously_solved = cell.is_solved()
-            cell.remove_candidate(val)
-            if cell.is_solved() and not previously_solved:
-                update_peers(puzzle, x_pos, y_pos, cell.last_candidate())
+    index = row * 9 + col
+    if unit_type == '':
+        peers = PEERS[index]
+    else:
+        peers = UNIT_PEERS[index][UNIT_TYPES[unit_type]]
+    remove_from_peers(puzzle, peers, DIGIT_MASKS[val])
 
 
 def update_clue_peers(puzzle):
@@ -64,10 +98,31 @@ def update_clue_peers(puzzle):
 
     :param puzzle: Puzzle object
     """
-    for row, col in itertools.product(range(9), range(9)):
-        if puzzle.cell_array[row][col].is_solved():
-            val = puzzle.cell_array[row][col].last_candidate()
-            update_peers(puzzle, row, col, val)
+    if puzzle.stats is not None:
+        puzzle.stats.technique = 'clues'
+    masks = puzzle.masks
+    propagate(puzzle, [index for index in range(81) if POPCOUNT[masks[index]] == 1])
+
+
+def _solve_hidden_single(puzzle, slot):
+    """Solve the cell holding a hidden single, if the single is still there.
+
+    :param puzzle: Puzzle object
+    :param slot: index into puzzle.positions of the (unit, digit) pair
+    :raise SolutionError: if the digit has no place left in the unit
+    """
+    places = puzzle.positions[slot]
+    if POPCOUNT[places] != 1:
+        if not places:
+            raise SolutionError()
+        return
+    unit_index, digit = divmod(slot, 9)
+    index = UNITS[unit_index][BIT_INDEX[places]]
+    val = 1 << digit
+    if puzzle.masks[index] != val:
+        if puzzle.stats is not None:
+            puzzle.stats.technique = 'hidden_singles'
+        assign(puzzle, index, val)
 
 
 def find_hidden_singles(puzzle):
@@ -77,94 +132,134 @@ def find_hidden_singles(puzzle):
 
     :param puzzle: Puzzle object
     """
-    for unit_type in [ROW_ITER, COL_ITER, BLOCK_ITER]:
-        for unit in unit_type:
-            for val in DIGITS:
-                potential_single = None
-                for row, col in unit:
-                    cell = puzzle.cell_array[row][col]
-                    cell_solved = cell.is_solved()
+    for slot in range(len(puzzle.positions)):
+        _solve_hidden_single(puzzle, slot)
 
-                    # Check if the value is already solved. If it is, break and look at next value
-                    if cell_solved and cell.last_candidate() == val:
-                        break
 
-                    if cell_solved or val not in cell.candidates:
-                        continue
+def basic_solve(puzzle):
+    """Solve puzzle using a non-recursive technique, finding hidden singles.
 
-                    if not potential_single:
-                        potential_single = cell
-                    else:  # more than one cell can be val. break to next value
-                        potential_single = None
-                        break
+    The puzzle queues a (unit, digit) pair on puzzle.hidden_singles the moment the digit's count of places in the
+    unit drops to 1, so only those pairs are examined. Solving a single can queue more, so this runs until the
+    queue is empty.
 
-                if potential_single:
-                    single = potential_single
-                    single.set_cell(val)
-                    update_peers(puzzle, single.POS[0], single.POS[1], single.last_candidate())
+    :param puzzle: Puzzle object
+    :raise SolutionError: if a digit has no place left in a unit
+    """
+    hidden_singles = puzzle.hidden_singles
+    while hidden_singles:
+        _solve_hidden_single(puzzle, hidden_singles.pop())
+    puzzle.changed = False
 
 
-def basic_solve(puzzle):
-    """Solve puzzle using a non-recursive technique, finding hidden singles.
+def fewest_places(puzzle, index):
+    """Tie-break for guess_and_check(). Score a cell by the fewest places any of its candidates has left in the cell's
+    units, so the search branches where a digit is closest to being forced.
 
     :param puzzle: Puzzle object
+    :param index: index of an unsolved cell
+    :return: int, lower is branched on first
+    """
+    positions = puzzle.positions
+    row_slot, _, col_slot, _, block_slot, _ = CELL_POSITIONS[index]
+    fewest = 9
+    candidates = puzzle.masks[index]
+    while candidates:
+        val = candidates & -candidates
+        candidates ^= val
+        digit = BIT_INDEX[val]
+        places = min(POPCOUNT[positions[row_slot + digit]], POPCOUNT[positions[col_slot + digit]],
+                     POPCOUNT[positions[block_slot + digit]])
+        # a digit with one place is a hidden single, so two is as few as there can be
+        if places == 2:
+            return 2
+        if places < fewest:
+            fewest = places
+    return fewest
+
+
+def _choose_cell(puzzle, tie_break=None):
+    """Return the index of the unsolved cell to branch on, or None if every cell is solved.
+
+    The cell has the fewest candidates of any unsolved cell. puzzle.buckets keeps the cells grouped by candidate
+    count, so finding them doesn't scan the board. Ties go to the lowest index, or to the lowest tie_break() score.
     """
-    while puzzle.changed:
-        puzzle.changed = False
+    cells = puzzle.fewest_candidates()
+    if not cells:
+        return None
+    if not tie_break:
+        return min(cells)
+    best_index = None
+    best_score = None
+    for index in sorted(cells):
+        score = tie_break(puzzle, index)
+        if best_score is None or score < best_score:
+            best_index = index
+            best_score = score
+    return best_index
 
-        find_hidden_singles(puzzle)
-        puzzle.check()
 
+def guess_and_check(puzzle, recursed_into=False, use_trail=True, prune=None, tie_break=fewest_places):
+    """Solve puzzle with a depth first search, assigning each candidate of an unsolved cell in turn and backing out
+    of the ones which result in errors.
 
-def guess_and_check(puzzle, recursed_into=False):
-    """Solve puzzle by assigning a random valid value to unsolved cells and removing candidates which result in errors.
+    The search branches on the unsolved cell with the fewest candidates, see _choose_cell(). Each guess is spent
+    from puzzle.budget if it is set.
 
     :param puzzle: Puzzle object
-    :param recursed_into: bool identifying this as a top level or recursive call
-    :return: solved Puzzle object or None if puzzle still unsolved
+    :param recursed_into: bool identifying this as a top level or recursive call. Unused by the search itself
+    :param use_trail: True to make guesses on the puzzle itself and rewind its trail when they fail,
+                      False to make each guess on a deepcopy of the puzzle
+    :param prune: optional function called with the puzzle after each guess's hidden singles have been found,
+                  to remove more candidates before guessing again, e.g. extra_algorithms.find_sets
+    :param tie_break: function called with the puzzle and a cell index to choose between cells with
+                      equally few candidates, lowest score first, or None to choose the lowest index
+    :return: solved Puzzle object or None if puzzle has no solution
+    :raise BudgetExceeded: if the search runs past puzzle.budget. The puzzle is left partly searched
     """
-    # guess_and_check() is always called after basic_solve, which always exits with puzzle.changed == False
-    puzzle.changed = True
-    while puzzle.changed:
-        puzzle.changed = False
-        checked_cells = set()
-        longest_list = 1
-        # min_list_length is used to begin guessing and checking on cells with the smallest candidate lists
-        for min_list_length in range(2, 9+1):
-            # Efficient way to check if all cells have been checked
-            # Largest list length will have been found after first pass through when min_list_length == 2
-            if min_list_length > longest_list and min_list_length > 2:
-                break
-            for row, col in itertools.product(range(9), repeat=2):
-                cell = puzzle.cell_array[row][col]
-                list_length = len(cell.candidates)
-                if list_length > longest_list:
-                    longest_list = len(cell.candidates)
-                if not cell.is_solved() and list_length <= min_list_length and cell not in checked_cells:
-                    checked_cells.add(cell)
-                    bad_vals = ''
-                    for val in cell.candidates:
-                        # if all checked values are bad except last one, last value must be good unless in recursion
-                        if not recursed_into and list_length - len(bad_vals) == 1:
-                            break
-                        puzzle_copy = copy.deepcopy(puzzle)
-                        copied_cell = puzzle_copy.cell_array[row][col]
-                        copied_cell.set_cell(val)
-                        try:
-                            update_peers(puzzle_copy, row, col, val)
-                            basic_solve(puzzle_copy)
-                            solved_puzzle = guess_and_check(puzzle_copy, recursed_into=True)
-                            # guess_and_check returns None if the puzzle wasn't solved
-                            if solved_puzzle:
-                                return solved_puzzle
-                        except SolutionError:
-                            bad_vals += val
-                    if len(bad_vals) > 0:
-                        for val in bad_vals:
-                            cell.remove_candidate(val)
-                        if cell.is_solved():
-                            update_peers(puzzle, cell.POS[0], cell.POS[1], cell.last_candidate())
-                        basic_solve(puzzle)
-                        if puzzle.solved:
-                            return puzzle
-    return None
+    index = _choose_cell(puzzle, tie_break)
+    if index is None:
+        return puzzle
+    stats = puzzle.stats
+    budget = puzzle.budget
+    if stats is not None:
+        stats.depth += 1
+        if stats.depth > stats.max_depth:
+            stats.max_depth = stats.depth
+    solved_puzzle = None
+    candidates = puzzle.masks[index]
+    try:
+        while candidates:
+            val = lowest_bit(candidates)
+            candidates ^= val
+            if budget is not None:
+                budget.spend()
+            if use_trail:
+                checkpoint = puzzle.checkpoint()
+                guess = puzzle
+            else:
+                guess = copy.deepcopy(puzzle)
+            if stats is not None:
+                stats.guesses += 1
+                stats.technique = 'guesses'
+            try:
+                assign(guess, index, val)
+                basic_solve(guess)
+                if prune:
+                    prune(guess)
+                solved_puzzle = guess_and_check(guess, recursed_into=True, use_trail=use_trail, prune=prune,
+                                                tie_break=tie_break)
+                # guess_and_check returns None if the guess has no solution
+                if solved_puzzle:
+                    break
+            except SolutionError:
+                if stats is not None:
+                    stats.errors += 1
+            if stats is not None:
+                stats.failed_branches += 1
+            if use_trail:
+                puzzle.rewind(checkpoint)
+    finally:
+        if stats is not None:
+            stats.depth -= 1
+    return solved_puzzle
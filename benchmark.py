@@ -1,7 +1,42 @@
+import concurrent.futures
+import gc
+import json
+import math
+import multiprocessing
+import os
+import platform
+import random
+import statistics
+import sys
 import time
 
+# peak RSS is only read on Unix, so the timing benchmarks work without it
+try:
+    import resource
+except ImportError:
+    resource = None
+
+import algorithms as alg
+import dlx
+import parsing
+import puzzle as pzl
 import sudoku_solver
 
+SAMPLE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'sample_puzzles')
+# Phases of a solve, in the order they run. 'total' is added to the results as their sum.
+PHASES = ['parse', 'clues', 'basic_solve', 'search']
+QUANTILES = {'median': 0.5, 'p95': 0.95, 'p99': 0.99}
+# z score of a two sided 95% confidence interval
+Z_95 = 1.96
+# Puzzles whose phase took less than this in the baseline, in nanoseconds, are left out of the regression check of
+# that phase, since a few microseconds of noise is a big fraction of them
+MIN_PHASE_NS = 50000
+# Number of resamples of the puzzles in the bootstrap confidence interval of a suite's slowdown, see compare()
+BOOTSTRAP_RESAMPLES = 2000
+# What the memory benchmark does with a batch file's puzzles: build a Puzzle of each and keep them all, or solve
+# them one at a time
+MEMORY_MODES = ['load', 'solve']
+
 
 def validate_file(file):
     """Validate that the file exists and is a proper puzzle file.
@@ -12,69 +47,403 @@ def validate_file(file):
     :return True if the file passes all checks, False if it fails
     """
     try:
-        open_file = open(file)
-        file_contents = open_file.read()
-        puzzle_list = [char for char in file_contents if char.isdigit() or char == '.']
-        puzzle_string = ''.join(puzzle_list)
-        if len(puzzle_string) == 81:
-            clues = [char for char in puzzle_string if char != '.' and char != '0']
-            num_clues = len(clues)
-            if num_clues >= 17:
-                return True
-            else:
-                print('{} is an unsolvable puzzle. It has {} clues.\n'
-                      'There are no valid sudoku puzzles with fewer than 17 clues.'.format(file, num_clues))
-                return False
-        else:
-            print('{} in incorrect format.\nSee README.md for accepted puzzle formats.'.format(file))
-            return False
+        grid, num_clues = parsing.read_grid(file)
     except OSError:
         print('File {} not found.'.format(file))
         return False
+    if not grid:
+        print('{} in incorrect format.\nSee README.md for accepted puzzle formats.'.format(file))
+        return False
+    if num_clues < 17:
+        print('{} is an unsolvable puzzle. It has {} clues.\n'
+              'There are no valid sudoku puzzles with fewer than 17 clues.'.format(file, num_clues))
+        return False
+    return True
+
+
+def find_suites(paths=None):
+    """Group puzzle files into suites to be timed together.
+
+    :param paths: list of puzzle files and directories. Each directory is a suite of the files directly in it, and
+                  each file is a suite of its own. Defaults to sample_puzzles and each directory in it
+    :return: dict of suite name to a sorted list of file names
+    """
+    if not paths:
+        paths = [SAMPLE_DIR] + sorted(entry.path for entry in os.scandir(SAMPLE_DIR) if entry.is_dir())
+    suites = {}
+    for path in paths:
+        if os.path.isdir(path):
+            files = sorted(entry.path for entry in os.scandir(path) if entry.is_file())
+        else:
+            files = [path]
+        full_path = os.path.abspath(path)
+        name = os.path.relpath(full_path, os.path.dirname(SAMPLE_DIR)) if full_path.startswith(SAMPLE_DIR) else path
+        suites[name] = files
+    return suites
+
+
+def _lap(start):
+    """Return the nanoseconds since start, and the current perf_counter_ns() to time the next phase from."""
+    now = time.perf_counter_ns()
+    return now - start, now
+
+
+def time_solve(contents, method='guess', timeout=None, max_nodes=None):
+    """Solve the puzzle in a file's contents once, timing each phase with perf_counter_ns().
+
+    The phases mirror sudoku_solver.solve(). 'dlx' has no propagation phases, so its clues and basic_solve times
+    are 0.
+
+    :param contents: str holding the contents of a puzzle file
+    :param method: solving engine, see sudoku_solver.solve()
+    :param timeout: optional number of seconds the solve may take, see puzzle.Budget
+    :param max_nodes: optional number of guesses the search may make
+    :return: dict of phase name to nanoseconds, and True if the puzzle was solved, False if it wasn't, or None if
+             its search ran past its budget
+    """
+    times = dict.fromkeys(PHASES, 0)
+    start = time.perf_counter_ns()
+    puzzle = pzl.Puzzle(sudoku_solver.parse_line(contents))
+    if timeout is not None or max_nodes is not None:
+        puzzle.budget = pzl.Budget(timeout, max_nodes)
+    phase_start = time.perf_counter_ns()
+    times['parse'] = phase_start - start
+    phase = 'search'
+    solved = None
+    try:
+        if method != 'dlx':
+            phase = 'clues'
+            alg.update_clue_peers(puzzle)
+            times['clues'], phase_start = _lap(phase_start)
+            phase = 'basic_solve'
+            alg.basic_solve(puzzle)
+            times['basic_solve'], phase_start = _lap(phase_start)
+            phase = 'search'
+            if not puzzle.solved:
+                puzzle = alg.guess_and_check(puzzle)
+        else:
+            puzzle = dlx.solve(puzzle)
+        solved = bool(puzzle and puzzle.solved)
+    except pzl.SolutionError:
+        solved = False
+    except pzl.BudgetExceeded:
+        pass
+    # the phase that found the puzzle unsolvable, or gave up on it, is charged with the time it took
+    times[phase], _ = _lap(phase_start)
+    return times, solved
+
+
+def quantile(samples, q):
+    """Return the q quantile of a sorted list of samples, by the nearest rank method."""
+    return samples[min(len(samples) - 1, max(0, math.ceil(q * len(samples)) - 1))]
+
+
+def quantile_interval(samples, q, z=Z_95):
+    """Return a distribution free confidence interval for the q quantile of a sorted list of samples.
+
+    The number of samples below the quantile is binomial, so the interval's bounds are the samples at the ranks
+    z standard deviations either side of the expected rank.
+
+    :param samples: sorted list of samples
+    :param q: quantile, between 0 and 1
+    :param z: z score of the confidence level, defaults to 95%
+    :return: (low, high) samples
+    """
+    n = len(samples)
+    spread = z * math.sqrt(n * q * (1 - q))
+    low = max(0, math.floor(n * q - spread) - 1)
+    high = min(n - 1, math.ceil(n * q + spread) - 1)
+    return samples[low], samples[high]
+
+
+def summarize(samples):
+    """Return the mean, median, p95 and p99 of a list of nanosecond timings, with 95% confidence intervals."""
+    samples = sorted(samples)
+    summary = {'samples': len(samples), 'mean_ns': sum(samples) // len(samples)}
+    for name, q in QUANTILES.items():
+        summary[name + '_ns'] = quantile(samples, q)
+        summary[name + '_ci_ns'] = list(quantile_interval(samples, q))
+    return summary
+
+
+def run_suite(files, runs=20, warmup=3, method='guess', timeout=None, max_nodes=None):
+    """Time every puzzle of a suite.
+
+    Each puzzle is solved 'warmup' times untimed and then 'runs' times timed. Files that don't hold a valid puzzle
+    are skipped.
+
+    :param files: list of puzzle file names
+    :param runs: number of timed solves of each puzzle
+    :param warmup: number of untimed solves of each puzzle first
+    :param method: solving engine, see sudoku_solver.solve()
+    :param timeout: optional number of seconds each solve may take, see time_solve()
+    :param max_nodes: optional number of guesses each solve's search may make
+    :return: dict with the number of puzzles, the names of skipped files, the number of unsolvable puzzles, the
+             number of solves that ran past their budget, a summary of each phase's timings, see summarize(), and
+             the median of each phase of each puzzle, by file name, for compare()
+    """
+    puzzles = {}
+    skipped = []
+    for file_name in files:
+        if validate_file(file_name):
+            with open(file_name) as puzzle_file:
+                puzzles[os.path.basename(file_name)] = puzzle_file.read()
+        else:
+            skipped.append(os.path.basename(file_name))
+
+    samples = {phase: [] for phase in PHASES + ['total']}
+    puzzle_medians = {phase: {} for phase in samples}
+    unsolvable = 0
+    exceeded = 0
+    gc.collect()
+    for name, contents in puzzles.items():
+        for _ in range(warmup):
+            time_solve(contents, method, timeout, max_nodes)
+        puzzle_samples = {phase: [] for phase in samples}
+        for _ in range(runs):
+            times, solved = time_solve(contents, method, timeout, max_nodes)
+            for phase in PHASES:
+                puzzle_samples[phase].append(times[phase])
+            puzzle_samples['total'].append(sum(times.values()))
+            exceeded += solved is None
+        unsolvable += solved is False
+        for phase, phase_samples in puzzle_samples.items():
+            samples[phase].extend(phase_samples)
+            puzzle_medians[phase][name] = statistics.median_low(phase_samples)
+
+    result = {'puzzles': len(puzzles), 'skipped': skipped, 'unsolvable': unsolvable, 'exceeded': exceeded,
+              'phases': {}, 'puzzle_medians': {}}
+    if puzzles:
+        result['phases'] = {phase: summarize(phase_samples) for phase, phase_samples in samples.items()}
+        result['puzzle_medians'] = puzzle_medians
+    return result
 
 
-def main(file, num_tests):
-    """Time how long sudoku_solver takes to solve a puzzle."""
-    if not validate_file(file):
-        return
-    print('Timing {} over {} run(s)...'.format(file, num_tests))
-    start_time = time.time()
-    run_times = []
-    for _ in range(num_tests):
-        t_start = time.time()
-        sudoku_solver.main(file, quiet=True)
-        t_end = time.time()
-        run_times.append(t_end - t_start)
-    end_time = time.time()
-
-    total_time = end_time - start_time
-    print('Total time = {0:.4f}'.format(total_time))
-    if len(run_times) > 1:
-        max_time = max(run_times)
-        min_time = min(run_times)
-        avg_time = sum(run_times) / len(run_times)
-        print('Maximum runtime = {0:.4f}'.format(max_time))
-        print('Minimum runtime = {0:.4f}'.format(min_time))
-        print('Average runtime = {0:.4f}'.format(avg_time))
+def _bootstrap_interval(log_ratios, z=Z_95, resamples=BOOTSTRAP_RESAMPLES):
+    """Return a bootstrap confidence interval for the mean of a list of log ratios, resampling the list itself.
+
+    The resamples are drawn from a fixed seed, so the same results always give the same interval.
+
+    :return: (low, high) means
+    """
+    rng = random.Random(0)
+    n = len(log_ratios)
+    means = sorted(sum(rng.choices(log_ratios, k=n)) / n for _ in range(resamples))
+    tail = (1 - math.erf(z / math.sqrt(2))) / 2
+    return quantile(means, tail), quantile(means, 1 - tail)
+
+
+def compare(results, baseline, threshold=0.1):
+    """Find the suites and phases that got slower than a saved baseline.
+
+    Each puzzle's runs are reduced to its median first, since runs of the same puzzle aren't independent samples of
+    the suite. A phase's slowdown is the geometric mean of the ratios of each puzzle's median to its baseline median,
+    and it has regressed when that is more than 'threshold' slower and its bootstrap confidence interval over the
+    puzzles is above 1, so neither noise nor one slower puzzle flags it. Puzzles that took less than MIN_PHASE_NS in
+    the baseline phase are left out, and so are phases without any others.
+
+    :param results: benchmark results, see main()
+    :param baseline: benchmark results saved by an earlier run
+    :param threshold: fraction the suite has to slow down by
+    :return: list of (suite, phase, slowdown ratio, (low, high) 95% confidence interval of the ratio) tuples
+    """
+    regressions = []
+    for suite, result in results['suites'].items():
+        old_result = baseline['suites'].get(suite)
+        if not old_result:
+            continue
+        for phase, medians in result.get('puzzle_medians', {}).items():
+            old_medians = old_result.get('puzzle_medians', {}).get(phase, {})
+            log_ratios = [math.log(max(median, 1) / old_medians[name]) for name, median in medians.items()
+                          if old_medians.get(name, 0) >= MIN_PHASE_NS]
+            if not log_ratios:
+                continue
+            ratio = math.exp(sum(log_ratios) / len(log_ratios))
+            low, high = _bootstrap_interval(log_ratios)
+            if ratio > 1 + threshold and low > 0:
+                regressions.append((suite, phase, ratio, (math.exp(low), math.exp(high))))
+    return regressions
+
+
+def _peak_rss():
+    """Return the peak resident set size of the process so far, in bytes."""
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports kilobytes and macOS bytes
+    return peak if sys.platform == 'darwin' else peak * 1024
+
+
+def _measure_memory(batch_file, mode, method):
+    """Worker process function. Run one memory benchmark mode on a batch file, see memory_benchmark().
+
+    :return: number of puzzles, peak RSS after reading the puzzle strings, and peak RSS at the end, in bytes
+    """
+    with open(batch_file, 'rb') as puzzle_file:
+        puzzle_strings = [puzzle_string for puzzle_string in sudoku_solver.batch_puzzle_strings(puzzle_file)
+                          if puzzle_string]
+    gc.collect()
+    start = _peak_rss()
+    if mode == 'load':
+        puzzles = [pzl.Puzzle(puzzle_string) for puzzle_string in puzzle_strings]
+    else:
+        for puzzle_string in puzzle_strings:
+            sudoku_solver.solve(pzl.Puzzle(puzzle_string), method)
+    return len(puzzle_strings), start, _peak_rss()
+
+
+def memory_benchmark(batch_file, method='guess'):
+    """Measure the peak RSS of building and of solving the puzzles of a batch file.
+
+    Each mode runs in a fresh process, since a process's peak RSS never goes down. 'load' keeps a Puzzle of every
+    puzzle in the file, like a queue of work would, and 'solve' solves them one at a time.
+
+    :param batch_file: name of a batch file, see sudoku_solver.batch_main()
+    :param method: solving engine, see sudoku_solver.solve()
+    :return: dict of mode to a dict with the number of puzzles, the peak RSS after reading the file, the peak RSS
+             at the end, and the growth per puzzle, in bytes
+    """
+    if resource is None:
+        raise OSError('peak RSS can only be measured on Unix')
+    context = multiprocessing.get_context('spawn')
+    results = {}
+    for mode in MEMORY_MODES:
+        with concurrent.futures.ProcessPoolExecutor(1, context) as executor:
+            puzzles, start, peak = executor.submit(_measure_memory, batch_file, mode, method).result()
+        results[mode] = {
+            'puzzles': puzzles,
+            'start_rss_bytes': start,
+            'peak_rss_bytes': peak,
+            'bytes_per_puzzle': (peak - start) // max(puzzles, 1),
+        }
+    return results
+
+
+def print_memory(results):
+    """Print a table of the memory benchmark's results in megabytes."""
+    print('{:<8}{:>10}{:>14}{:>14}{:>18}'.format('mode', 'puzzles', 'start (MB)', 'peak (MB)', 'bytes/puzzle'))
+    for mode, result in results.items():
+        print('{:<8}{:>10}{:>14.1f}{:>14.1f}{:>18}'.format(
+            mode, result['puzzles'], result['start_rss_bytes'] / 2 ** 20, result['peak_rss_bytes'] / 2 ** 20,
+            result['bytes_per_puzzle']))
+
+
+def _ms(nanoseconds):
+    return '{0:.4f}'.format(nanoseconds / 1e6)
+
+
+def print_results(results):
+    """Print a table of each suite's phase timings in milliseconds."""
+    for suite, result in results['suites'].items():
+        print('{}: {} puzzle(s), {} run(s) each'.format(suite, result['puzzles'], results['runs']))
+        if result['skipped']:
+            print('  skipped: {}'.format(', '.join(result['skipped'])))
+        if result['unsolvable']:
+            print('  unsolvable: {}'.format(result['unsolvable']))
+        if result.get('exceeded'):
+            print('  budget exceeded: {} of {} solves'.format(result['exceeded'], result['puzzles'] * results['runs']))
+        if not result['phases']:
+            print()
+            continue
+        print('  {:<12}{:>10}{:>22}{:>10}{:>10}'.format('phase (ms)', 'median', '95% CI', 'p95', 'p99'))
+        for phase, summary in result['phases'].items():
+            low, high = summary['median_ci_ns']
+            print('  {:<12}{:>10}{:>22}{:>10}{:>10}'.format(
+                phase, _ms(summary['median_ns']), '{} - {}'.format(_ms(low), _ms(high)),
+                _ms(summary['p95_ns']), _ms(summary['p99_ns'])))
+        print()
+
+
+def main(paths=None, runs=20, warmup=3, method='guess', output=None, baseline=None, threshold=0.1, timeout=None,
+         max_nodes=None):
+    """Time the solver on suites of puzzles, and flag regressions against a saved baseline.
+
+    :param paths: puzzle files and directories, see find_suites()
+    :param runs: number of timed solves of each puzzle
+    :param warmup: number of untimed solves of each puzzle first
+    :param method: solving engine, see sudoku_solver.solve()
+    :param output: name of a file to save the results to as JSON
+    :param baseline: name of a JSON file saved by an earlier run to compare against
+    :param threshold: fraction a suite has to slow down by to be flagged, see compare()
+    :param timeout: optional number of seconds each solve may take, see time_solve()
+    :param max_nodes: optional number of guesses each solve's search may make
+    :return: True if no regressions were found
+    """
+    results = {
+        'python': platform.python_version(),
+        'method': method,
+        'runs': runs,
+        'warmup': warmup,
+        'timeout': timeout,
+        'max_nodes': max_nodes,
+        'suites': {},
+    }
+    for suite, files in find_suites(paths).items():
+        results['suites'][suite] = run_suite(files, runs, warmup, method, timeout, max_nodes)
+    print_results(results)
+
+    if output:
+        with open(output, 'w') as output_file:
+            json.dump(results, output_file, indent=2)
+            output_file.write('\n')
+
+    if baseline:
+        with open(baseline) as baseline_file:
+            regressions = compare(results, json.load(baseline_file), threshold)
+        for suite, phase, ratio, (low, high) in regressions:
+            print('REGRESSION {} {}: {:.2f}x slower per puzzle (95% CI {:.2f} - {:.2f})'.format(suite, phase, ratio,
+                                                                                                  low, high))
+        if regressions:
+            return False
+        print('No regressions against {}'.format(baseline))
+    return True
 
 
 if __name__ == '__main__':
     import argparse
 
     parser = argparse.ArgumentParser()
-    parser.add_argument('input', nargs='+', help='File(s) with sudoku puzzle')
-    parser.add_argument('-n', '--num-tests', type=int, default=20, help='Number of times to run solver, defaults to 20')
+    parser.add_argument('input', nargs='*',
+                        help='Puzzle file(s) or directories of them, defaults to each directory in sample_puzzles')
+    parser.add_argument('-n', '--num-tests', type=int, default=20,
+                        help='Number of times to time each puzzle, defaults to 20')
+    parser.add_argument('-w', '--warmup', type=int, default=3,
+                        help='Number of untimed runs of each puzzle before timing it, defaults to 3')
+    parser.add_argument('-m', '--method', choices=sudoku_solver.METHODS, default='guess',
+                        help='Solving engine, defaults to guess')
+    parser.add_argument('-o', '--output', help='Save the results to this file as JSON')
+    parser.add_argument('--baseline', help='JSON results of an earlier run to check for regressions against')
+    parser.add_argument('--threshold', type=float, default=0.1,
+                        help='Fraction a suite\'s puzzles have to slow down by, on average, to count as a '
+                             'regression, defaults to 0.1')
+    parser.add_argument('--memory', metavar='BATCH_FILE',
+                        help='Measure the peak RSS of building and of solving the puzzles of a batch file instead of '
+                             'timing puzzles')
+    parser.add_argument('-t', '--timeout', type=float,
+                        help='Seconds each solve may take before its search is given up on. Those solves are counted '
+                             'and timed up to the point they were stopped')
+    parser.add_argument('--max-nodes', type=int,
+                        help='Number of guesses each solve\'s search may make before it is given up on')
     arguments = parser.parse_args()
     if arguments.num_tests < 1:
         parser.error('num-tests must be greater than 0')
+    if arguments.warmup < 0:
+        parser.error('warmup can\'t be negative')
+    if arguments.timeout is not None and arguments.timeout <= 0:
+        parser.error('timeout must be greater than 0')
+    if arguments.max_nodes is not None and arguments.max_nodes < 0:
+        parser.error('max-nodes can\'t be negative')
+    if arguments.memory and (arguments.input or arguments.baseline):
+        parser.error('--memory can\'t be combined with input files or --baseline')
 
-    t0 = time.clock()
-    for infile in arguments.input:
-        print()
-        main(infile, arguments.num_tests)
-        print()
-    if len(arguments.input) > 1:
-        t1 = time.clock()
-        total = t1 - t0
-        print()
-        print('Total time for all tests = {0:.4f}'.format(total))
+    if arguments.memory:
+        try:
+            memory_results = memory_benchmark(arguments.memory, arguments.method)
+        except OSError as err:
+            parser.error(str(err))
+        print_memory(memory_results)
+        if arguments.output:
+            with open(arguments.output, 'w') as output_file:
+                json.dump(memory_results, output_file, indent=2)
+                output_file.write('\n')
+    elif not main(arguments.input, arguments.num_tests, arguments.warmup, arguments.method, arguments.output,
+                  arguments.baseline, arguments.threshold, arguments.timeout, arguments.max_nodes):
+        sys.exit(1)
@@ -0,0 +1,347 @@
+import geometry
+
+from puzzle import SolutionError
+
+# int.bit_count() is only in Python 3.10 and later
+try:
+    popcount = int.bit_count
+except AttributeError:
+    def popcount(mask):
+        return bin(mask).count('1')
+
+
+class Board:
+    """A sudoku puzzle of any geometry, see geometry.Geometry.
+
+    Board keeps the same state as puzzle.Puzzle, sized by its geometry: the cells' candidate masks in 'masks', the
+    places left for each (unit, value) pair in 'positions', the (unit, value) slots down to one place in
+    'hidden_singles', the trail of changes once checkpoint() has been called, and the puzzle.Budget the search is
+    limited by, if any, in 'budget'. Masks of big boards don't fit
+    Puzzle's lookup tables, so bits are counted and found with int methods instead.
+    """
+    __slots__ = ('geometry', 'masks', 'positions', 'hidden_singles', 'trail', 'budget')
+
+    def __init__(self, masks, board_geometry=geometry.STANDARD):
+        """Initialize the board.
+
+        :param masks: list of a candidate mask for each cell, see Geometry.parse()
+        :param board_geometry: Geometry of the board
+        """
+        self.geometry = board_geometry
+        self.masks = list(masks)
+        self.trail = None
+        self.budget = None
+        size = board_geometry.size
+        self.positions = positions = []
+        for unit in board_geometry.units:
+            places = [0] * size
+            for position, index in enumerate(unit):
+                mask = self.masks[index]
+                while mask:
+                    val = mask & -mask
+                    mask ^= val
+                    places[val.bit_length() - 1] |= 1 << position
+            positions.extend(places)
+        self.hidden_singles = [slot for slot, places in enumerate(positions) if popcount(places) <= 1]
+
+    @classmethod
+    def from_string(cls, text, board_geometry=geometry.STANDARD):
+        """Parse a board from text, see Geometry.parse().
+
+        :raise ValueError: if the text doesn't hold a puzzle of the geometry
+        """
+        masks = board_geometry.parse(text)
+        if masks is None:
+            raise ValueError('not a {0}x{0} puzzle'.format(board_geometry.size))
+        return cls(masks, board_geometry)
+
+    def __str__(self):
+        """Return the board as a str of one char per cell, '.' for unsolved cells."""
+        return self.geometry.format(self.masks)
+
+    @property
+    def solved(self):
+        """Return True if every cell is solved and no unit repeats a value."""
+        for mask in self.masks:
+            if not mask or mask & mask - 1:
+                return False
+        try:
+            self.check()
+            return True
+        except SolutionError:
+            return False
+
+    def check(self):
+        """Raise SolutionError if two solved cells in a unit share a value."""
+        masks = self.masks
+        for unit in self.geometry.units:
+            solved_vals = 0
+            for index in unit:
+                mask = masks[index]
+                if mask and not mask & mask - 1:
+                    if solved_vals & mask:
+                        raise SolutionError()
+                    solved_vals |= mask
+
+    def remove_candidates(self, index, mask):
+        """Remove the candidates in a mask from a cell's candidate mask, see Puzzle.remove_candidates().
+
+        :return: the cell's new candidate mask
+        :raise SolutionError: if the cell would be left without candidates, or a removed value would be left
+                              without a place in one of the cell's units
+        """
+        old_mask = self.masks[index]
+        removed = old_mask & mask
+        if not removed:
+            return old_mask
+        new_mask = old_mask ^ removed
+        if not new_mask:
+            raise SolutionError()
+        if self.trail is not None:
+            self.trail.append((index, old_mask))
+        self.masks[index] = new_mask
+
+        positions = self.positions
+        row_slot, row_bit, col_slot, col_bit, box_slot, box_bit = self.geometry.cell_positions[index]
+        while removed:
+            val = removed & -removed
+            removed ^= val
+            value = val.bit_length() - 1
+            for slot, bit in ((row_slot + value, row_bit), (col_slot + value, col_bit), (box_slot + value, box_bit)):
+                places = positions[slot] & ~bit
+                positions[slot] = places
+                if not places & places - 1:
+                    if not places:
+                        raise SolutionError()
+                    self.hidden_singles.append(slot)
+        return new_mask
+
+    def checkpoint(self):
+        """Start recording changes on the trail if it isn't already, and return a token for rewind()."""
+        if self.trail is None:
+            self.trail = []
+        return len(self.trail), self.hidden_singles[:]
+
+    def rewind(self, checkpoint):
+        """Undo every change recorded on the trail since checkpoint() returned the given token."""
+        trail_length, hidden_singles = checkpoint
+        trail = self.trail
+        masks = self.masks
+        positions = self.positions
+        cell_positions = self.geometry.cell_positions
+        while len(trail) > trail_length:
+            index, old_mask = trail.pop()
+            added = old_mask & ~masks[index]
+            masks[index] = old_mask
+            row_slot, row_bit, col_slot, col_bit, box_slot, box_bit = cell_positions[index]
+            while added:
+                val = added & -added
+                added ^= val
+                value = val.bit_length() - 1
+                positions[row_slot + value] |= row_bit
+                positions[col_slot + value] |= col_bit
+                positions[box_slot + value] |= box_bit
+        self.hidden_singles = hidden_singles[:]
+
+
+def propagate(board, solved):
+    """Remove the values of solved cells from their peers, and of the peers that solves in turn, see
+    algorithms.propagate().
+
+    :param board: Board object
+    :param solved: list of indices of solved cells, used as the worklist and left empty
+    :raise SolutionError: if a peer is left without candidates
+    """
+    masks = board.masks
+    peers = board.geometry.peers
+    remove_candidates = board.remove_candidates
+    while solved:
+        index = solved.pop()
+        mask = masks[index]
+        for peer in peers[index]:
+            if masks[peer] & mask:
+                new_mask = remove_candidates(peer, mask)
+                if not new_mask & new_mask - 1:
+                    solved.append(peer)
+
+
+def assign(board, index, val):
+    """Solve a cell with a value and remove the value from the cell's peers.
+
+    :raise SolutionError: if the value isn't a candidate of the cell, or the board is left without a solution
+    """
+    board.remove_candidates(index, board.masks[index] & ~val)
+    propagate(board, [index])
+
+
+def basic_solve(board):
+    """Solve the hidden singles queued on the board until there are none left, see algorithms.basic_solve().
+
+    :raise SolutionError: if a value has no place left in a unit
+    """
+    hidden_singles = board.hidden_singles
+    units = board.geometry.units
+    size = board.geometry.size
+    positions = board.positions
+    while hidden_singles:
+        slot = hidden_singles.pop()
+        places = positions[slot]
+        if places & places - 1:
+            continue
+        if not places:
+            raise SolutionError()
+        unit_index, value = divmod(slot, size)
+        index = units[unit_index][places.bit_length() - 1]
+        if board.masks[index] != 1 << value:
+            assign(board, index, 1 << value)
+
+
+def exclude_locked_candidates(board, start=0):
+    """Remove locked candidates, and solve the hidden singles that leaves, until there are none left.
+
+    A value whose places in a row or column all lie in one box can be removed from the rest of the box, and one
+    whose places in a box all lie in one row or column from the rest of that line. Only the (unit, value) pairs
+    that lost a place since the trail was at 'start' can have become locked, so only those are looked at, which
+    keeps this cheap enough to run after every guess.
+
+    :param board: Board object, recording changes on its trail
+    :param start: length of the trail when the pairs were last looked at
+    :raise SolutionError: if the board is left without a solution
+    """
+    board_geometry = board.geometry
+    size = board_geometry.size
+    cell_units = board_geometry.cell_units
+    intersections = board_geometry.intersections
+    trail = board.trail
+    masks = board.masks
+    positions = board.positions
+    remove_candidates = board.remove_candidates
+    while start < len(trail):
+        end = len(trail)
+        slots = set()
+        for index, old_mask in trail[start:end]:
+            removed = old_mask & ~masks[index]
+            while removed:
+                val = removed & -removed
+                removed ^= val
+                value = val.bit_length() - 1
+                for unit_index in cell_units[index]:
+                    slots.add(unit_index * size + value)
+        start = end
+        for slot in slots:
+            places = positions[slot]
+            if not places & places - 1:
+                continue
+            unit_index, value = divmod(slot, size)
+            for segment, cells in intersections[unit_index]:
+                if not places & ~segment:
+                    val = 1 << value
+                    for index in cells:
+                        if masks[index] & val:
+                            new_mask = remove_candidates(index, val)
+                            if not new_mask & new_mask - 1:
+                                propagate(board, [index])
+                    break
+        basic_solve(board)
+
+
+def _choose_branches(board):
+    """Return the guesses to branch on, or None if every cell is solved.
+
+    The guesses are either the candidates of the unsolved cell with the fewest candidates, or the places of the
+    (unit, value) pair with the fewest places left, whichever are fewer. Branching on places as well as cells keeps
+    the search narrow on big boards, where a value is often down to two places long before any cell is down to two
+    candidates.
+
+    :return: list of (cell index, candidate mask) guesses, exactly one of which is in any solution
+    """
+    best_index = None
+    best_count = board.geometry.size + 1
+    for index, mask in enumerate(board.masks):
+        if mask & mask - 1:
+            count = popcount(mask)
+            if count < best_count:
+                best_index = index
+                best_count = count
+                if count == 2:
+                    break
+    if best_index is None:
+        return None
+    mask = board.masks[best_index]
+    branches = []
+    while mask:
+        val = mask & -mask
+        mask ^= val
+        branches.append((best_index, val))
+    if best_count == 2:
+        return branches
+
+    best_slot = None
+    for slot, places in enumerate(board.positions):
+        if places & places - 1:
+            count = popcount(places)
+            if count < best_count:
+                best_slot = slot
+                best_count = count
+                if count == 2:
+                    break
+    if best_slot is None:
+        return branches
+    unit_index, value = divmod(best_slot, board.geometry.size)
+    unit = board.geometry.units[unit_index]
+    places = board.positions[best_slot]
+    branches = []
+    while places:
+        place = places & -places
+        places ^= place
+        branches.append((unit[place.bit_length() - 1], 1 << value))
+    return branches
+
+
+def guess_and_check(board):
+    """Solve a board with a depth first search, making each guess of _choose_branches() in turn and rewinding the
+    board's trail when one fails.
+
+    :param board: Board object, left solved if a solution is found
+    :return: True if the board was solved, False if it has no solution
+    :raise BudgetExceeded: if the search runs past board.budget
+    """
+    branches = _choose_branches(board)
+    if branches is None:
+        return True
+    budget = board.budget
+    for index, val in branches:
+        if budget is not None:
+            budget.spend()
+        checkpoint = board.checkpoint()
+        try:
+            assign(board, index, val)
+            basic_solve(board)
+            exclude_locked_candidates(board, checkpoint[0])
+            if guess_and_check(board):
+                return True
+        except SolutionError:
+            pass
+        board.rewind(checkpoint)
+    return False
+
+
+def solve(board, budget=None):
+    """Solve a board by propagating its clues, finding hidden singles and locked candidates, and then searching.
+
+    :param board: Board object
+    :param budget: optional puzzle.Budget to limit the search by
+    :return: the solved Board, or None if the board has no solution
+    :raise BudgetExceeded: if the search runs past the budget
+    """
+    board.budget = budget
+    start = board.checkpoint()[0]
+    try:
+        propagate(board, [index for index, mask in enumerate(board.masks) if not mask & mask - 1])
+        basic_solve(board)
+        exclude_locked_candidates(board, start)
+        if not guess_and_check(board):
+            return None
+    except SolutionError:
+        return None
+    return board if board.solved else None
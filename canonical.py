@@ -0,0 +1,196 @@
+import collections
+import itertools
+
+# Orderings of more candidate transforms than this aren't tried. Only very symmetric puzzles get near it
+MAX_CANDIDATES = 4096
+
+
+def _ranks(keys):
+    """Replace each key in a list with its rank among the distinct keys, so refined keys stay small."""
+    order = {key: rank for rank, key in enumerate(sorted(set(keys)))}
+    return [order[key] for key in keys]
+
+
+def _line_keys(grid):
+    """Return invariant keys for the rows and columns of a grid.
+
+    A key doesn't change when the puzzle's digits are relabeled or its rows and columns are permuted, so lines that
+    get different keys can't be swapped by a symmetry. The keys start from the number of times each line's clue
+    digits appear in the whole puzzle, and are refined twice with the keys of the lines crossing each clue.
+
+    :param grid: list of 81 ints, 0 for an unsolved cell
+    :return: lists of 9 row keys and 9 column keys
+    """
+    frequency = collections.Counter(grid)
+    weights = [frequency[value] if value else 0 for value in grid]
+    row_keys = _ranks([tuple(sorted(weights[row * 9:row * 9 + 9])) for row in range(9)])
+    col_keys = _ranks([tuple(sorted(weights[col::9])) for col in range(9)])
+    for _ in range(2):
+        row_keys, col_keys = (
+            _ranks([(row_keys[row], tuple(sorted((weights[row * 9 + col], col_keys[col]) for col in range(9))))
+                    for row in range(9)]),
+            _ranks([(col_keys[col], tuple(sorted((weights[row * 9 + col], row_keys[row]) for row in range(9))))
+                    for col in range(9)]),
+        )
+    return row_keys, col_keys
+
+
+def _orderings(keys):
+    """Return every order of 9 lines that sorts their bands and the lines within each band by key.
+
+    Bands are sorted by the sorted keys of their lines. Lines or bands with equal keys can go in any order, so an
+    ordering is given for each way of breaking the ties.
+
+    :param keys: list of 9 line keys, see _line_keys()
+    :return: list of orders, each a list of the 9 line indices
+    """
+    def tie_orders(items, key):
+        """Return every order of items sorted by key, with equal keys in any order."""
+        groups = [list(group) for _, group in itertools.groupby(sorted(items, key=key), key)]
+        return [list(itertools.chain.from_iterable(choice))
+                for choice in itertools.product(*[list(itertools.permutations(group)) for group in groups])]
+
+    band_key = [tuple(sorted(keys[band * 3:band * 3 + 3])) for band in range(3)]
+    band_orders = tie_orders(range(3), band_key.__getitem__)
+    line_orders = [tie_orders(range(band * 3, band * 3 + 3), keys.__getitem__) for band in range(3)]
+    return [list(itertools.chain.from_iterable(lines))
+            for bands in band_orders
+            for lines in itertools.product(*[line_orders[band] for band in bands])]
+
+
+def _relabel(values):
+    """Relabel the digits of a sequence of cell values 1, 2, 3... in order of first appearance.
+
+    :return: the relabeled str, '.' for unsolved cells, and a dict of old digit to new digit
+    """
+    labels = {}
+    chars = []
+    for value in values:
+        if value:
+            if value not in labels:
+                labels[value] = len(labels) + 1
+            chars.append(str(labels[value]))
+        else:
+            chars.append('.')
+    return ''.join(chars), labels
+
+
+def canonicalize(puzzle_string):
+    """Map a puzzle to a representative that is the same for every puzzle it can be turned into by a symmetry.
+
+    The symmetries are transposing the grid, permuting bands, stacks, and the rows and columns within them, and
+    relabeling digits. The representative is the least string, with '.' ordered before digits, over the transforms
+    that order the lines by their invariant keys, see _line_keys(). Its digits are relabeled in order of first
+    appearance.
+
+    :param puzzle_string: 81 char puzzle string, '.' or '0' for unknown cells
+    :return: (canonical string, transform) tuple, where the transform is a (list of the original index of each
+             canonical cell, dict of canonical digit to original digit) tuple for map_back(). (None, None) if the
+             puzzle is so symmetric that more than MAX_CANDIDATES transforms would need trying
+    """
+    original = [0 if char in '.0' else int(char) for char in puzzle_string]
+    candidates = []
+    for transposed in (False, True):
+        grid = [original[(index % 9) * 9 + index // 9] for index in range(81)] if transposed else original
+        row_keys, col_keys = _line_keys(grid)
+        row_orders = _orderings(row_keys)
+        col_orders = _orderings(col_keys)
+        candidates.append((transposed, grid, row_orders, col_orders))
+    if sum(len(rows) * len(cols) for _, _, rows, cols in candidates) > MAX_CANDIDATES:
+        return None, None
+
+    best = None
+    for transposed, grid, row_orders, col_orders in candidates:
+        for rows in row_orders:
+            for cols in col_orders:
+                string, labels = _relabel([grid[row * 9 + col] for row in rows for col in cols])
+                if best is None or string < best[0]:
+                    best = string, labels, transposed, rows, cols
+
+    string, labels, transposed, rows, cols = best
+    if transposed:
+        cells = [col * 9 + row for row in rows for col in cols]
+    else:
+        cells = [row * 9 + col for row in rows for col in cols]
+    digits = {str(label): str(digit) for digit, label in labels.items()}
+    # digits that aren't clues take the labels left over, in order
+    unused = [str(digit) for digit in range(1, 10) if digit not in labels]
+    digits.update(zip([str(label) for label in range(len(labels) + 1, 10)], unused))
+    return string, (cells, digits)
+
+
+def map_back(canonical_solution, transform):
+    """Map a solution of a canonical puzzle back to the puzzle that was canonicalized.
+
+    :param canonical_solution: 81 char solution string of the canonical puzzle
+    :param transform: transform returned by canonicalize()
+    :return: 81 char solution string of the original puzzle
+    """
+    cells, digits = transform
+    solution = [''] * 81
+    for canonical_index, index in enumerate(cells):
+        solution[index] = digits[canonical_solution[canonical_index]]
+    return ''.join(solution)
+
+
+def map_forward(solution, transform):
+    """Map a solution of a puzzle to the solution of its canonical puzzle, the inverse of map_back()."""
+    cells, digits = transform
+    labels = {digit: label for label, digit in digits.items()}
+    return ''.join(labels[solution[index]] for index in cells)
+
+
+class SolutionCache:
+    """A least recently used cache of solutions, keyed by canonical puzzle, see canonicalize().
+
+    A puzzle that is a relabeling, transposition or band, stack, row or column permutation of a cached one is a hit,
+    and the cached solution is mapped back through the symmetry.
+    """
+    def __init__(self, maxsize=1024):
+        """Initialize the cache.
+
+        :param maxsize: number of solutions to keep before the least recently used one is dropped
+        """
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self._solutions = collections.OrderedDict()
+        # canonicalize() result of the last puzzle looked up, so storing its solution doesn't redo it
+        self._last = None, None, None
+
+    def __len__(self):
+        return len(self._solutions)
+
+    def _canonicalize(self, puzzle_string):
+        if self._last[0] != puzzle_string:
+            self._last = (puzzle_string,) + canonicalize(puzzle_string)
+        return self._last[1:]
+
+    def get(self, puzzle_string):
+        """Return the cached solution of a puzzle, or None on a miss.
+
+        :param puzzle_string: 81 char puzzle string
+        :return: 81 char solution string, or None
+        """
+        canonical, transform = self._canonicalize(puzzle_string)
+        canonical_solution = self._solutions.get(canonical) if canonical else None
+        if canonical_solution is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        self._solutions.move_to_end(canonical)
+        return map_back(canonical_solution, transform)
+
+    def put(self, puzzle_string, solution):
+        """Cache a puzzle's solution, dropping the least recently used one if the cache is full.
+
+        :param puzzle_string: 81 char puzzle string
+        :param solution: 81 char solution string of the puzzle
+        """
+        canonical, transform = self._canonicalize(puzzle_string)
+        if not canonical or self.maxsize <= 0:
+            return
+        self._solutions[canonical] = map_forward(solution, transform)
+        self._solutions.move_to_end(canonical)
+        if len(self._solutions) > self.maxsize:
+            self._solutions.popitem(last=False)
@@ -0,0 +1,239 @@
+from puzzle import SolutionError, POPCOUNT
+
+# Exact cover matrix #
+# Each of the 729 rows places one digit in one cell, row id = cell index * 9 + digit index.
+# Each row satisfies 4 of the 324 constraint columns: its cell is filled, and its digit appears once in its row,
+# its column and its block.
+NUM_COLUMNS = 324
+NUM_ROWS = 729
+
+
+def row_columns(row_id):
+    """Return the 4 constraint columns, 0-323, satisfied by a row of the exact cover matrix."""
+    index, digit = divmod(row_id, 9)
+    row, col = divmod(index, 9)
+    block = (row // 3) * 3 + col // 3
+    return index, 81 + row * 9 + digit, 162 + col * 9 + digit, 243 + block * 9 + digit
+
+
+def _build_links():
+    """Build the doubly linked node lists of the full exact cover matrix.
+
+    Node 0 is the root, nodes 1-324 are the column headers and every row adds 4 more nodes.
+
+    :return: left, right, up, down, column, row_ids and size lists, and the first node of each row
+    """
+    left = [NUM_COLUMNS] + list(range(NUM_COLUMNS))
+    right = list(range(1, NUM_COLUMNS + 1)) + [0]
+    up = list(range(NUM_COLUMNS + 1))
+    down = list(range(NUM_COLUMNS + 1))
+    column = list(range(NUM_COLUMNS + 1))
+    row_ids = [-1] * (NUM_COLUMNS + 1)
+    size = [0] * (NUM_COLUMNS + 1)
+    row_nodes = []
+    for row_id in range(NUM_ROWS):
+        first = len(left)
+        row_nodes.append(first)
+        for offset, constraint in enumerate(row_columns(row_id)):
+            node = first + offset
+            header = constraint + 1
+            # insert the node at the bottom of its column
+            up.append(up[header])
+            down.append(header)
+            down[up[header]] = node
+            up[header] = node
+            left.append(first + (offset - 1) % 4)
+            right.append(first + (offset + 1) % 4)
+            column.append(header)
+            row_ids.append(row_id)
+            size[header] += 1
+    return left, right, up, down, column, row_ids, size, row_nodes
+
+
+_LEFT, _RIGHT, _UP, _DOWN, _COLUMN, _ROW_IDS, _SIZE, _ROW_NODES = _build_links()
+
+
+class DancingLinks:
+    """The sudoku exact cover matrix stored as Dancing Links, with Knuth's Algorithm X to search it.
+
+    The link lists are copied from a prebuilt template, so building one costs a few list copies.
+    """
+    def __init__(self):
+        self.left = _LEFT[:]
+        self.right = _RIGHT[:]
+        self.up = _UP[:]
+        self.down = _DOWN[:]
+        self.size = _SIZE[:]
+        self.column = _COLUMN
+        self.row_ids = _ROW_IDS
+        self.covered = [False] * (NUM_COLUMNS + 1)
+        self.solution = []
+        # optional puzzle.SolveStats to count the search's guesses in
+        self.stats = None
+        # optional puzzle.Budget to spend the search's guesses from
+        self.budget = None
+
+    def cover(self, header):
+        """Remove a column from the header list and remove every row that satisfies it from the other columns."""
+        left, right, up, down, size, column = self.left, self.right, self.up, self.down, self.size, self.column
+        right[left[header]] = right[header]
+        left[right[header]] = left[header]
+        self.covered[header] = True
+        row_node = down[header]
+        while row_node != header:
+            node = right[row_node]
+            while node != row_node:
+                down[up[node]] = down[node]
+                up[down[node]] = up[node]
+                size[column[node]] -= 1
+                node = right[node]
+            row_node = down[row_node]
+
+    def uncover(self, header):
+        """Undo cover(), restoring links in the reverse order they were removed."""
+        left, right, up, down, size, column = self.left, self.right, self.up, self.down, self.size, self.column
+        row_node = up[header]
+        while row_node != header:
+            node = left[row_node]
+            while node != row_node:
+                size[column[node]] += 1
+                down[up[node]] = node
+                up[down[node]] = node
+                node = left[node]
+            row_node = up[row_node]
+        right[left[header]] = header
+        left[right[header]] = header
+        self.covered[header] = False
+
+    def select(self, row_id):
+        """Add a row to the solution and cover its columns. Raise SolutionError if a column is already covered."""
+        first = _ROW_NODES[row_id]
+        node = first
+        while True:
+            if self.covered[self.column[node]]:
+                raise SolutionError()
+            node = self.right[node]
+            if node == first:
+                break
+        self.solution.append(row_id)
+        node = first
+        while True:
+            self.cover(self.column[node])
+            node = self.right[node]
+            if node == first:
+                break
+
+    def search(self, limit=1):
+        """Search for sets of rows that cover every remaining column exactly once.
+
+        Branches on the column with the fewest rows left, and stops as soon as 'limit' solutions have been found.
+
+        :param limit: number of solutions to stop searching at
+        :return: number of solutions found, at most limit. If any were found, the rows of the last one are left in
+                 self.solution.
+        :raise BudgetExceeded: if the search runs past self.budget
+        """
+        right, down, size, column = self.right, self.down, self.size, self.column
+        header = right[0]
+        if header == 0:
+            return 1
+        best_size = size[header]
+        node = right[header]
+        while node and best_size > 1:
+            if size[node] < best_size:
+                header = node
+                best_size = size[node]
+            node = right[node]
+        if best_size == 0:
+            return 0
+
+        # only a column with more than one row left is a guess. The others are forced
+        stats = self.stats if best_size > 1 else None
+        budget = self.budget if best_size > 1 else None
+        if stats is not None:
+            stats.depth += 1
+            if stats.depth > stats.max_depth:
+                stats.max_depth = stats.depth
+        found = 0
+        try:
+            self.cover(header)
+            row_node = down[header]
+            while row_node != header:
+                self.solution.append(self.row_ids[row_node])
+                node = right[row_node]
+                while node != row_node:
+                    self.cover(column[node])
+                    node = right[node]
+                if budget is not None:
+                    budget.spend()
+                if stats is not None:
+                    stats.guesses += 1
+                new_found = self.search(limit - found)
+                found += new_found
+                if found >= limit:
+                    break
+                if stats is not None and not new_found:
+                    stats.failed_branches += 1
+                node = self.left[row_node]
+                while node != row_node:
+                    self.uncover(column[node])
+                    node = self.left[node]
+                self.solution.pop()
+                row_node = down[row_node]
+            else:
+                self.uncover(header)
+        finally:
+            if stats is not None:
+                stats.depth -= 1
+        return found
+
+
+def _links_from_clues(puzzle):
+    """Return DancingLinks with every solved cell of the puzzle selected as a clue.
+
+    :raise SolutionError: if the puzzle's solved cells contradict each other
+    """
+    links = DancingLinks()
+    links.stats = puzzle.stats
+    links.budget = puzzle.budget
+    masks = puzzle.masks
+    for index in range(81):
+        mask = masks[index]
+        if POPCOUNT[mask] == 1:
+            links.select(index * 9 + mask.bit_length() - 1)
+    return links
+
+
+def count_solutions(puzzle, limit=2):
+    """Count the solutions of a puzzle, stopping as soon as 'limit' have been found.
+
+    Every solved cell of the puzzle is used as a clue. Candidates of unsolved cells are ignored.
+
+    :param puzzle: Puzzle object, left unchanged
+    :param limit: number of solutions to stop counting at. 2 is enough to tell if a solution is unique
+    :return: number of solutions, at most limit
+    :raise SolutionError: if the puzzle's solved cells contradict each other
+    """
+    return _links_from_clues(puzzle).search(limit)
+
+
+def solve(puzzle):
+    """Solve puzzle as an exact cover problem with Dancing Links.
+
+    Every solved cell of the puzzle is used as a clue. Candidates of unsolved cells are ignored.
+    The search's guesses are counted in puzzle.stats, and spent from puzzle.budget, if they are set.
+
+    :param puzzle: Puzzle object
+    :return: the puzzle with every cell solved, or None if it has no solution
+    :raise SolutionError: if the puzzle's solved cells contradict each other
+    :raise BudgetExceeded: if the search runs past puzzle.budget
+    """
+    links = _links_from_clues(puzzle)
+    if not links.search():
+        return None
+    if puzzle.stats is not None:
+        puzzle.stats.technique = 'dlx'
+    for row_id in links.solution:
+        index, digit = divmod(row_id, 9)
+        puzzle.set_candidates(index, 1 << digit)
+    return puzzle
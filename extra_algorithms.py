@@ -3,263 +3,226 @@ import itertools
 import algorithms as alg
 
 
-def find_preemptive_sets(puzzle, n):
+def _find_sets(items, n):
+    """Find the subsets of items, size 'n', whose masks together hold exactly n bits.
+
+    Subsets are built up one item at a time, and a branch is dropped as soon as its union holds more than n bits.
+
+    :param items: list of (key, mask) pairs, each mask holding between 2 and n bits
+    :param n: size of the subsets
+    :return: list of (list of keys, union of masks) pairs
+    :raise SolutionError: if n items' masks hold fewer than n bits between them
+    """
+    found = []
+
+    def extend(start, keys, union):
+        for item_index in range(start, len(items) - (n - len(keys)) + 1):
+            key, mask = items[item_index]
+            new_union = union | mask
+            if alg.POPCOUNT[new_union] > n:
+                continue
+            if len(keys) + 1 < n:
+                extend(item_index + 1, keys + [key], new_union)
+            elif alg.POPCOUNT[new_union] == n:
+                found.append((keys + [key], new_union))
+            else:
+                raise alg.SolutionError()
+
+    extend(0, [], 0)
+    return found
+
+
+def find_preemptive_sets(puzzle, n, units=None):
     """Find preemptive sets and remove them from the candidate lists of other cells in the unit.
 
     A preemptive set is a set of values, size 'n', that are the only possible values for a set of cells, size 'n',
     within the same unit.  Preemptive sets can be safely removed from any cell in the unit that could be a value besides
     those in the preemptive set.  Preemptive sets are often called naked sets.
 
+    Only unsolved cells with at most n candidates can be part of a set, so only subsets of those are searched.
+
     :param puzzle: Puzzle object
     :param n: size of preemptive sets to be found
+    :param units: optional iterable of the indices of the units to search, defaults to every unit
+    :return: number of sets found that removed candidates
     """
-    for unit_type_id, unit_type in enumerate([alg.ROW_ITER, alg.COL_ITER, alg.BLOCK_ITER]):
-        for unit in unit_type:
-            for preemptive_tup in itertools.combinations(range(1, 9+1), n):
-                if len(preemptive_tup) > len(set(preemptive_tup)):  # skip set if any values repeat
-                    continue
-                preemptive_set = ''.join(str(val) for val in preemptive_tup)
-                cells = []
-                for row, col in unit:
-                    cell = puzzle.cell_array[row][col]
-
-                    # check that all candidates are in preemptive_set
-                    candidates_not_in_set = [val for val in cell.candidates if val not in preemptive_set]
-                    if cell.is_solved() or len(candidates_not_in_set) != 0:  # some candidates not in preemptive set
-                        continue
-                    if len(cells) < n:
-                        cells.append(cell)
-                    else:
-                        cells.clear()
-                        break
-                if len(cells) == n:
-                    unit_list = ['row', 'column', 'block']
-                    unit_with_pair = unit_list[unit_type_id]
-                    for cell in cells:
-                        cell.dont_remove = preemptive_set
-                    for cell, val in itertools.product(cells, preemptive_set):
-                        alg.update_peers(puzzle, cell.POS[0], cell.POS[1], val, unit_with_pair)
-                    for cell in cells:
-                        cell.dont_remove = ''
-
-
-def find_hidden_sets(puzzle, n):
+    masks = puzzle.masks
+    found = 0
+    for unit_index in range(len(alg.UNITS)) if units is None else units:
+        unit = alg.UNITS[unit_index]
+        cells = [(index, masks[index]) for index in unit if 1 < alg.POPCOUNT[masks[index]] <= n]
+        for set_cells, preemptive_set in _find_sets(cells, n):
+            removed = False
+            for index in unit:
+                if index not in set_cells and masks[index] & preemptive_set:
+                    alg.eliminate(puzzle, index, preemptive_set, 'naked_sets')
+                    removed = True
+            found += removed
+    return found
+
+
+def find_hidden_sets(puzzle, n, units=None):
     """Find hidden sets and remove other values from the cells' candidate lists.
 
     A hidden set is a set of values, size 'n', which only appear in the candidate lists of a set of cells, size 'n',
     within the same unit.  Every value that is not in the hidden set can be safely removed from that cell's
     candidate list.
 
+    Only unsolved values with at most n places in the unit can be part of a set, so only subsets of those are
+    searched, using the places in puzzle.positions.
+
     :param puzzle: Puzzle object
     :param n: size of hidden sets to be found
+    :param units: optional iterable of the indices of the units to search, defaults to every unit
+    :return: number of sets found that removed candidates
     """
-    for unit_type in [alg.ROW_ITER, alg.COL_ITER, alg.BLOCK_ITER]:
-        for unit in unit_type:
-            for val_tup in itertools.combinations(range(1, 9+1), n):
-                if len(val_tup) > len(set(val_tup)):  # skip set if any values repeat
-                    continue
-                val_set = ''.join(str(val) for val in val_tup)
-                val_set_matches = [set() for _ in range(n)]
-                cells = []
-                for row, col in unit:
-                    cell = puzzle.cell_array[row][col]
-                    cell_solved = cell.is_solved()
-
-                    # Check if one of the values is already solved. If one is, break and look at next value set
-                    if cell_solved and cell.last_candidate() in val_set:
-                        cells.clear()
-                        break
-
-                    # If cell is solved or none of val_set appears in its candidate list, continue to next cell
-                    set_union = [val for val in val_set if val in cell.candidates]
-                    if cell_solved or len(set_union) == 0:
-                        continue
-
-                    for val_index, val in enumerate(val_set):
-                        if val in cell.candidates:
-                            val_set_matches[val_index].add(cell)
-                    # If a value appears in a greater number of cells than the size of the set, break
-                    if any(len(matches) > n for matches in val_set_matches):
-                        cells.clear()
-                        break
-
-                    # If more than n cells have matching values, this val_set is not hidden
-                    if len(cells) >= n:
-                        cells.clear()
-                        break
-                    else:
-                        cells.append(cell)
-                if len(cells) == n:
-                    combined_candidates = []
-                    for cell in cells:
-                        new_vals = [val for val in cell.candidates if val not in combined_candidates]
-                        combined_candidates += new_vals
-
-                    # Check that found set is hidden, not naked
-                    vals_not_in_set = [val for val in combined_candidates if val not in val_set]
-                    if len(vals_not_in_set) == 0:
-                        continue
-                    for cell in cells:
-                        cell.set_cell(val_set)
-                        if cell.is_solved():
-                            alg.update_peers(puzzle, cell.POS[0], cell.POS[1], cell.last_candidate())
-
-
-def _row_sub_unit_exclusions(puzzle):
-    """Private find_sub_unit_exclusions() function."""
-    for row, val in itertools.product(range(9), alg.DIGITS):
-        val_solved = False
-        val_in_sub_units = []
-        # A sub unit is columns [0-2], [3-5], or [6-8] of a row
-        for sub_unit_index, sub_unit in enumerate(alg.BANDS):
-            for col in sub_unit:
-                cell = puzzle.cell_array[row][col]
-                if val in cell.candidates:
-                    # if value has been solved, break all loops until the outer val loop
-                    if cell.is_solved():
-                        val_solved = True
-                        break
-                    else:
-                        # value is in this sub unit. Don't care how many times it shows up, so don't check the rest.
-                        val_in_sub_units.append(sub_unit_index)
-                        break
-            if val_solved:
-                break
-        # If value is solved or appears in more than one sub unit, go to next value
-        if val_solved or len(val_in_sub_units) != 1:
-            break
-        sub_unit_num = val_in_sub_units[0]
-        rows, cols = [], []
-        # Find which horizontal band 'row' is in (horizontal in regards to whole puzzle)
-        for horizontal_band in alg.BANDS:
-            if row in horizontal_band:
-                rows = horizontal_band[:]
-                break
-        rows.remove(row)
-        cols = alg.BANDS[sub_unit_num]
-        for row_num, col_num in itertools.product(rows, cols):
-            cell = puzzle.cell_array[row_num][col_num]
-            previously_solved = cell.is_solved()
-            cell.remove_candidate(val)
-            if cell.is_solved() and not previously_solved:
-                alg.update_peers(puzzle, row_num, col_num, cell.last_candidate())
-
-
-def _col_sub_unit_exclusions(puzzle):
-    """Private find_sub_unit_exclusions() function."""
-    for col, val in itertools.product(range(9), alg.DIGITS):
-        val_solved = False
-        val_in_sub_units = []
-        # A sub unit is rows [0-2], [3-5], or [6-8] of a column
-        for sub_unit_index, sub_unit in enumerate(alg.BANDS):
-            for row in sub_unit:
-                cell = puzzle.cell_array[row][col]
-                if val in cell.candidates:
-                    # if value has been solved, break all loops until the outer val loop
-                    if cell.is_solved():
-                        val_solved = True
-                        break
-                    else:
-                        # value is in this sub unit. Don't care how many times it shows up, so don't check the rest.
-                        val_in_sub_units.append(sub_unit_index)
-                        break
-            if val_solved:
-                break
-        # If value is solved or appears in more than one sub unit, go to next value
-        if val_solved or len(val_in_sub_units) != 1:
-            break
-        sub_unit_num = val_in_sub_units[0]
-        rows, cols = [], []
-        # Find which vertical band 'col' is in (vertical in regards to whole puzzle)
-        for vertical_band in alg.BANDS:
-            if col in vertical_band:
-                cols = vertical_band[:]
-                break
-        cols.remove(col)
-        rows = alg.BANDS[sub_unit_num]
-        for row_num, col_num in itertools.product(rows, cols):
-            cell = puzzle.cell_array[row_num][col_num]
-            previously_solved = cell.is_solved()
-            cell.remove_candidate(val)
-            if cell.is_solved() and not previously_solved:
-                alg.update_peers(puzzle, row_num, col_num, cell.last_candidate())
-
-
-def _horizontal_block_sub_unit_exclusions(puzzle):
-    """Private find_sub_unit_exclusions() function."""
-    for block_rows, block_cols, val in itertools.product(alg.BANDS, alg.BANDS, alg.DIGITS):
-        val_solved = False
-        val_in_rows = []
-        for row_index, row in enumerate(block_rows):
-            for col in block_cols:
-                cell = puzzle.cell_array[row][col]
-                if val in cell.candidates:
-                    if cell.is_solved():
-                        val_solved = True
-                        break
-                    else:
-                        # value is in this row. Don't care how many times it shows up, so don't check the rest
-                        val_in_rows.append(row_index)
-                        break
-            if val_solved:
-                break
-        # If value is solved or appears in more than one row, go to next value
-        if val_solved or len(val_in_rows) != 1:
-            break
-        row_index = val_in_rows[0]
-        row_to_update = block_rows[row_index]
-        cols = []
-        [[cols.append(col) for col in vertical_band
-          if vertical_band != block_cols] for vertical_band in alg.BANDS]
-        for col in cols:
-            cell = puzzle.cell_array[row_to_update][col]
-            previously_solved = cell.is_solved()
-            cell.remove_candidate(val)
-            if cell.is_solved() and not previously_solved:
-                alg.update_peers(puzzle, row_to_update, col, cell.last_candidate())
-
-
-def _vertical_block_sub_unit_exclusions(puzzle):
-    """Private find_sub_unit_exclusions() function."""
-    for block_rows, block_cols, val in itertools.product(alg.BANDS, alg.BANDS, alg.DIGITS):
-        val_solved = False
-        val_in_cols = []
-        for col_index, col in enumerate(block_cols):
-            for row in block_rows:
-                cell = puzzle.cell_array[row][col]
-                if val in cell.candidates:
-                    if cell.is_solved():
-                        val_solved = True
-                        break
-                    else:
-                        # value is in this col. Don't care how many times it shows up, so don't check the rest
-                        val_in_cols.append(col_index)
-                        break
-            if val_solved:
-                break
-        # If value is solved or appears in more than one row, go to next value
-        if val_solved or len(val_in_cols) != 1:
+    masks = puzzle.masks
+    positions = puzzle.positions
+    found = 0
+    for unit_index in range(len(alg.UNITS)) if units is None else units:
+        unit = alg.UNITS[unit_index]
+        slot = unit_index * 9
+        vals = [(digit, positions[slot + digit]) for digit in range(9)
+                if 1 < alg.POPCOUNT[positions[slot + digit]] <= n]
+        for digits, places in _find_sets(vals, n):
+            others = ~sum(1 << digit for digit in digits) & alg.ALL_CANDIDATES
+            removed = False
+            for position, index in enumerate(unit):
+                if places & 1 << position and masks[index] & others:
+                    alg.eliminate(puzzle, index, others, 'hidden_sets')
+                    removed = True
+            found += removed
+    return found
+
+
+def find_sets(puzzle, max_size=4):
+    """Find preemptive and hidden sets of sizes 2 to 'max_size', and the hidden singles they create,
+    until no more candidates can be removed.
+
+    Can be passed to algorithms.guess_and_check() as its 'prune' function.
+
+    :param puzzle: Puzzle object
+    :param max_size: size of the largest sets to be found
+    """
+    while True:
+        puzzle.changed = False
+        for n in range(2, max_size + 1):
+            find_preemptive_sets(puzzle, n)
+            find_hidden_sets(puzzle, n)
+        if not puzzle.changed:
             break
-        col_index = val_in_cols[0]
-        col_to_update = block_cols[col_index]
-        rows = []
-        [[rows.append(row) for row in horizontal_band
-          if horizontal_band != block_rows] for horizontal_band in alg.BANDS]
-        for row in rows:
-            cell = puzzle.cell_array[row][col_to_update]
-            previously_solved = cell.is_solved()
-            cell.remove_candidate(val)
-            if cell.is_solved() and not previously_solved:
-                alg.update_peers(puzzle, row, col_to_update, cell.last_candidate())
-
-
-def find_sub_unit_exclusions(puzzle):
+        alg.basic_solve(puzzle)
+
+
+def _intersections():
+    """Return the sub unit exclusion tables.
+
+    A sub unit is the 3 cells where a row or column crosses a block. Each table entry is a tuple of
+    (unit index, mask of the sub unit's positions in that unit, cells of the crossing unit outside the sub unit).
+    If a value's places in the unit all lie in the sub unit, it can be removed from those other cells.
+
+    :return: lists of the entries for rows, columns, block rows and block columns
+    """
+    row_entries, col_entries, block_row_entries, block_col_entries = [], [], [], []
+    for line_index in range(18):
+        line = alg.UNITS[line_index]
+        for block_index in range(18, 27):
+            block = alg.UNITS[block_index]
+            sub_unit = set(line) & set(block)
+            if not sub_unit:
+                continue
+            line_mask = sum(1 << position for position, index in enumerate(line) if index in sub_unit)
+            block_mask = sum(1 << position for position, index in enumerate(block) if index in sub_unit)
+            line_entry = (line_index, line_mask, [index for index in block if index not in sub_unit])
+            block_entry = (block_index, block_mask, [index for index in line if index not in sub_unit])
+            if line_index < 9:
+                row_entries.append(line_entry)
+                block_row_entries.append(block_entry)
+            else:
+                col_entries.append(line_entry)
+                block_col_entries.append(block_entry)
+    return row_entries, col_entries, block_row_entries, block_col_entries
+
+
+ROW_SUB_UNITS, COL_SUB_UNITS, BLOCK_ROW_SUB_UNITS, BLOCK_COL_SUB_UNITS = _intersections()
+# The entries of the four tables for each unit, by unit index: 3 for a row or column, 6 for a block
+UNIT_SUB_UNITS = [[] for _ in alg.UNITS]
+for _entry in itertools.chain(ROW_SUB_UNITS, COL_SUB_UNITS, BLOCK_ROW_SUB_UNITS, BLOCK_COL_SUB_UNITS):
+    UNIT_SUB_UNITS[_entry[0]].append(_entry)
+
+
+def _sub_unit_exclusions(puzzle, sub_units):
+    """Remove values confined to a sub unit of one unit from the rest of the crossing unit.
+
+    :param puzzle: Puzzle object
+    :param sub_units: one of the sub unit exclusion tables, see _intersections()
+    :return: number of confined values that removed candidates
+    """
+    masks = puzzle.masks
+    positions = puzzle.positions
+    found = 0
+    for unit_index, sub_unit_mask, others in sub_units:
+        slot = unit_index * 9
+        for digit in range(9):
+            places = positions[slot + digit]
+            # If value is solved, or appears outside the sub unit, go to next value
+            if alg.POPCOUNT[places] <= 1 or places & ~sub_unit_mask:
+                continue
+            val = 1 << digit
+            removed = False
+            for index in others:
+                if masks[index] & val:
+                    alg.eliminate(puzzle, index, val, 'sub_unit_exclusions')
+                    removed = True
+            found += removed
+    return found
+
+
+def find_row_sub_unit_exclusions(puzzle):
+    """Remove values confined to one block of a row from the rest of that block.
+
+    :param puzzle: Puzzle object
+    :return: number of confined values that removed candidates
+    """
+    return _sub_unit_exclusions(puzzle, ROW_SUB_UNITS)
+
+
+def find_col_sub_unit_exclusions(puzzle):
+    """Remove values confined to one block of a column from the rest of that block.
+
+    :param puzzle: Puzzle object
+    :return: number of confined values that removed candidates
+    """
+    return _sub_unit_exclusions(puzzle, COL_SUB_UNITS)
+
+
+def find_block_row_sub_unit_exclusions(puzzle):
+    """Remove values confined to one row of a block from the rest of that row.
+
+    :param puzzle: Puzzle object
+    :return: number of confined values that removed candidates
+    """
+    return _sub_unit_exclusions(puzzle, BLOCK_ROW_SUB_UNITS)
+
+
+def find_block_col_sub_unit_exclusions(puzzle):
+    """Remove values confined to one column of a block from the rest of that column.
+
+    :param puzzle: Puzzle object
+    :return: number of confined values that removed candidates
+    """
+    return _sub_unit_exclusions(puzzle, BLOCK_COL_SUB_UNITS)
+
+
+def find_sub_unit_exclusions(puzzle, units=None):
     """Search each unit for values that only appear in one sub unit
     and remove them from the rest of the overlapping unit.
 
     :param puzzle: Puzzle object
+    :param units: optional iterable of the indices of the units to search, defaults to every unit
+    :return: number of confined values that removed candidates
     """
-    _row_sub_unit_exclusions(puzzle)
-    _col_sub_unit_exclusions(puzzle)
-    _horizontal_block_sub_unit_exclusions(puzzle)
-    _vertical_block_sub_unit_exclusions(puzzle)
+    if units is not None:
+        return sum(_sub_unit_exclusions(puzzle, UNIT_SUB_UNITS[unit_index]) for unit_index in units)
+    return (find_row_sub_unit_exclusions(puzzle) + find_col_sub_unit_exclusions(puzzle)
+            + find_block_row_sub_unit_exclusions(puzzle) + find_block_col_sub_unit_exclusions(puzzle))
@@ -0,0 +1,258 @@
+import concurrent.futures
+import functools
+import random
+import sys
+
+import algorithms as alg
+import dlx
+import grading
+import puzzle as pzl
+import strategies
+
+# Fewest clues any sudoku with a unique solution has, see sudoku_solver.ClueError
+MIN_CLUES = 17
+# Difficulty levels, easiest first, and the techniques that solve a puzzle of each level without guessing. Solving
+# a clue's peers, naked singles, is part of every technique. 'expert' puzzles need search.
+DIFFICULTIES = {'easy': ['hidden_singles']}
+DIFFICULTIES['medium'] = DIFFICULTIES['easy'] + ['row_exclusions', 'col_exclusions', 'block_row_exclusions',
+                                                 'block_col_exclusions', 'naked_sets_2', 'hidden_sets_2']
+DIFFICULTIES['hard'] = DIFFICULTIES['medium'] + ['naked_sets_3', 'hidden_sets_3', 'naked_sets_4', 'hidden_sets_4']
+DIFFICULTIES['expert'] = None
+LEVELS = list(DIFFICULTIES)
+
+
+def _transpose(index):
+    row, col = divmod(index, 9)
+    return col * 9 + row
+
+
+def _rotate_half(index):
+    return 80 - index
+
+
+def _rotate_quarter(index):
+    row, col = divmod(index, 9)
+    return col * 9 + 8 - row
+
+
+def _mirror(index):
+    row, col = divmod(index, 9)
+    return row * 9 + 8 - col
+
+
+# Symmetries a puzzle's clues can have, by the cell maps that generate them. Cells that map onto each other are
+# given or removed together
+SYMMETRIES = {
+    'none': [],
+    'rotational': [_rotate_half],
+    'quarter': [_rotate_quarter],
+    'mirror': [_mirror],
+    'diagonal': [_transpose],
+    'dihedral': [_rotate_quarter, _mirror],
+}
+
+
+def orbits(symmetry):
+    """Return the groups of cells a symmetry maps onto each other.
+
+    :param symmetry: name from SYMMETRIES
+    :return: list of lists of cell indices, covering every cell once
+    """
+    maps = SYMMETRIES[symmetry]
+    seen = set()
+    groups = []
+    for index in range(81):
+        if index in seen:
+            continue
+        group = {index}
+        frontier = [index]
+        while frontier:
+            cell = frontier.pop()
+            for cell_map in maps:
+                image = cell_map(cell)
+                if image not in group:
+                    group.add(image)
+                    frontier.append(image)
+        seen |= group
+        groups.append(sorted(group))
+    return groups
+
+
+def _shuffled_lines(rng):
+    """Return a random order of the 9 rows or columns of a grid that keeps every band's lines together."""
+    return [band * 3 + line for band in rng.sample(range(3), 3) for line in rng.sample(range(3), 3)]
+
+
+def random_grid(rng=random):
+    """Return a random solved grid.
+
+    The three diagonal blocks share no unit, so they're filled with random permutations and the rest of the grid is
+    solved by the search. Its bands, stacks, rows and columns are then shuffled, which keeps the grid valid.
+
+    :param rng: random.Random object, or the random module
+    :return: 81 char solution string
+    """
+    puzzle = pzl.Puzzle('.' * 81)
+    for block in range(18, 27, 4):
+        for index, digit in zip(alg.UNITS[block], rng.sample(pzl.DIGITS, 9)):
+            alg.assign(puzzle, index, pzl.DIGIT_MASKS[digit])
+    alg.basic_solve(puzzle)
+    cells = str(alg.guess_and_check(puzzle))
+    rows = _shuffled_lines(rng)
+    cols = _shuffled_lines(rng)
+    return ''.join(cells[row * 9 + col] for row in rows for col in cols)
+
+
+def _solves(puzzle_string, techniques):
+    """Return True if the techniques solve a puzzle without guessing."""
+    try:
+        puzzle = strategies.Pipeline(techniques).run(pzl.Puzzle(puzzle_string))
+    except pzl.SolutionError:
+        return False
+    return puzzle.solved
+
+
+def grade(puzzle_string):
+    """Return the difficulty of a puzzle with a unique solution, the first level of DIFFICULTIES whose techniques
+    solve it, or 'expert' if it needs search. The level is that of the hardest technique grading.grade() steps
+    through the puzzle with.
+
+    :param puzzle_string: 81 char puzzle string
+    """
+    return grading.grade(puzzle_string).level
+
+
+def _unique(puzzle_string):
+    return dlx.count_solutions(pzl.Puzzle(puzzle_string)) == 1
+
+
+def dig(solution, rng=random, symmetry='none', min_clues=MIN_CLUES, max_difficulty='expert'):
+    """Remove clues from a solved grid while its solution stays unique.
+
+    Groups of cells that map onto each other under the symmetry are tried in a random order, and a group's clues
+    are removed if the puzzle still has one solution, has at least min_clues clues and is no harder than
+    max_difficulty. Below 'expert', a puzzle is kept only if that level's techniques solve it, which also proves
+    its solution unique, so the Dancing Links solution count is only needed for 'expert'.
+
+    :param solution: 81 char solution string
+    :param rng: random.Random object, or the random module
+    :param symmetry: name from SYMMETRIES
+    :param min_clues: fewest clues to leave
+    :param max_difficulty: hardest level from DIFFICULTIES to let the puzzle get to
+    :return: 81 char puzzle string, '.' for unknown cells
+    """
+    techniques = DIFFICULTIES[max_difficulty]
+    grid = list(solution)
+    clues = 81
+    groups = orbits(symmetry)
+    rng.shuffle(groups)
+    for group in groups:
+        if clues - len(group) < min_clues:
+            continue
+        for index in group:
+            grid[index] = '.'
+        puzzle_string = ''.join(grid)
+        if _solves(puzzle_string, techniques) if techniques else _unique(puzzle_string):
+            clues -= len(group)
+        else:
+            for index in group:
+                grid[index] = solution[index]
+    return ''.join(grid)
+
+
+def _check_arguments(difficulty, symmetry, min_clues):
+    """Raise ValueError on an unknown difficulty or symmetry, or min_clues below MIN_CLUES or above 81."""
+    if difficulty is not None and difficulty not in DIFFICULTIES:
+        raise ValueError('Unknown difficulty: {}'.format(difficulty))
+    if symmetry not in SYMMETRIES:
+        raise ValueError('Unknown symmetry: {}'.format(symmetry))
+    if not MIN_CLUES <= min_clues <= 81:
+        raise ValueError('min_clues must be between {} and 81'.format(MIN_CLUES))
+
+
+def generate(difficulty=None, symmetry='none', min_clues=MIN_CLUES, seed=None, max_attempts=100):
+    """Generate a puzzle with a unique solution.
+
+    Clues are dug out of random grids, see dig(), until the puzzle's difficulty is the one asked for.
+
+    :param difficulty: level from DIFFICULTIES, or None for any
+    :param symmetry: name from SYMMETRIES the clues are placed with
+    :param min_clues: fewest clues the puzzle may have, at least MIN_CLUES
+    :param seed: seed of the random generator, for a reproducible puzzle
+    :param max_attempts: number of grids to try before giving up
+    :return: 81 char puzzle string, '.' for unknown cells, or None if no puzzle was found in max_attempts grids
+    :raise ValueError: on an unknown difficulty or symmetry, or min_clues below MIN_CLUES or above 81
+    """
+    _check_arguments(difficulty, symmetry, min_clues)
+    rng = random.Random(seed)
+    for _ in range(max_attempts):
+        puzzle_string = dig(random_grid(rng), rng, symmetry, min_clues, difficulty or 'expert')
+        if difficulty is None or grade(puzzle_string) == difficulty:
+            return puzzle_string
+    return None
+
+
+def generate_many(count, difficulty=None, symmetry='none', min_clues=MIN_CLUES, seed=None, workers=1,
+                  max_attempts=100):
+    """Generate puzzles, in a pool of worker processes when workers > 1.
+
+    Every puzzle gets its own seed, drawn from 'seed', so the same seed generates the same puzzles in the same order
+    however many workers there are.
+
+    :param count: number of puzzles
+    :param workers: number of worker processes
+    :return: iterator yielding an 81 char puzzle string, or None, for each puzzle, see generate()
+    :raise ValueError: on invalid arguments, see generate()
+    """
+    _check_arguments(difficulty, symmetry, min_clues)
+    rng = random.Random(seed)
+    seeds = [rng.getrandbits(64) for _ in range(count)]
+    make = functools.partial(generate, difficulty, symmetry, min_clues, max_attempts=max_attempts)
+    if workers <= 1:
+        return map(make, seeds)
+    return _generate_parallel(make, seeds, workers)
+
+
+def _generate_parallel(make, seeds, workers):
+    """Yield make(seed) for each seed, in order, computed in a pool of worker processes."""
+    with concurrent.futures.ProcessPoolExecutor(workers) as executor:
+        yield from executor.map(make, seeds, chunksize=max(1, min(16, len(seeds) // (workers * 4))))
+
+
+if __name__ == '__main__':
+    import argparse
+
+    parser = argparse.ArgumentParser(description='Generate puzzles with a unique solution, one per line')
+    parser.add_argument('-n', '--count', type=int, default=1, help='Number of puzzles, defaults to 1')
+    parser.add_argument('-d', '--difficulty', choices=LEVELS,
+                        help='Difficulty of the puzzles, by the techniques needed to solve them, defaults to any')
+    parser.add_argument('-s', '--symmetry', choices=list(SYMMETRIES), default='none',
+                        help='Symmetry of the clues, defaults to none')
+    parser.add_argument('-c', '--min-clues', type=int, default=MIN_CLUES,
+                        help='Fewest clues a puzzle may have, defaults to {}'.format(MIN_CLUES))
+    parser.add_argument('-w', '--workers', type=int, default=1,
+                        help='Number of processes to generate puzzles in, defaults to 1')
+    parser.add_argument('--seed', type=int, help='Seed for reproducible puzzles')
+    parser.add_argument('--max-attempts', type=int, default=100,
+                        help='Number of grids to try for each puzzle before giving up on it, defaults to 100')
+    arguments = parser.parse_args()
+    if arguments.count < 0:
+        parser.error('count can\'t be negative')
+    if arguments.workers < 1:
+        parser.error('workers must be greater than 0')
+    if arguments.max_attempts < 1:
+        parser.error('max-attempts must be greater than 0')
+    try:
+        _check_arguments(arguments.difficulty, arguments.symmetry, arguments.min_clues)
+    except ValueError as err:
+        parser.error(str(err))
+    failed = 0
+    for puzzle_string in generate_many(arguments.count, arguments.difficulty, arguments.symmetry,
+                                       arguments.min_clues, arguments.seed, arguments.workers, arguments.max_attempts):
+        if puzzle_string:
+            print(puzzle_string)
+        else:
+            failed += 1
+    if failed:
+        print('Gave up on {} puzzle(s) after {} grids each'.format(failed, arguments.max_attempts), file=sys.stderr)
+        sys.exit(1)
@@ -0,0 +1,161 @@
+import itertools
+import re
+
+# Symbols of the values of boards up to 35x35, in order. A board of size n uses the first n
+SYMBOLS = '123456789ABCDEFGHIJKLMNOPQRSTUVWXYZ'
+# Chars that stand for an unknown cell, unless they're in the board's alphabet
+BLANKS = '.0'
+_NUMERIC_TOKEN = re.compile(r'\d+|\.')
+
+
+def box_shape(size):
+    """Return the (box rows, box columns) shape of the boxes of a board of 'size' values.
+
+    Square sizes get square boxes. Other sizes get the most nearly square boxes, wider than they are tall, e.g.
+    2x3 boxes for a 6x6 board.
+
+    :raise ValueError: if size has no box shape other than a single row
+    """
+    box_rows = max(rows for rows in range(1, int(size ** 0.5) + 1) if size % rows == 0)
+    if box_rows == 1 and size > 1:
+        raise ValueError('a board of size {} has no boxes'.format(size))
+    return box_rows, size // box_rows
+
+
+def parse_box(text):
+    """Return the (box rows, box columns) shape given by a str like '3x4', or by a board size like '16'.
+
+    :raise ValueError: if the text isn't a box shape or size, see box_shape()
+    """
+    box_rows, _, box_cols = text.lower().partition('x')
+    if not box_cols:
+        return box_shape(int(box_rows))
+    box_rows, box_cols = int(box_rows), int(box_cols)
+    if box_rows < 1 or box_cols < 1:
+        raise ValueError('box sides must be greater than 0')
+    return box_rows, box_cols
+
+
+class Geometry:
+    """The shape of a sudoku board, with its unit and peer tables.
+
+    A board of size n has n rows, n columns and n boxes of box_rows x box_cols cells, with box_rows * box_cols = n.
+    Cells are indexed 0 to n*n - 1, row by row. Units 0 to n-1 are rows, n to 2n-1 are columns and 2n to 3n-1 are
+    boxes. A cell's candidates are an n bit mask, bit v set when the value with index v in the alphabet is still
+    possible.
+    """
+    def __init__(self, box_rows, box_cols, alphabet=None):
+        """Build the tables of a board with boxes of box_rows x box_cols cells.
+
+        :param box_rows: number of rows in a box
+        :param box_cols: number of columns in a box
+        :param alphabet: str of the board's values in order, one char each, defaults to the first size SYMBOLS
+        :raise ValueError: if the alphabet is the wrong length, repeats a char, or holds whitespace, '.' or ','
+        """
+        self.box_rows = box_rows
+        self.box_cols = box_cols
+        self.size = size = box_rows * box_cols
+        self.num_cells = size * size
+        if alphabet is None:
+            if size > len(SYMBOLS):
+                raise ValueError('boards bigger than {0}x{0} need an alphabet'.format(len(SYMBOLS)))
+            alphabet = SYMBOLS[:size]
+        alphabet = alphabet.upper()
+        if (len(alphabet) != size or len(set(alphabet)) != size
+                or any(char.isspace() or char in '.,' for char in alphabet)):
+            raise ValueError('alphabet must be {} distinct chars other than whitespace, "." and ","'.format(size))
+        self.alphabet = alphabet
+        self.all_candidates = (1 << size) - 1
+
+        rows = [[row * size + col for col in range(size)] for row in range(size)]
+        cols = [[row * size + col for row in range(size)] for col in range(size)]
+        boxes = [[row * size + col
+                  for row in range(band * box_rows, band * box_rows + box_rows)
+                  for col in range(stack * box_cols, stack * box_cols + box_cols)]
+                 for band in range(box_cols) for stack in range(box_rows)]
+        self.units = units = rows + cols + boxes
+        self.cell_units = cell_units = [[] for _ in range(self.num_cells)]
+        for unit_index, unit in enumerate(units):
+            for index in unit:
+                cell_units[index].append(unit_index)
+        self.unit_peers = [[[peer for peer in units[unit_index] if peer != index]
+                            for unit_index in cell_units[index]]
+                           for index in range(self.num_cells)]
+        self.peers = [sorted(set(itertools.chain.from_iterable(unit_peers))) for unit_peers in self.unit_peers]
+        # For each of a cell's 3 units, the unit's first slot in a board's positions list and the cell's position bit
+        # in the unit, flattened to (row slot, row bit, column slot, column bit, box slot, box bit)
+        self.cell_positions = [tuple(itertools.chain.from_iterable(
+                                   (unit_index * size, 1 << units[unit_index].index(index))
+                                   for unit_index in cell_units[index]))
+                               for index in range(self.num_cells)]
+        # For each unit, a (segment, cells) pair for each unit crossing it, where segment is the mask of the unit's
+        # positions inside the crossing unit, and cells are the crossing unit's cells outside the unit. A value whose
+        # places in the unit all lie in the segment can be removed from those cells
+        self.intersections = [[] for _ in units]
+        for line_index in range(2 * size):
+            for box_index in range(2 * size, 3 * size):
+                common = set(units[line_index]) & set(units[box_index])
+                if not common:
+                    continue
+                for unit_index, other_index in ((line_index, box_index), (box_index, line_index)):
+                    segment = sum(1 << position for position, index in enumerate(units[unit_index])
+                                  if index in common)
+                    cells = [index for index in units[other_index] if index not in common]
+                    self.intersections[unit_index].append((segment, cells))
+
+        self.char_masks = {char: 1 << value for value, char in enumerate(alphabet)}
+        self.char_masks.update({char.lower(): mask for char, mask in self.char_masks.items()})
+        for blank in BLANKS:
+            if blank not in alphabet:
+                self.char_masks[blank] = self.all_candidates
+
+    def __repr__(self):
+        return 'Geometry({}, {}, {!r})'.format(self.box_rows, self.box_cols, self.alphabet)
+
+    @classmethod
+    def of_size(cls, size, alphabet=None):
+        """Return the geometry of a board of 'size' values, with boxes shaped by box_shape()."""
+        return cls(*box_shape(size), alphabet=alphabet)
+
+    def parse(self, text):
+        """Parse a puzzle of this geometry into a list of candidate masks.
+
+        Two layouts are accepted. Either size*size whitespace or comma separated numbers, 1 to size with 0 or '.'
+        for an unknown cell, or size*size chars of the alphabet and blanks in any layout, with every other char
+        ignored like in a 9x9 puzzle file. Letters are case insensitive.
+
+        :param text: str holding the puzzle
+        :return: list of size*size candidate masks, or None if the text doesn't hold a puzzle of this geometry
+        """
+        tokens = text.replace(',', ' ').split()
+        if len(tokens) == self.num_cells and all(_NUMERIC_TOKEN.fullmatch(token) for token in tokens):
+            values = [0 if token == '.' else int(token) for token in tokens]
+            if max(values) <= self.size:
+                return [1 << (value - 1) if value else self.all_candidates for value in values]
+        char_masks = self.char_masks
+        masks = [char_masks[char] for char in text if char in char_masks]
+        if len(masks) != self.num_cells:
+            return None
+        return masks
+
+    def format(self, masks):
+        """Return a board's candidate masks as a str of one char per cell, '.' for unsolved cells."""
+        alphabet = self.alphabet
+        return ''.join(alphabet[mask.bit_length() - 1] if mask and not mask & mask - 1 else '.' for mask in masks)
+
+    def format_grid(self, masks):
+        """Return a board's candidate masks as rows of chars, with its boxes separated by lines."""
+        size = self.size
+        cells = self.format(masks)
+        lines = []
+        for row in range(size):
+            if row and not row % self.box_rows:
+                lines.append('-+-'.join(['-' * (self.box_cols * 2 - 1)] * self.box_rows))
+            chars = cells[row * size:row * size + size]
+            lines.append(' | '.join(' '.join(chars[col:col + self.box_cols])
+                                    for col in range(0, size, self.box_cols)))
+        return '\n'.join(lines)
+
+
+# The standard 9x9 board
+STANDARD = Geometry(3, 3)
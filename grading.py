@@ -0,0 +1,302 @@
+import collections
+import concurrent.futures
+import functools
+import itertools
+import sys
+
+import algorithms as alg
+import extra_algorithms as ex
+import parsing
+import puzzle as pzl
+
+# Logical techniques, simplest first, with the weight each adds to a puzzle's score: roughly how hard it is to spot
+# by hand. Naked singles are found by propagation, as part of every other technique, so they're never looked for.
+TECHNIQUES = [
+    ('naked_singles', 1.0),
+    ('hidden_singles', 1.5),
+    ('locked_candidates', 2.0),
+    ('naked_pairs', 3.0),
+    ('hidden_pairs', 3.4),
+    ('naked_triples', 3.6),
+    ('hidden_triples', 4.0),
+    ('naked_quads', 5.0),
+    ('hidden_quads', 5.4),
+]
+WEIGHTS = dict(TECHNIQUES, search=10.0)
+# Difficulty level of a puzzle by the hardest technique it needs, matching generator.DIFFICULTIES
+LEVELS = {
+    'naked_singles': 'easy',
+    'hidden_singles': 'easy',
+    'locked_candidates': 'medium',
+    'naked_pairs': 'medium',
+    'hidden_pairs': 'medium',
+    'naked_triples': 'hard',
+    'hidden_triples': 'hard',
+    'naked_quads': 'hard',
+    'hidden_quads': 'hard',
+    'search': 'expert',
+}
+# The techniques looked for one unit at a time, in order, as (name, function(puzzle, units)) pairs. Each function
+# returns the number of patterns it found that removed candidates
+_UNIT_TECHNIQUES = [('locked_candidates', ex.find_sub_unit_exclusions)]
+for _size, _name in enumerate(['pairs', 'triples', 'quads'], 2):
+    _UNIT_TECHNIQUES.append(('naked_' + _name, functools.partial(ex.find_preemptive_sets, n=_size)))
+    _UNIT_TECHNIQUES.append(('hidden_' + _name, functools.partial(ex.find_hidden_sets, n=_size)))
+_ALL_UNITS = range(len(alg.UNITS))
+
+
+class Grade:
+    """The grade of a puzzle: which techniques solving it took, and how often.
+
+    'histogram' counts the steps of each technique: the cells solved by singles, and the patterns of the other
+    techniques that removed candidates. 'guesses' is the number of guesses the search made when logic got stuck,
+    0 if it didn't, and 'solution' is the solved 81 char puzzle string.
+    """
+    def __init__(self, histogram, guesses, solution):
+        self.histogram = histogram
+        self.guesses = guesses
+        self.solution = solution
+
+    @property
+    def hardest(self):
+        """Return the name of the hardest technique the puzzle needed, 'search' if logic got stuck, or None if its
+        clues solved it."""
+        if self.guesses:
+            return 'search'
+        for name, _ in reversed(TECHNIQUES):
+            if self.histogram[name]:
+                return name
+        return None
+
+    @property
+    def score(self):
+        """Return the difficulty score, the weight of the hardest technique, 0 if the clues solved the puzzle."""
+        hardest = self.hardest
+        return WEIGHTS[hardest] if hardest else 0.0
+
+    @property
+    def level(self):
+        """Return the difficulty level from generator.LEVELS, by the hardest technique the puzzle needed."""
+        return LEVELS.get(self.hardest, 'easy')
+
+    def format_histogram(self):
+        """Return the steps of each technique used, in order, as 'name=count' pairs separated by commas."""
+        counts = [(name, self.histogram[name]) for name, _ in TECHNIQUES]
+        counts.append(('search', self.guesses))
+        return ','.join('{}={}'.format(name, count) for name, count in counts if count)
+
+
+def _hidden_singles(puzzle):
+    """Solve the hidden singles queued on the puzzle until there are none left, see algorithms.basic_solve().
+
+    :return: number of cells solved as hidden singles, not counting cells that were already down to the one value
+    :raise SolutionError: if a digit has no place left in a unit
+    """
+    hidden_singles = puzzle.hidden_singles
+    positions = puzzle.positions
+    masks = puzzle.masks
+    found = 0
+    while hidden_singles:
+        slot = hidden_singles.pop()
+        places = positions[slot]
+        if pzl.POPCOUNT[places] != 1:
+            if not places:
+                raise pzl.SolutionError()
+            continue
+        unit_index, digit = divmod(slot, 9)
+        index = alg.UNITS[unit_index][pzl.BIT_INDEX[places]]
+        val = 1 << digit
+        if masks[index] != val:
+            alg.assign(puzzle, index, val)
+            found += 1
+    return found
+
+
+def _solve_logically(puzzle, histogram):
+    """Solve a puzzle with the logical techniques, one step at a time, until it's solved or none of them apply.
+
+    Each step takes the simplest technique that removes a candidate, so every step is counted for the first
+    technique it needed. Techniques other than singles are looked for one unit at a time. Every change to a mask is
+    on the puzzle's trail, so after each step only the units of the cells changed since are marked to be looked at
+    again, and each technique only looks at the units marked for it instead of the whole board.
+
+    :param puzzle: Puzzle object, with its clues' peers updated
+    :param histogram: Counter the steps of each technique are added to
+    :raise SolutionError: if the puzzle is found to be unsolvable
+    """
+    puzzle.checkpoint()
+    trail = puzzle.trail
+    masks = puzzle.masks
+    cell_units = pzl.CELL_UNITS
+    # units each unit technique still has to look at
+    dirty = [set(_ALL_UNITS) for _ in _UNIT_TECHNIQUES]
+    synced = len(trail)
+    while True:
+        histogram['hidden_singles'] += _hidden_singles(puzzle)
+        if all(pzl.POPCOUNT[mask] == 1 for mask in masks):
+            return
+        if len(trail) > synced:
+            changed = set()
+            for index, _ in itertools.islice(trail, synced, None):
+                changed.update(cell_units[index])
+            for units in dirty:
+                units |= changed
+            synced = len(trail)
+        for (name, find), units in zip(_UNIT_TECHNIQUES, dirty):
+            found = 0
+            while units and not found:
+                found = find(puzzle, units=(units.pop(),))
+            if found:
+                histogram[name] += found
+                break
+        else:
+            return
+
+
+def grade(puzzle_string, timeout=None, max_nodes=None):
+    """Grade a puzzle by solving it with logical techniques, simplest first, see _solve_logically(). Search is only
+    used when none of them apply, to finish the puzzle.
+
+    The puzzle is assumed to have a unique solution. Each technique is sound, so one with several solutions is
+    graded by the techniques that got as far as they could and the first solution the search finds.
+
+    :param puzzle_string: 81 char puzzle string, or 81 bytes
+    :param timeout: optional number of seconds the search may take
+    :param max_nodes: optional number of guesses the search may make
+    :return: Grade object, or None if the puzzle has no solution
+    :raise BudgetExceeded: if the search runs past its timeout or max_nodes
+    """
+    puzzle = pzl.Puzzle(puzzle_string)
+    clues = sum(pzl.POPCOUNT[mask] == 1 for mask in puzzle.masks)
+    histogram = collections.Counter()
+    try:
+        alg.update_clue_peers(puzzle)
+        _solve_logically(puzzle, histogram)
+    except pzl.SolutionError:
+        return None
+    solved = sum(pzl.POPCOUNT[mask] == 1 for mask in puzzle.masks)
+    histogram['naked_singles'] = solved - clues - histogram['hidden_singles']
+    guesses = 0
+    if solved < 81:
+        puzzle.budget = pzl.Budget(timeout, max_nodes)
+        if alg.guess_and_check(puzzle) is None:
+            return None
+        guesses = puzzle.budget.nodes
+    elif not puzzle.solved:
+        return None
+    return Grade(histogram, guesses, str(puzzle))
+
+
+def _grade_grid(grid, timeout=None, max_nodes=None):
+    """Return the grade of a grid from parsing.parse_batch(), None if it's unsolvable or isn't a grid, or the
+    BudgetExceeded if its search ran out."""
+    if grid is None:
+        return None
+    try:
+        return grade(grid, timeout, max_nodes)
+    except pzl.BudgetExceeded as err:
+        return err
+
+
+def grade_many(source, workers=1, timeout=None, max_nodes=None, chunk_size=256):
+    """Grade every puzzle of a batch file, in a pool of worker processes when workers > 1.
+
+    :param source: file opened in binary mode, or any iterable of bytes or strs holding one puzzle each, see
+                   parsing.parse_batch()
+    :param workers: number of worker processes
+    :param timeout: optional number of seconds each puzzle's search may take
+    :param max_nodes: optional number of guesses each puzzle's search may make
+    :param chunk_size: number of puzzles sent to a worker at once
+    :return: iterator yielding a (grid, result) pair for each puzzle, in order. grid is the puzzle's 81 bytes, or
+             None for a line that doesn't hold one, and result is a Grade, None if the puzzle is unsolvable or the
+             line doesn't hold one, or a BudgetExceeded if its search ran out
+    """
+    grids = (grid for grid, _ in parsing.parse_batch(source))
+    grade_grid = functools.partial(_grade_grid, timeout=timeout, max_nodes=max_nodes)
+    if workers <= 1:
+        return ((grid, grade_grid(grid)) for grid in grids)
+    return _grade_parallel(grade_grid, grids, workers, chunk_size)
+
+
+def _grade_parallel(grade_grid, grids, workers, chunk_size):
+    """Yield (grid, grade_grid(grid)) for each grid, in order, computed in a pool of worker processes.
+
+    Grids are read one batch of chunks at a time, so a big file isn't read into memory at once.
+    """
+    with concurrent.futures.ProcessPoolExecutor(workers) as executor:
+        while True:
+            batch = list(itertools.islice(grids, chunk_size * workers * 4))
+            if not batch:
+                return
+            yield from zip(batch, executor.map(grade_grid, batch, chunksize=chunk_size))
+
+
+class Summary:
+    """Running totals of the grades of many puzzles: the number of puzzles of each level, and each technique's
+    steps."""
+    def __init__(self):
+        self.levels = collections.Counter()
+        self.steps = collections.Counter()
+
+    def add(self, result):
+        """Count a result from grade_many()."""
+        if isinstance(result, Grade):
+            self.levels[result.level] += 1
+            self.steps.update(result.histogram)
+            self.steps['search'] += result.guesses
+        else:
+            self.levels['unsolvable' if result is None else 'budget exceeded'] += 1
+
+    def report(self):
+        """Return the totals as a printable table."""
+        lines = ['{:<22} {:>10}'.format('level', 'puzzles')]
+        for level in ['easy', 'medium', 'hard', 'expert', 'unsolvable', 'budget exceeded']:
+            lines.append('{:<22} {:>10}'.format(level, self.levels[level]))
+        lines.append('{:<22} {:>10}'.format('technique', 'steps'))
+        for name in list(dict(TECHNIQUES)) + ['search']:
+            lines.append('{:<22} {:>10}'.format(name, self.steps[name]))
+        return '\n'.join(lines)
+
+
+if __name__ == '__main__':
+    import argparse
+
+    parser = argparse.ArgumentParser(description='Grade puzzles by the logical techniques solving them takes. Print '
+                                                 'each puzzle, its score, level and technique histogram on a line')
+    parser.add_argument('input', nargs='*', help='Batch file(s) with one puzzle per line, defaults to stdin')
+    parser.add_argument('-w', '--workers', type=int, default=1,
+                        help='Number of processes to grade puzzles in, defaults to 1')
+    parser.add_argument('-t', '--timeout', type=float,
+                        help='Seconds the search of each puzzle that logic doesn\'t solve may take')
+    parser.add_argument('--max-nodes', type=int,
+                        help='Number of guesses the search of each puzzle that logic doesn\'t solve may make')
+    parser.add_argument('--summary', action='store_true',
+                        help='Print the number of puzzles of each level and steps of each technique to stderr')
+    arguments = parser.parse_args()
+    if arguments.workers < 1:
+        parser.error('workers must be greater than 0')
+    if arguments.timeout is not None and arguments.timeout <= 0:
+        parser.error('timeout must be greater than 0')
+    if arguments.max_nodes is not None and arguments.max_nodes < 0:
+        parser.error('max-nodes can\'t be negative')
+    summary = Summary() if arguments.summary else None
+    for file_name in arguments.input or ['-']:
+        try:
+            batch_file = sys.stdin.buffer if file_name == '-' else open(file_name, 'rb')
+        except OSError:
+            print('File {} not found.'.format(file_name))
+            continue
+        with batch_file:
+            for grid, result in grade_many(batch_file, arguments.workers, arguments.timeout, arguments.max_nodes):
+                if summary is not None:
+                    summary.add(result)
+                if grid is None:
+                    print('invalid')
+                elif isinstance(result, Grade):
+                    print('{} {:.1f} {} {}'.format(grid.decode('ascii'), result.score, result.level,
+                                                   result.format_histogram()))
+                else:
+                    print('{} {}'.format(grid.decode('ascii'),
+                                         'unsolvable' if result is None else 'budget exceeded'))
+    if summary is not None:
+        print(summary.report(), file=sys.stderr)
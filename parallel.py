@@ -0,0 +1,145 @@
+import collections
+import concurrent.futures
+import functools
+import itertools
+import os
+
+import parsing
+import sudoku_solver
+import vectorized
+
+
+def _solve_chunk(chunk, method, vectorize=False, timeout=None, max_nodes=None):
+    """Worker process function. Return the solve_many() results of a list of puzzle strings."""
+    if vectorize:
+        return list(vectorized.solve_many(chunk, method, batch_size=len(chunk)))
+    return list(sudoku_solver.solve_many(chunk, method, timeout=timeout, max_nodes=max_nodes))
+
+
+def _chunks(puzzle_strings, chunk_size):
+    """Group puzzle strings into chunks, skipping blank and comment lines like solve_many() does.
+
+    :return: generator yielding (index of the chunk's first puzzle, list of puzzle strings, number of failed attempts)
+    """
+    puzzles = parsing.puzzle_lines(puzzle_strings)
+    start = 0
+    while True:
+        chunk = list(itertools.islice(puzzles, chunk_size))
+        if not chunk:
+            return
+        yield start, chunk, 0
+        start += len(chunk)
+
+
+def solve_parallel(puzzle_strings, workers=None, chunk_size=64, ordered=True, method='guess', max_retries=2,
+                   vectorize=False, timeout=None, max_nodes=None):
+    """Solve puzzles in a pool of worker processes.
+
+    Puzzles are read lazily and sent to the workers in chunks, with a bounded number of chunks in flight.
+    If a worker crashes, the pool is restarted and the puzzles it lost are rerun one at a time to find the one
+    that crashed it, so only a puzzle that keeps crashing its worker is given up on.
+
+    :param puzzle_strings: iterable of strs or bytes holding one puzzle each, e.g. the lines of a file
+    :param workers: number of worker processes, defaults to the number of CPUs
+    :param chunk_size: number of puzzles sent to a worker at once
+    :param ordered: True to yield results in input order, False to yield them as soon as their chunk is solved
+    :param method: solving engine, see sudoku_solver.solve()
+    :param max_retries: number of times a single puzzle is retried after it crashed or raised in its worker
+    :param vectorize: True to propagate each chunk with NumPy in its worker, see vectorized.solve_many()
+    :param timeout: optional number of seconds each puzzle may take, when vectorize is False, see
+                    sudoku_solver.solve()
+    :param max_nodes: optional number of guesses each puzzle's search may make, when vectorize is False
+    :return: generator yielding (puzzle index, solution) pairs, where the solution is an 81 char string, None
+             for an unsolvable, malformed or failed puzzle, or a puzzle.BudgetExceeded object for a puzzle that ran
+             past its budget. Blank and comment lines are not counted in the index.
+    """
+    workers = workers or os.cpu_count()
+    solve_chunk = functools.partial(_solve_chunk, method=method, vectorize=vectorize, timeout=timeout,
+                                    max_nodes=max_nodes)
+    max_in_flight = workers * 2
+    chunks = _chunks(puzzle_strings, chunk_size)
+    retries = collections.deque()
+    # puzzles that were on a pool when it broke. They're run one at a time until the culprit is found
+    suspects = collections.deque()
+    isolated = False
+    pending = {}
+    finished = {}
+    next_start = 0
+    executor = concurrent.futures.ProcessPoolExecutor(workers)
+    try:
+        while True:
+            try:
+                if suspects:
+                    if not pending:
+                        item = suspects.popleft()
+                        isolated = True
+                        pending[executor.submit(solve_chunk, item[1])] = item
+                else:
+                    # retries are always resubmitted, since results after them may be waiting on them to be yielded
+                    while retries:
+                        item = retries.popleft()
+                        pending[executor.submit(solve_chunk, item[1])] = item
+                    # finished chunks waiting on an earlier one count against the window so they can't pile up
+                    while len(pending) + len(finished) < max_in_flight:
+                        item = next(chunks, None)
+                        if item is None:
+                            break
+                        pending[executor.submit(solve_chunk, item[1])] = item
+            except concurrent.futures.process.BrokenProcessPool:
+                # a worker died after the last wait. Its lost chunks fail in the next wait, which restarts the pool
+                if isolated:
+                    suspects.appendleft(item)
+                    isolated = False
+                else:
+                    retries.appendleft(item)
+                if not pending:
+                    executor = concurrent.futures.ProcessPoolExecutor(workers)
+                    continue
+            if not pending:
+                break
+
+            done, _ = concurrent.futures.wait(pending, return_when=concurrent.futures.FIRST_COMPLETED)
+            pool_broken = False
+            for future in done:
+                start, chunk, attempts = pending.pop(future)
+                try:
+                    results = future.result()
+                except concurrent.futures.process.BrokenProcessPool:
+                    pool_broken = True
+                    if not isolated:
+                        suspects.extend((start + offset, [line], attempts) for offset, line in enumerate(chunk))
+                        continue
+                    # the puzzle ran on its own, so it crashed the worker
+                    if attempts < max_retries:
+                        suspects.appendleft((start, chunk, attempts + 1))
+                        continue
+                    results = [None]
+                except Exception:
+                    if len(chunk) > 1:
+                        # can't tell which puzzle failed, so retry each one on its own
+                        retries.extend((start + offset, [line], attempts) for offset, line in enumerate(chunk))
+                        continue
+                    if attempts < max_retries:
+                        retries.append((start, chunk, attempts + 1))
+                        continue
+                    results = [None]
+                if ordered:
+                    finished[start] = results
+                else:
+                    yield from enumerate(results, start)
+            isolated = False
+
+            while next_start in finished:
+                results = finished.pop(next_start)
+                yield from enumerate(results, next_start)
+                next_start += len(results)
+
+            if pool_broken:
+                # every chunk still on the broken pool is lost with it
+                for start, chunk, attempts in pending.values():
+                    suspects.extend((start + offset, [line], attempts) for offset, line in enumerate(chunk))
+                pending.clear()
+                executor.shutdown(wait=False)
+                executor = concurrent.futures.ProcessPoolExecutor(workers)
+    finally:
+        executor.shutdown(wait=False, cancel_futures=True)
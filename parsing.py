@@ -0,0 +1,117 @@
+import io
+
+# Chars that are part of a puzzle. Everything else in a puzzle file, like whitespace and grid lines, is ignored
+PUZZLE_CHARS = b'.0123456789'
+# Translation table that keeps puzzle chars, turns '0's into '.'s, since grids use '.' for unknown cells, and every
+# ignored char into a space, so the spaces can be dropped with bytes.replace(). Translating with a table of chars
+# to delete instead is a lot slower, as the delete table is rebuilt on every call.
+_CLEAN = bytes(char if char in PUZZLE_CHARS else ord(' ') for char in range(256)).replace(b'0', b'.')
+# Same, but keeping newlines to split a buffer of many puzzles on
+_CLEAN_LINES = _CLEAN[:ord('\n')] + b'\n' + _CLEAN[ord('\n') + 1:]
+# bytes methods are much faster given the byte to look for as an int
+_SPACE = ord(' ')
+_BLANK = ord('.')
+
+
+def _compact(grid):
+    """Return a (grid, number of clues) tuple for a translated line, see parse_grid()."""
+    # a line of exactly 81 puzzle chars, the usual batch file line, needs no spaces dropped
+    if len(grid) != 81 or _SPACE in grid:
+        grid = grid.replace(b' ', b'')
+        if len(grid) != 81:
+            return None, 0
+    return grid, 81 - grid.count(_BLANK)
+
+
+def parse_grid(data):
+    """Parse a buffer holding one puzzle in any layout, see README.md.
+
+    :param data: bytes, or a str, e.g. the contents of a puzzle file or one line of a batch file
+    :return: (grid, number of clues) tuple, where grid is the puzzle as 81 bytes, '.' for unknown cells,
+             or (None, 0) if the buffer doesn't hold exactly 81 puzzle chars
+    """
+    if isinstance(data, str):
+        data = data.encode('ascii', 'ignore')
+    return _compact(data.strip().translate(_CLEAN))
+
+
+def puzzle_lines(lines):
+    """Yield the lines of a batch file that can hold a puzzle, skipping blank lines and lines starting with '#'.
+
+    :param lines: iterable of bytes or strs, e.g. an open file
+    """
+    for line in lines:
+        if line.strip() and line[:1] not in (b'#', '#'):
+            yield line
+
+
+def parse_lines(data):
+    """Parse a buffer holding many puzzles, one per line, skipping blank lines and lines starting with '#'.
+
+    The whole buffer is translated and split into lines at once, so a line of exactly 81 puzzle chars only costs a
+    length check and a count of its clues.
+
+    :param data: bytes or str, e.g. the contents of a batch file
+    :return: list of (grid, number of clues) tuples, see parse_grid(), one for each line that isn't skipped
+    """
+    if isinstance(data, str):
+        data = data.encode('ascii', 'ignore')
+    grids = []
+    append = grids.append
+    start = 0
+    for grid in data.translate(_CLEAN_LINES).split(b'\n'):
+        end = start + len(grid)
+        if end - start == 81 and _SPACE not in grid:
+            append((grid, 81 - grid.count(_BLANK)))
+        else:
+            # translating doesn't move any chars, so the line can be found in the buffer to check if it's skipped
+            line = data[start:end]
+            if line.strip() and line[:1] != b'#':
+                append(_compact(grid))
+        start = end + 1
+    return grids
+
+
+def read_lines(batch_file, chunk_size=1 << 20):
+    """Parse an open batch file 'chunk_size' bytes at a time, see parse_lines().
+
+    :param batch_file: file opened in binary mode
+    :param chunk_size: number of bytes read at once
+    :return: generator yielding a (grid, number of clues) tuple for each line that isn't skipped
+    """
+    rest = b''
+    while True:
+        chunk = batch_file.read(chunk_size)
+        if not chunk:
+            break
+        # a line cut off at the end of the chunk is parsed with the next one
+        end = chunk.rfind(b'\n') + 1
+        if not end:
+            rest += chunk
+            continue
+        yield from parse_lines(rest + chunk[:end])
+        rest = chunk[end:]
+    if rest:
+        yield from parse_lines(rest)
+
+
+def parse_batch(source):
+    """Parse every line of a batch file that isn't blank or a comment.
+
+    :param source: file opened in binary mode, which is read in chunks, see read_lines(), or any iterable of bytes
+                   or strs holding one puzzle each
+    :return: iterator of (grid, number of clues) tuples, see parse_grid()
+    """
+    if isinstance(source, io.BufferedIOBase):
+        return read_lines(source)
+    return (parse_grid(line) for line in puzzle_lines(source))
+
+
+def read_grid(file_name):
+    """Read and parse a file holding one puzzle, see parse_grid().
+
+    :param file_name: name of the puzzle file
+    :raise OSError: if the file can't be read
+    """
+    with open(file_name, 'rb') as puzzle_file:
+        return parse_grid(puzzle_file.read())
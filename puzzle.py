@@ -1,5 +1,8 @@
-import copy
+import collections
 import itertools
+import time
+
+import geometry
 
 DIGITS = '123456789'
 
@@ -9,81 +12,194 @@ ROW_ITER = [[(row, col) for col in range(9)] for row in range(9)]
 COL_ITER = [[(row, col) for row in range(9)] for col in range(9)]
 BLOCK_ITER = [[(row, col) for row in rows for col in cols] for rows in BANDS for cols in BANDS]
 
+# Candidate masks #
+# A cell's candidates are a 9 bit int. Bit n is set when DIGITS[n] is still a possible value for the cell.
+ALL_CANDIDATES = (1 << 9) - 1
+DIGIT_MASKS = {digit: 1 << bit for bit, digit in enumerate(DIGITS)}
+POPCOUNT = [bin(mask).count('1') for mask in range(ALL_CANDIDATES + 1)]
+# Candidate mask of each char of a puzzle string, and of each byte of a puzzle bytes object
+CHAR_MASKS = dict(DIGIT_MASKS, **{'.': ALL_CANDIDATES, '0': ALL_CANDIDATES})
+CHAR_MASKS.update({ord(char): mask for char, mask in CHAR_MASKS.items()})
+MASK_DIGITS = [''.join(digit for digit in DIGITS if mask & DIGIT_MASKS[digit]) for mask in range(ALL_CANDIDATES + 1)]
+# One shared int object for each 9 bit value. Python only caches ints up to 256, so a puzzle built from freshly
+# computed masks would hold hundreds of its own copies of the larger ones
+MASK_VALUES = list(range(ALL_CANDIDATES + 1))
+
+# Flat index tables #
+# Cells are indexed 0-80, row by row. Units 0-8 are rows, 9-17 are columns and 18-26 are blocks. The tables are
+# geometry.STANDARD's, kept as module globals since they're looked up on the solver's hottest paths.
+UNITS = geometry.STANDARD.units
+CELL_UNITS = geometry.STANDARD.cell_units
+UNIT_PEERS = geometry.STANDARD.unit_peers
+PEERS = geometry.STANDARD.peers
+# For each of a cell's 3 units, the unit's first slot in Puzzle.positions and the cell's position bit in the unit,
+# flattened to (row slot, row bit, column slot, column bit, block slot, block bit)
+CELL_POSITIONS = geometry.STANDARD.cell_positions
+# Index of the set bit of a single bit mask
+BIT_INDEX = {1 << bit: bit for bit in range(9)}
+
+
+def popcount(mask):
+    """Return the number of candidates in a candidate mask."""
+    return POPCOUNT[mask]
+
+
+def lowest_bit(mask):
+    """Return a mask holding only the lowest candidate of a candidate mask."""
+    return mask & -mask
+
+
+def digits_to_mask(digits):
+    """Return the candidate mask of a str of digits."""
+    mask = 0
+    for digit in digits:
+        mask |= DIGIT_MASKS[digit]
+    return mask
+
 
 class SolutionError(Exception):
     """Exception thrown when a puzzle board becomes invalid."""
     pass
 
 
+class BudgetExceeded(Exception):
+    """Exception thrown when a search runs past the limits of its Budget.
+
+    'reason' is 'timeout' or 'max_nodes', and 'nodes' and 'elapsed' are the nodes and seconds the search had spent.
+    sudoku_solver.solve() returns it instead of raising it, with 'stats' set to the solve's partial SolveStats when
+    it was counting them.
+    """
+    def __init__(self, reason, nodes, elapsed):
+        super().__init__(reason, nodes, elapsed)
+        self.reason = reason
+        self.nodes = nodes
+        self.elapsed = elapsed
+        self.stats = None
+
+    def __str__(self):
+        return 'budget exceeded ({}) after {} nodes in {:.3f}s'.format(self.reason, self.nodes, self.elapsed)
+
+
+class SolveStats:
+    """Counts of the work done solving puzzles, recorded while a Puzzle's 'stats' attribute is set to one.
+
+    Eliminations are counted for the technique named by 'technique' when they happen. Candidates removed from the
+    peers of the cells a technique solves are counted for that technique too.
+    """
+    def __init__(self):
+        self.guesses = 0
+        self.failed_branches = 0
+        self.max_depth = 0
+        self.errors = 0
+        self.eliminations = collections.Counter()
+        self.technique = 'other'
+        # number of guesses on the search's current path
+        self.depth = 0
+
+    def report(self):
+        """Return the counts as a printable table."""
+        lines = ['{:<22} {:>10}'.format('guesses', self.guesses),
+                 '{:<22} {:>10}'.format('failed branches', self.failed_branches),
+                 '{:<22} {:>10}'.format('max depth', self.max_depth),
+                 '{:<22} {:>10}'.format('SolutionErrors', self.errors),
+                 'eliminations:']
+        for technique, count in self.eliminations.most_common():
+            lines.append('  {:<20} {:>10}'.format(technique, count))
+        return '\n'.join(lines)
+
+
+class Budget:
+    """Limits on the search of a solve, checked while a Puzzle's 'budget' attribute is set to one.
+
+    Every guess the search makes is a node. Both limits are checked at each node, which costs a counter increment
+    and a clock read, so the search stops within one guess's propagation of running out.
+    """
+    def __init__(self, timeout=None, max_nodes=None):
+        """Start the budget's clock.
+
+        :param timeout: seconds the solve may take, or None for no limit
+        :param max_nodes: number of guesses the search may make, or None for no limit
+        """
+        self.timeout = timeout
+        self.max_nodes = max_nodes
+        self.nodes = 0
+        self.start = time.monotonic()
+        self.deadline = self.start + timeout if timeout is not None else None
+
+    def spend(self):
+        """Count a search node.
+
+        :raise BudgetExceeded: if the node or time limit has been passed
+        """
+        self.nodes += 1
+        if self.max_nodes is not None and self.nodes > self.max_nodes:
+            raise BudgetExceeded('max_nodes', self.nodes - 1, time.monotonic() - self.start)
+        if self.deadline is not None:
+            now = time.monotonic()
+            if now > self.deadline:
+                raise BudgetExceeded('timeout', self.nodes - 1, now - self.start)
+
+
 class Cell:
-    """A single cell of a sudoku puzzle"""
-    def __init__(self, row, col, val=DIGITS):
+    """A single cell of a sudoku puzzle.
+
+    Cells don't store their own candidates. They are views onto one slot of their puzzle's candidate mask array.
+    """
+    __slots__ = ('POS', 'INDEX', 'dont_remove', '_puzzle')
+
+    def __init__(self, puzzle, row, col):
         """Initialize a cell.
 
+        :param puzzle: Puzzle object the cell belongs to
         :param row: cell's row
         :param col: cell's column
-        :param val: str of a clue's value, '123456789' for a cell with an unknown value
         """
         self.POS = (row, col)
-        self._changed = False
+        self.INDEX = row * 9 + col
         self.dont_remove = ''
-        self.candidates = val
-        if val != DIGITS:
-            self._solved = True
-            self._last_candidate = val
-        else:
-            self._solved = False
-            self._last_candidate = ''
+        self._puzzle = puzzle
 
-    def __deepcopy__(self, memodict={}):
-        """Make a deepcopy of a cell."""
-        cls = self.__class__
-        result = cls.__new__(cls)
-        memodict[id(self)] = result
-        result.POS = self.POS
-        result._changed = False
-        result.dont_remove = ''
-        result.candidates = self.candidates
-        result._solved = self._solved
-        result._last_candidate = self._last_candidate
-        return result
+    @property
+    def candidates(self):
+        """Return this cell's candidate list as a str of digits."""
+        return MASK_DIGITS[self._puzzle.masks[self.INDEX]]
+
+    @candidates.setter
+    def candidates(self, vals):
+        puzzle = self._puzzle
+        if puzzle.trail is not None:
+            puzzle.trail.append((self.INDEX, puzzle.masks[self.INDEX]))
+        puzzle._restore_mask(self.INDEX, digits_to_mask(vals))
+
+    @property
+    def mask(self):
+        """Return this cell's candidate mask."""
+        return self._puzzle.masks[self.INDEX]
 
     def is_changed(self):
-        """Return whether this cell has had its candidate list changed."""
-        return self._changed
+        """Return whether the puzzle this cell belongs to has had a candidate list changed."""
+        return self._puzzle.changed
 
     def is_solved(self):
         """Return whether this cell has been solved."""
-        return self._solved
+        return POPCOUNT[self._puzzle.masks[self.INDEX]] == 1
 
     def last_candidate(self):
-        """Return this cell's solved value."""
-        return self._last_candidate
+        """Return this cell's solved value, or '' if it is unsolved."""
+        mask = self._puzzle.masks[self.INDEX]
+        return MASK_DIGITS[mask] if POPCOUNT[mask] == 1 else ''
 
     def remove_candidate(self, candidate):
         """Remove value from this cell's candidate list. Raise SolutionError if trying to remove the last candidate."""
-        if candidate in self.candidates and candidate not in self.dont_remove:
-            if self.is_solved():
-                raise SolutionError()
-            self.candidates = self.candidates.replace(candidate, '')
-            self._changed = True
-            candidates = self.candidates
-            if len(candidates) == 1:
-                self._solved = True
-                self._last_candidate = candidates
+        if candidate not in self.dont_remove:
+            self._puzzle.remove_candidates(self.INDEX, DIGIT_MASKS[candidate])
 
     def set_cell(self, vals):
-        """Set this cell's candidate list to the union of its candidate list and the set of provided values."""
-        new_candidates_list = [val for val in vals if val in self.candidates]  # don't add candidates already ruled out
-        new_candidates = ''.join(new_candidates_list)
-        if self.candidates == new_candidates:  # candidates already equal to new values
-            return
-        self.candidates = new_candidates
-        self._changed = True
-        candidates = self.candidates
-        if len(candidates) == 1:
-            self._solved = True
-            self._last_candidate = candidates
+        """Set this cell's candidate list to the intersection of its candidate list and the set of provided values.
+
+        Raise SolutionError if none of the provided values are candidates.
+        """
+        self._puzzle.set_candidates(self.INDEX, digits_to_mask(vals))
 
     def print_cell(self):
         """Print this cell's position and candidate list for debugging."""
@@ -92,57 +208,115 @@ class Cell:
 
 
 class Puzzle:
-    """A sudoku puzzle."""
+    """A sudoku puzzle.
+
+    The candidates of all 81 cells are kept as candidate masks in the flat list 'masks'.
+
+    The puzzle also keeps the inverse index, 'positions'. positions[unit_index * 9 + digit] is a 9 bit mask of the
+    places in the unit where the digit is still a candidate, bit n standing for the unit's nth cell. Its popcount is
+    the number of places left for the digit. When that count drops to 1, the (unit, digit) slot is pushed onto
+    'hidden_singles' for algorithms.basic_solve(), and when it drops to 0 the puzzle has no solution.
+
+    'buckets' groups the cells by candidate count. buckets[n] is the set of indices of the cells with n candidates,
+    so the unsolved cells with the fewest candidates can be found without scanning the board. The sets take more
+    memory than the rest of the puzzle, and only the search needs them, so they are None until fewest_candidates()
+    is first called.
+
+    Once checkpoint() has been called, every change to a mask is also recorded on 'trail' as an (index, old mask)
+    pair, so the puzzle can be rewound to the checkpoint instead of being copied before a guess.
+
+    'stats' is None, or a SolveStats object that the solve's work is counted in. 'budget' is None, or a Budget the
+    search is limited by. Copies share both.
+    """
+    __slots__ = ('masks', 'positions', 'hidden_singles', 'buckets', 'trail', 'stats', 'budget', '_changed', '_cells')
+
     def __init__(self, raw_puzzle):
         """Initialize the puzzle.
 
-        :param raw_puzzle: 81 char string with '.' or '0' for unknown cells and 1-9 for clues.
+        :param raw_puzzle: 81 char string, or 81 bytes, with '.' or '0' for unknown cells and 1-9 for clues.
                            First 9 chars are first row, second 9 chars are second row, etc.
         """
-        self.cell_array = [[] for _ in range(9)]
-        pos = 0
-        num_clues = 0
-        for row, col in itertools.product(range(9), repeat=2):
-            if raw_puzzle[pos] != '.' and raw_puzzle[pos] != '0':
-                num_clues += 1
-                self.cell_array[row].append(Cell(row, col, raw_puzzle[pos]))
-            else:
-                self.cell_array[row].append(Cell(row, col))
-            pos += 1
+        self.masks = [CHAR_MASKS[char] for char in raw_puzzle[:81]]
+        self._changed = False
+        self._cells = None
+        self.trail = None
+        self.stats = None
+        self.budget = None
+        self.buckets = None
+        self._build_indexes()
+
+    def _build_indexes(self):
+        """Build 'positions' and 'hidden_singles' from the candidate masks."""
+        masks = self.masks
+        self.positions = positions = []
+        for unit in UNITS:
+            # a cell with every candidate is a place for every digit, so only the other cells' candidates are looped
+            open_places = 0
+            places = [0] * 9
+            for position, index in enumerate(unit):
+                mask = masks[index]
+                if mask == ALL_CANDIDATES:
+                    open_places |= 1 << position
+                    continue
+                while mask:
+                    bit = mask & -mask
+                    mask ^= bit
+                    places[BIT_INDEX[bit]] |= 1 << position
+            positions.extend([MASK_VALUES[open_places | digit_places] for digit_places in places])
+        self.hidden_singles = [slot for slot, places in enumerate(positions) if POPCOUNT[places] <= 1]
+
+    def _build_buckets(self):
+        """Build 'buckets' from the candidate masks."""
+        self.buckets = buckets = [set() for _ in range(10)]
+        for index, mask in enumerate(self.masks):
+            buckets[POPCOUNT[mask]].add(index)
+
+    def __str__(self):
+        """Return the puzzle as an 81 char string with '.' for unsolved cells."""
+        return ''.join(MASK_DIGITS[mask] if POPCOUNT[mask] == 1 else '.' for mask in self.masks)
 
     def __deepcopy__(self, memodict={}):
         """Make a deepcopy of a puzzle."""
+        result = self.copy()
+        memodict[id(self)] = result
+        return result
+
+    def copy(self):
+        """Return a copy of the puzzle with its changed flag cleared."""
         cls = self.__class__
         result = cls.__new__(cls)
-        memodict[id(self)] = result
-        result.cell_array = [[] for _ in range(9)]
-        for row, col in itertools.product(range(9), repeat=2):
-            result.cell_array[row].append(copy.deepcopy(self.cell_array[row][col], memodict))
+        result.masks = self.masks[:]
+        result.positions = self.positions[:]
+        result.hidden_singles = self.hidden_singles[:]
+        result.buckets = [cells.copy() for cells in self.buckets] if self.buckets is not None else None
+        result._changed = False
+        result._cells = None
+        result.trail = None
+        result.stats = self.stats
+        result.budget = self.budget
         return result
 
+    @property
+    def cell_array(self):
+        """Return a 9x9 list of Cell views onto the puzzle. The views are built on first access."""
+        if self._cells is None:
+            self._cells = [[Cell(self, row, col) for col in range(9)] for row in range(9)]
+        return self._cells
+
     @property
     def changed(self):
         """Return True if any cell has been changed, False if none have."""
-        for row, col in itertools.product(range(9), repeat=2):
-            if self.cell_array[row][col].is_changed():
-                return True
-        return False
+        return self._changed
 
     @changed.setter
     def changed(self, changed):
-        # if changed being set to false, all cells _changed must be false
-        if not changed:
-            for row, col in itertools.product(range(9), repeat=2):
-                self.cell_array[row][col]._changed = changed
-        # if changed being set to true, only one cell _changed must be true
-        elif changed:
-            self.cell_array[0][0]._changed = changed
+        self._changed = changed
 
     @property
     def solved(self):
         """Return True if puzzle is solved, False if not."""
-        for row, col in itertools.product(range(9), repeat=2):
-            if not self.cell_array[row][col].is_solved():
+        for mask in self.masks:
+            if POPCOUNT[mask] != 1:
                 return False
         try:
             self.check()
@@ -150,25 +324,157 @@ class Puzzle:
         except SolutionError:
             return False
 
-    def check(self):
-        """Return True if there are no mistakes in the puzzle, False if there are."""
-        for unit_type in [ROW_ITER, COL_ITER, BLOCK_ITER]:
-            for unit in unit_type:
-                solved_vals = []
-                for row, col in unit:
-                    cell = self.cell_array[row][col]
-                    if cell.is_solved():
-                        solved_vals.append(cell.last_candidate())
-                if len(solved_vals) != len(set(solved_vals)):
+    def remove_candidates(self, index, mask):
+        """Remove the candidates in a mask from a cell's candidate mask.
+
+        :param index: flat index of the cell, 0-80
+        :param mask: candidate mask of the values to remove
+        :return: the cell's new candidate mask
+        :raise SolutionError: if the cell would be left without candidates, or a removed value would be left
+                              without a place in one of the cell's units
+        """
+        old_mask = self.masks[index]
+        removed = old_mask & mask
+        if not removed:
+            return old_mask
+        new_mask = old_mask ^ removed
+        if not new_mask:
+            raise SolutionError()
+        if self.trail is not None:
+            self.trail.append((index, old_mask))
+        if self.stats is not None:
+            self.stats.eliminations[self.stats.technique] += POPCOUNT[removed]
+        self.masks[index] = new_mask
+        self._changed = True
+        buckets = self.buckets
+        if buckets is not None:
+            buckets[POPCOUNT[old_mask]].discard(index)
+            buckets[POPCOUNT[new_mask]].add(index)
+
+        # the loop is unrolled over the cell's 3 units since this is the solver's hottest path
+        positions = self.positions
+        row_slot, row_bit, col_slot, col_bit, block_slot, block_bit = CELL_POSITIONS[index]
+        while removed:
+            val = removed & -removed
+            removed ^= val
+            digit = BIT_INDEX[val]
+            row_places = positions[row_slot + digit] & ~row_bit
+            positions[row_slot + digit] = row_places
+            col_places = positions[col_slot + digit] & ~col_bit
+            positions[col_slot + digit] = col_places
+            block_places = positions[block_slot + digit] & ~block_bit
+            positions[block_slot + digit] = block_places
+            if POPCOUNT[row_places] <= 1 or POPCOUNT[col_places] <= 1 or POPCOUNT[block_places] <= 1:
+                if not row_places or not col_places or not block_places:
                     raise SolutionError()
+                if POPCOUNT[row_places] == 1:
+                    self.hidden_singles.append(row_slot + digit)
+                if POPCOUNT[col_places] == 1:
+                    self.hidden_singles.append(col_slot + digit)
+                if POPCOUNT[block_places] == 1:
+                    self.hidden_singles.append(block_slot + digit)
+        return new_mask
+
+    def _restore_mask(self, index, mask):
+        """Overwrite a cell's candidate mask, updating 'positions' for candidates added back or removed."""
+        old_mask = self.masks[index]
+        self.masks[index] = mask
+        if self.buckets is not None:
+            self.buckets[POPCOUNT[old_mask]].discard(index)
+            self.buckets[POPCOUNT[mask]].add(index)
+        positions = self.positions
+        row_slot, row_bit, col_slot, col_bit, block_slot, block_bit = CELL_POSITIONS[index]
+        vals = old_mask | mask
+        while vals:
+            val = vals & -vals
+            vals ^= val
+            digit = BIT_INDEX[val]
+            if mask & val:
+                positions[row_slot + digit] |= row_bit
+                positions[col_slot + digit] |= col_bit
+                positions[block_slot + digit] |= block_bit
+            else:
+                positions[row_slot + digit] &= ~row_bit
+                positions[col_slot + digit] &= ~col_bit
+                positions[block_slot + digit] &= ~block_bit
+
+    def set_candidates(self, index, mask):
+        """Reduce a cell's candidate mask to its intersection with a mask.
+
+        :param index: flat index of the cell, 0-80
+        :param mask: candidate mask of the values to keep
+        :return: the cell's new candidate mask
+        :raise SolutionError: if the cell would be left without candidates
+        """
+        return self.remove_candidates(index, self.masks[index] & ~mask)
+
+    def checkpoint(self):
+        """Start recording changes on the trail if it isn't already, and return a token for rewind()."""
+        if self.trail is None:
+            self.trail = []
+        return len(self.trail), self._changed, self.hidden_singles[:]
+
+    def rewind(self, checkpoint):
+        """Undo every change recorded on the trail since checkpoint() returned the given token.
+
+        :param checkpoint: token returned by checkpoint()
+        """
+        trail_length, changed, hidden_singles = checkpoint
+        trail = self.trail
+        masks = self.masks
+        positions = self.positions
+        buckets = self.buckets
+        while len(trail) > trail_length:
+            index, old_mask = trail.pop()
+            # changes are undone newest first, so the only difference is the candidates that were removed
+            added = old_mask & ~masks[index]
+            if buckets is not None:
+                buckets[POPCOUNT[masks[index]]].discard(index)
+                buckets[POPCOUNT[old_mask]].add(index)
+            masks[index] = old_mask
+            row_slot, row_bit, col_slot, col_bit, block_slot, block_bit = CELL_POSITIONS[index]
+            while added:
+                val = added & -added
+                added ^= val
+                digit = BIT_INDEX[val]
+                positions[row_slot + digit] |= row_bit
+                positions[col_slot + digit] |= col_bit
+                positions[block_slot + digit] |= block_bit
+        self._changed = changed
+        self.hidden_singles = hidden_singles[:]
+
+    def fewest_candidates(self):
+        """Return the set of indices of the unsolved cells with the fewest candidates, empty if every cell is solved.
+
+        The set is the puzzle's own bucket, so it must not be changed.
+        """
+        if self.buckets is None:
+            self._build_buckets()
+        buckets = self.buckets
+        for count in range(2, 10):
+            if buckets[count]:
+                return buckets[count]
+        return buckets[0]
+
+    def check(self):
+        """Raise SolutionError if two solved cells in a unit share a value."""
+        masks = self.masks
+        for unit in UNITS:
+            solved_vals = 0
+            for index in unit:
+                mask = masks[index]
+                if POPCOUNT[mask] == 1:
+                    if solved_vals & mask:
+                        raise SolutionError()
+                    solved_vals |= mask
 
     def print_puzzle(self):
         """Print the puzzle with unsolved cells as a '.', and solved cells as their value."""
         for row in range(9):
             for col in range(9):
-                cell = self.cell_array[row][col]
-                if cell.is_solved():
-                    print(cell.last_candidate(), end=' ')
+                mask = self.masks[row * 9 + col]
+                if POPCOUNT[mask] == 1:
+                    print(MASK_DIGITS[mask], end=' ')
                 else:
                     print('.', end=' ')
                 if col == 2 or col == 5:
@@ -0,0 +1,298 @@
+import asyncio
+import concurrent.futures
+import multiprocessing
+import os
+import sys
+
+import puzzle as pzl
+import sudoku_solver
+
+# Protocol #
+# Clients send one puzzle per line, optionally prefixed by a request ID and a space: 'ID PUZZLE' or 'PUZZLE'. A line
+# without an ID is given its number among the connection's puzzles, counting from 0. Blank lines and lines starting
+# with '#' are skipped, like in batch files. For every puzzle the server sends back one line, 'ID RESULT', as soon
+# as it's done, so responses can arrive out of order. RESULT is the 81 char solution, or one of the statuses below.
+UNSOLVABLE = 'unsolvable'
+INVALID = 'invalid'
+# the puzzle's search ran past the server's timeout or node limit
+TIMEOUT = 'timeout'
+ERROR = 'error'
+# longest request line read before the connection is dropped
+MAX_LINE = 4096
+# time given to a worker past a puzzle's timeout to stop its search and report back
+GRACE = 1.0
+
+
+def solve_puzzle(puzzle_string, method='guess', timeout=None, max_nodes=None):
+    """Worker process function. Solve one puzzle string, giving up on its search after 'timeout' seconds or
+    'max_nodes' guesses.
+
+    The search checks its puzzle.Budget at every guess, so a runaway search stops itself and the worker is free for
+    the next puzzle.
+
+    :param puzzle_string: 81 char puzzle string
+    :param method: solving engine, see sudoku_solver.solve()
+    :param timeout: seconds the puzzle may take, or None for no limit
+    :param max_nodes: number of guesses the search may make, or None for no limit
+    :return: the 81 char solution string, UNSOLVABLE or TIMEOUT
+    """
+    puzzle = sudoku_solver.solve(pzl.Puzzle(puzzle_string), method, timeout=timeout, max_nodes=max_nodes)
+    if isinstance(puzzle, pzl.BudgetExceeded):
+        return TIMEOUT
+    if puzzle and puzzle.solved:
+        return str(puzzle)
+    return UNSOLVABLE
+
+
+def parse_request(line, line_number):
+    """Split a request line into its request ID and puzzle string.
+
+    :param line: bytes of one request line, see Protocol above
+    :param line_number: number of the puzzle on its connection, used as the ID of a line without one
+    :return: (request ID str, puzzle string) tuple, the puzzle string being None if the line doesn't hold a valid
+             puzzle
+    """
+    line = line.strip()
+    request_id, _, puzzle_part = line.partition(b' ')
+    if not puzzle_part:
+        request_id, puzzle_part = str(line_number).encode('ascii'), line
+    return request_id.decode('ascii', 'replace'), sudoku_solver.parse_line(puzzle_part)
+
+
+class SolveServer:
+    """An asyncio server that solves line delimited puzzles in a pool of worker processes.
+
+    Backpressure works at two levels. A connection stops being read while it has 'connection_limit' puzzles
+    waiting to be answered, and every connection stops being read while the server has 'queue_limit' puzzles
+    waiting, so a client sending faster than the workers solve is held back by TCP flow control instead of
+    filling the server's memory. Responses are written by one task per connection that waits for the client to
+    read them before writing more.
+    """
+    def __init__(self, method='guess', workers=None, queue_limit=1024, connection_limit=64, timeout=10.0,
+                 max_nodes=None):
+        """Initialize the server. The worker pool is started by start().
+
+        :param method: solving engine, see sudoku_solver.solve()
+        :param workers: number of worker processes, defaults to the number of CPUs
+        :param queue_limit: number of puzzles, over all connections, read but not yet answered
+        :param connection_limit: number of puzzles of one connection read but not yet answered
+        :param timeout: seconds a puzzle may take before it's answered with TIMEOUT, or None for no limit
+        :param max_nodes: number of guesses a puzzle's search may make before it's answered with TIMEOUT, or None
+                          for no limit
+        """
+        self.method = method
+        self.workers = workers or os.cpu_count()
+        self.queue_limit = queue_limit
+        self.connection_limit = connection_limit
+        self.timeout = timeout
+        self.max_nodes = max_nodes
+        self.executor = None
+        # forked workers would inherit the sockets of open connections and keep them from closing, so workers are
+        # started by a fork server, or spawned where there isn't one
+        methods = multiprocessing.get_all_start_methods()
+        self._context = multiprocessing.get_context('forkserver' if 'forkserver' in methods else 'spawn')
+        self._server = None
+        self._queue_slots = None
+        self._worker_slots = None
+
+    def _new_executor(self):
+        return concurrent.futures.ProcessPoolExecutor(self.workers, self._context)
+
+    async def start(self, host='127.0.0.1', port=0, path=None):
+        """Start the worker pool and listen on a TCP port, or on a Unix socket if 'path' is given.
+
+        :param host: interface to listen on
+        :param port: TCP port to listen on, 0 to pick a free one
+        :param path: name of a Unix socket to listen on instead of TCP
+        :return: list of the addresses listened on
+        """
+        self.executor = self._new_executor()
+        self._queue_slots = asyncio.Semaphore(self.queue_limit)
+        self._worker_slots = asyncio.Semaphore(self.workers)
+        if path:
+            self._server = await asyncio.start_unix_server(self.handle, path, limit=MAX_LINE)
+        else:
+            self._server = await asyncio.start_server(self.handle, host, port, limit=MAX_LINE)
+        return [sock.getsockname() for sock in self._server.sockets]
+
+    async def serve_forever(self):
+        await self._server.serve_forever()
+
+    async def close(self):
+        """Stop listening and shut the worker pool down, cancelling puzzles that haven't started."""
+        if self._server is not None:
+            self._server.close()
+            await self._server.wait_closed()
+        if self.executor is not None:
+            self.executor.shutdown(wait=False, cancel_futures=True)
+
+    def _release_worker(self, loop):
+        """Give a worker slot back from the pool's thread once its worker is done with a puzzle."""
+        try:
+            loop.call_soon_threadsafe(self._worker_slots.release)
+        except RuntimeError:
+            # the loop was closed while the worker was still busy
+            pass
+
+    async def solve(self, puzzle_string):
+        """Solve a puzzle string in the worker pool.
+
+        Puzzles are only handed to the pool while it has a free worker, so a puzzle's timeout runs from when a
+        worker starts on it, not while it waits behind other puzzles.
+
+        :return: the 81 char solution string, or UNSOLVABLE, TIMEOUT or ERROR
+        """
+        loop = asyncio.get_running_loop()
+        await self._worker_slots.acquire()
+        executor = self.executor
+        try:
+            try:
+                future = executor.submit(solve_puzzle, puzzle_string, self.method, self.timeout, self.max_nodes)
+            except BaseException:
+                self._worker_slots.release()
+                raise
+            # the slot is held until the worker is done, even with a puzzle that's been answered with TIMEOUT
+            future.add_done_callback(lambda _: self._release_worker(loop))
+            # the worker stops its own search at the timeout. This only fires if it's stuck outside the search,
+            # and the worker is left to finish
+            return await asyncio.wait_for(asyncio.wrap_future(future), self.timeout + GRACE if self.timeout else None)
+        except asyncio.TimeoutError:
+            return TIMEOUT
+        except concurrent.futures.process.BrokenProcessPool:
+            # a worker died, which breaks the whole pool, so it's replaced unless another puzzle already did that
+            if self.executor is executor:
+                executor.shutdown(wait=False)
+                self.executor = self._new_executor()
+            return ERROR
+        except Exception:
+            return ERROR
+
+    async def _answer(self, request_id, puzzle_string, responses, connection_slots):
+        """Solve one request and queue its response line for the connection's writer.
+
+        The connection's slot is released by the writer once the response is written, so a client that doesn't
+        read its responses stops being read too.
+        """
+        queued = False
+        try:
+            result = await self.solve(puzzle_string) if puzzle_string else INVALID
+            await responses.put('{} {}\n'.format(request_id, result).encode('ascii', 'replace'))
+            queued = True
+        finally:
+            self._queue_slots.release()
+            if not queued:
+                connection_slots.release()
+
+    @staticmethod
+    async def _write_responses(responses, writer, connection_slots):
+        """Write queued response lines to a client until a None is queued, waiting for the client to keep up."""
+        while True:
+            response = await responses.get()
+            if response is None:
+                return
+            writer.write(response)
+            await writer.drain()
+            connection_slots.release()
+
+    async def handle(self, reader, writer):
+        """Serve one connection until the client closes its end, then answer its outstanding puzzles."""
+        connection_slots = asyncio.Semaphore(self.connection_limit)
+        responses = asyncio.Queue()
+        response_writer = asyncio.create_task(self._write_responses(responses, writer, connection_slots))
+        tasks = set()
+        line_number = 0
+        try:
+            while True:
+                # slots are taken before the line is read, so a full queue stops reading the socket
+                await connection_slots.acquire()
+                await self._queue_slots.acquire()
+                dispatched = False
+                try:
+                    try:
+                        line = await reader.readline()
+                    except ValueError:
+                        # a line longer than MAX_LINE. The rest of the stream can't be split into requests reliably
+                        break
+                    if not line:
+                        break
+                    if line.strip() and line[:1] != b'#':
+                        request_id, puzzle_string = parse_request(line, line_number)
+                        line_number += 1
+                        task = asyncio.create_task(
+                            self._answer(request_id, puzzle_string, responses, connection_slots))
+                        tasks.add(task)
+                        task.add_done_callback(tasks.discard)
+                        dispatched = True
+                finally:
+                    if not dispatched:
+                        connection_slots.release()
+                        self._queue_slots.release()
+            if tasks:
+                await asyncio.gather(*tasks)
+            await responses.put(None)
+            await response_writer
+        except (ConnectionError, asyncio.CancelledError) as err:
+            for task in tasks:
+                task.cancel()
+            response_writer.cancel()
+            if isinstance(err, asyncio.CancelledError):
+                raise
+        finally:
+            writer.close()
+            try:
+                await writer.wait_closed()
+            except (ConnectionError, asyncio.CancelledError):
+                # a connection reset, or closed while the server shuts down, has nothing left to clean up
+                pass
+
+
+async def serve(host='127.0.0.1', port=8081, path=None, method='guess', workers=None, queue_limit=1024,
+                connection_limit=64, timeout=10.0, max_nodes=None):
+    """Run a SolveServer until the process is interrupted. See SolveServer for the parameters."""
+    server = SolveServer(method, workers, queue_limit, connection_limit, timeout, max_nodes)
+    addresses = await server.start(host, port, path)
+    print('Listening on {}'.format(', '.join(str(address) for address in addresses)), file=sys.stderr)
+    try:
+        await server.serve_forever()
+    finally:
+        await server.close()
+
+
+if __name__ == '__main__':
+    import argparse
+
+    parser = argparse.ArgumentParser(description='Serve the solver over TCP or a Unix socket, one puzzle per line')
+    parser.add_argument('--host', default='127.0.0.1', help='Interface to listen on, defaults to 127.0.0.1')
+    parser.add_argument('-p', '--port', type=int, default=8081, help='TCP port to listen on, defaults to 8081')
+    parser.add_argument('--unix', metavar='PATH', help='Listen on a Unix socket at PATH instead of TCP')
+    parser.add_argument('-m', '--method', choices=sudoku_solver.METHODS, default='guess',
+                        help='Solving engine, defaults to guess')
+    parser.add_argument('-w', '--workers', type=int, help='Number of worker processes, defaults to the number of CPUs')
+    parser.add_argument('-q', '--queue-limit', type=int, default=1024,
+                        help='Number of puzzles read but not yet answered, over all connections, before reading '
+                             'stops, defaults to 1024')
+    parser.add_argument('-l', '--connection-limit', type=int, default=64,
+                        help='Number of puzzles of one connection read but not yet answered before reading it '
+                             'stops, defaults to 64')
+    parser.add_argument('-t', '--timeout', type=float, default=10.0,
+                        help='Seconds a puzzle may take before its search is stopped, 0 for no limit, '
+                             'defaults to 10')
+    parser.add_argument('--max-nodes', type=int,
+                        help='Number of guesses a puzzle\'s search may make before it is stopped, defaults to no limit')
+    arguments = parser.parse_args()
+    if arguments.workers is not None and arguments.workers < 1:
+        parser.error('workers must be greater than 0')
+    if arguments.queue_limit < 1 or arguments.connection_limit < 1:
+        parser.error('queue and connection limits must be greater than 0')
+    if arguments.timeout < 0:
+        parser.error('timeout can\'t be negative')
+    if arguments.max_nodes is not None and arguments.max_nodes < 0:
+        parser.error('max-nodes can\'t be negative')
+    if arguments.unix and not hasattr(asyncio, 'start_unix_server'):
+        parser.error('Unix sockets aren\'t supported on this platform')
+    try:
+        asyncio.run(serve(arguments.host, arguments.port, arguments.unix, arguments.method, arguments.workers,
+                          arguments.queue_limit, arguments.connection_limit, arguments.timeout or None,
+                          arguments.max_nodes))
+    except KeyboardInterrupt:
+        pass
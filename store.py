@@ -0,0 +1,185 @@
+import mmap
+import os
+import struct
+import zlib
+
+# file locking is only needed to keep concurrent writers apart, so the store works without it on Windows
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+# Store file layout #
+# A header, then a hash table of 'capacity' slots. Each slot is a packed puzzle followed by its packed solution,
+# and a slot whose puzzle is all zeros is empty. A grid packs into 41 bytes at 4 bits per cell, cell values 0-9
+# being the cell's hex digit, so packing and unpacking is bytes.fromhex() and bytes.hex().
+MAGIC = b'SUDOKUDB'
+VERSION = 1
+HEADER = struct.Struct('<8sHxxII')  # magic, version, capacity, number of puzzles
+GRID_SIZE = 41
+SLOT_SIZE = GRID_SIZE * 2
+EMPTY = bytes(GRID_SIZE)
+# the table is grown when it gets fuller than this, to keep probe sequences short
+MAX_LOAD = 0.5
+
+_TO_HEX = str.maketrans('.', '0')
+_FROM_HEX = str.maketrans('0', '.')
+
+
+def pack(puzzle_string):
+    """Pack an 81 char puzzle or solution string, '.' or '0' for unknown cells, into 41 bytes."""
+    return bytes.fromhex(puzzle_string.translate(_TO_HEX) + '0')
+
+
+def unpack(grid):
+    """Return the 81 char string, '.' for unknown cells, of a grid packed by pack()."""
+    return grid.hex()[:81].translate(_FROM_HEX)
+
+
+class SolutionStore:
+    """An on-disk hash table of puzzle solutions, read through mmap.
+
+    Lookups hash the packed puzzle and probe the memory mapped table, so nothing is parsed. Solutions are written
+    into the table in place, and when it gets too full a table twice the size is written to a new file that
+    replaces the old one. A reader that still has the old file mapped keeps a complete view of it, so any number of
+    processes can read the store while one writes. Writers take a lock on 'path'.lock where fcntl is available.
+    """
+    def __init__(self, path, capacity=1024):
+        """Open the store, creating it if it doesn't exist.
+
+        :param path: name of the store file
+        :param capacity: number of slots of a new store's table
+        :raise ValueError: if the file isn't a store
+        """
+        self.path = path
+        self._file = None
+        self._map = None
+        if not os.path.exists(path):
+            with self._lock():
+                if not os.path.exists(path):
+                    self._write_table(path, max(capacity, 1), [])
+        self._open()
+
+    def _open(self):
+        """Map the store file, replacing any mapping of a file it has replaced."""
+        self.close()
+        self._file = open(self.path, 'r+b')
+        if os.fstat(self._file.fileno()).st_size < HEADER.size:
+            self.close()
+            raise ValueError('{} is not a solution store'.format(self.path))
+        self._map = mmap.mmap(self._file.fileno(), 0)
+        magic, version, self.capacity, self.count = HEADER.unpack_from(self._map)
+        if magic != MAGIC or version != VERSION or len(self._map) != HEADER.size + self.capacity * SLOT_SIZE:
+            self.close()
+            raise ValueError('{} is not a solution store'.format(self.path))
+
+    def _lock(self):
+        """Return an open lock file, holding an exclusive lock on it if fcntl is available. Close it to unlock."""
+        lock_file = open(self.path + '.lock', 'a')
+        if fcntl:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+        return lock_file
+
+    @staticmethod
+    def _write_table(path, capacity, records):
+        """Write a store file holding a list of (packed puzzle, packed solution) records, replacing 'path'."""
+        table = bytearray(HEADER.size + capacity * SLOT_SIZE)
+        HEADER.pack_into(table, 0, MAGIC, VERSION, capacity, len(records))
+        for key, solution in records:
+            slot = zlib.crc32(key) % capacity
+            while table[HEADER.size + slot * SLOT_SIZE:HEADER.size + slot * SLOT_SIZE + GRID_SIZE] != EMPTY:
+                slot = (slot + 1) % capacity
+            offset = HEADER.size + slot * SLOT_SIZE
+            table[offset:offset + SLOT_SIZE] = key + solution
+        temp_path = '{}.{}.tmp'.format(path, os.getpid())
+        with open(temp_path, 'wb') as temp_file:
+            temp_file.write(table)
+        os.replace(temp_path, path)
+
+    def _find(self, key):
+        """Return the offset of the slot holding a packed puzzle, or of the empty slot it would go in, and True if
+        the puzzle was found."""
+        view = memoryview(self._map)
+        capacity = self.capacity
+        slot = zlib.crc32(key) % capacity
+        try:
+            while True:
+                offset = HEADER.size + slot * SLOT_SIZE
+                stored = view[offset:offset + GRID_SIZE]
+                if stored == key:
+                    return offset, True
+                if stored == EMPTY:
+                    return offset, False
+                slot = (slot + 1) % capacity
+        finally:
+            view.release()
+
+    def __len__(self):
+        return self.count
+
+    def __contains__(self, puzzle_string):
+        return self.get(puzzle_string) is not None
+
+    def get(self, puzzle_string):
+        """Return the stored solution of a puzzle, or None if it isn't in the store.
+
+        :param puzzle_string: 81 char puzzle string
+        :return: 81 char solution string, or None
+        """
+        offset, found = self._find(pack(puzzle_string))
+        if not found:
+            return None
+        return unpack(self._map[offset + GRID_SIZE:offset + SLOT_SIZE])
+
+    def put(self, puzzle_string, solution):
+        """Store a puzzle's solution, growing the table if it's getting full.
+
+        :param puzzle_string: 81 char puzzle string
+        :param solution: 81 char solution string of the puzzle
+        """
+        key = pack(puzzle_string)
+        with self._lock():
+            # another writer may have replaced the file since it was mapped
+            if os.stat(self.path).st_ino != os.fstat(self._file.fileno()).st_ino:
+                self._open()
+            self.count = HEADER.unpack_from(self._map)[3]
+            offset, found = self._find(key)
+            if found:
+                return
+            if self.count + 1 > self.capacity * MAX_LOAD:
+                self._write_table(self.path, self.capacity * 2, list(self._records()) + [(key, pack(solution))])
+                self._open()
+                return
+            # the solution goes in before the puzzle, so a reader never finds a puzzle without its solution
+            self._map[offset + GRID_SIZE:offset + SLOT_SIZE] = pack(solution)
+            self._map[offset:offset + GRID_SIZE] = key
+            self.count += 1
+            HEADER.pack_into(self._map, 0, MAGIC, VERSION, self.capacity, self.count)
+
+    def _records(self):
+        """Yield the (packed puzzle, packed solution) record of every filled slot."""
+        for offset in range(HEADER.size, HEADER.size + self.capacity * SLOT_SIZE, SLOT_SIZE):
+            key = self._map[offset:offset + GRID_SIZE]
+            if key != EMPTY:
+                yield key, self._map[offset + GRID_SIZE:offset + SLOT_SIZE]
+
+    def items(self):
+        """Yield the (puzzle string, solution string) pair of every puzzle in the store."""
+        for key, solution in self._records():
+            yield unpack(key), unpack(solution)
+
+    def close(self):
+        """Write any changes out, then unmap and close the store file."""
+        if self._map is not None:
+            self._map.flush()
+            self._map.close()
+            self._map = None
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
@@ -0,0 +1,140 @@
+import functools
+import time
+
+import algorithms as alg
+import extra_algorithms as ex
+from puzzle import POPCOUNT
+
+
+def _search(puzzle, prune=None):
+    """Solve puzzle with guess and check, returning the solved puzzle or None."""
+    return alg.guess_and_check(puzzle, prune=prune)
+
+
+# Techniques that can be put in a Pipeline, by name. 'search' always ends the pipeline.
+STRATEGIES = {
+    'hidden_singles': alg.basic_solve,
+    'row_exclusions': ex.find_row_sub_unit_exclusions,
+    'col_exclusions': ex.find_col_sub_unit_exclusions,
+    'block_row_exclusions': ex.find_block_row_sub_unit_exclusions,
+    'block_col_exclusions': ex.find_block_col_sub_unit_exclusions,
+    'search': _search,
+}
+for _size in range(2, 5):
+    STRATEGIES['naked_sets_{}'.format(_size)] = functools.partial(ex.find_preemptive_sets, n=_size)
+    STRATEGIES['hidden_sets_{}'.format(_size)] = functools.partial(ex.find_hidden_sets, n=_size)
+
+DEFAULT_STRATEGIES = ['hidden_singles', 'search']
+
+
+def candidate_count(puzzle):
+    """Return the total number of candidates left in a puzzle. 81 when it's solved."""
+    return sum(POPCOUNT[mask] for mask in puzzle.masks)
+
+
+def _eliminations(puzzle, start):
+    """Return the number of candidates removed by the changes on a puzzle's trail since it was 'start' long.
+
+    Only the cells on that part of the trail are looked at, each from the mask it had when it was first changed.
+    """
+    masks = puzzle.masks
+    first_masks = {}
+    for index, old_mask in puzzle.trail[start:]:
+        first_masks.setdefault(index, old_mask)
+    return sum(POPCOUNT[old_mask] - POPCOUNT[masks[index]] for index, old_mask in first_masks.items())
+
+
+class StrategyStats:
+    """Time spent in and candidates removed by one strategy of a Pipeline."""
+    def __init__(self, name):
+        self.name = name
+        self.calls = 0
+        self.time = 0.0
+        self.eliminations = 0
+
+
+class Pipeline:
+    """An ordered list of solving strategies, run to a fixpoint.
+
+    Strategies are tried in order. Whenever one removes a candidate, the pipeline starts over from the first one,
+    so cheap strategies should come first. When none of them can remove anything, 'search' is run if it's in the
+    list, with the other strategies run to a fixpoint after each of its guesses.
+
+    Changes are recorded on the puzzle's trail while the pipeline runs, so a strategy's eliminations are counted from
+    the cells it changed instead of from every cell of the puzzle.
+    """
+    def __init__(self, strategies=None):
+        """Initialize the pipeline.
+
+        :param strategies: list of strategy names from STRATEGIES, defaults to DEFAULT_STRATEGIES
+        :raise ValueError: on an unknown strategy name
+        """
+        strategies = strategies or DEFAULT_STRATEGIES
+        unknown = [name for name in strategies if name not in STRATEGIES]
+        if unknown:
+            raise ValueError('Unknown strategies: {}'.format(', '.join(unknown)))
+        self.strategies = [name for name in strategies if name != 'search']
+        self.search = 'search' in strategies
+        self.stats = {name: StrategyStats(name) for name in ['clues'] + list(strategies)}
+
+    def _run_strategy(self, name, function, puzzle):
+        """Run one strategy on the puzzle and record its time and eliminations.
+
+        :return: the strategy's result, and the number of candidates it removed
+        """
+        stats = self.stats[name]
+        if puzzle.trail is None:
+            puzzle.checkpoint()
+        start = len(puzzle.trail)
+        t0 = time.perf_counter()
+        try:
+            result = function(puzzle)
+        finally:
+            stats.time += time.perf_counter() - t0
+            stats.calls += 1
+            eliminations = _eliminations(puzzle, start)
+            stats.eliminations += eliminations
+        return result, eliminations
+
+    def propagate(self, puzzle):
+        """Run the pipeline's strategies, except search, until none of them can remove a candidate.
+
+        :param puzzle: Puzzle object
+        :raise SolutionError: if a strategy finds the puzzle can't be solved
+        """
+        candidates = candidate_count(puzzle)
+        strategy_index = 0
+        while strategy_index < len(self.strategies) and candidates > 81:
+            name = self.strategies[strategy_index]
+            _, eliminations = self._run_strategy(name, STRATEGIES[name], puzzle)
+            if eliminations:
+                candidates -= eliminations
+                strategy_index = 0
+            else:
+                strategy_index += 1
+
+    def run(self, puzzle):
+        """Solve puzzle with the pipeline.
+
+        :param puzzle: Puzzle object
+        :return: a solved Puzzle object, None when the puzzle is unsolvable, or the partly solved Puzzle object when
+                 the strategies get stuck
+        :raise SolutionError: if the puzzle is found to be unsolvable
+        """
+        self._run_strategy('clues', alg.update_clue_peers, puzzle)
+        self.propagate(puzzle)
+        if self.search and not puzzle.solved:
+            search = functools.partial(_search, prune=self.propagate if self.strategies else None)
+            return self._run_strategy('search', search, puzzle)[0]
+        return puzzle
+
+    def report(self):
+        """Return a table of each strategy's calls, time and eliminations, in pipeline order.
+
+        Time spent in strategies run after search's guesses is counted both for them and for search.
+        """
+        lines = ['{:<22} {:>8} {:>10} {:>12}'.format('strategy', 'calls', 'time (s)', 'eliminations')]
+        for stats in self.stats.values():
+            lines.append('{:<22} {:>8} {:>10.4f} {:>12}'.format(stats.name, stats.calls, stats.time,
+                                                               stats.eliminations))
+        return '\n'.join(lines)
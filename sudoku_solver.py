@@ -1,7 +1,22 @@
+import sys
 import time
 
 import algorithms as alg
+import board
+import canonical
+import dlx
+import geometry
+import parallel
+import parsing
 import puzzle as pzl
+import store
+import strategies
+import validate
+import vectorized
+
+METHODS = ['guess', 'dlx']
+# printed for a puzzle whose search ran past its --timeout or --max-nodes
+BUDGET_EXCEEDED = 'budget exceeded'
 
 
 class ClueError(Exception):
@@ -16,15 +31,10 @@ def parse_file(file_name):
 
     :param file_name: name of file to check
     """
-    infile = open(file_name)
-    file_contents = infile.read()
-    puzzle_list = [char for char in file_contents if char.isdigit() or char == '.']
-    puzzle_string = ''.join(puzzle_list)
-    if len(puzzle_string) == 81:
-        clues = [char for char in puzzle_string if char != '.' and char != '0']
-        num_clues = len(clues)
+    grid, num_clues = parsing.read_grid(file_name)
+    if grid:
         if num_clues >= 17:
-            return puzzle_string
+            return grid.decode('ascii')
         else:
             raise ClueError(file_name, num_clues)
     else:
@@ -72,26 +82,376 @@ def read_file(file, check):
     return puzzle, file_name
 
 
-def solve(puzzle):
+def solve(puzzle, method='guess', pipeline=None, stats=None, cache=None, timeout=None, max_nodes=None):
     """Solve puzzle.
 
     :param puzzle: Puzzle object
-    :return: None on an unsolvable puzzle, a solved Puzzle object, or an unsolved Puzzle object when there are
-             multiple solutions to the puzzle
+    :param method: 'guess' to find hidden singles and then guess and check,
+                   'dlx' to solve the puzzle as an exact cover problem with Dancing Links
+    :param pipeline: optional strategies.Pipeline to solve the puzzle with instead of the 'guess' method's fixed
+                     order of techniques. Its stats are updated as it runs. Ignored by the 'dlx' method
+    :param stats: optional True, or a puzzle.SolveStats object to add to, to count the guesses, failed branches,
+                  search depth, eliminations and SolutionErrors of the solve
+    :param cache: optional canonical.SolutionCache or store.SolutionStore to look the puzzle up in first, and to add
+                  its solution to
+    :param timeout: optional number of seconds the solve may take, see puzzle.Budget
+    :param max_nodes: optional number of guesses the search may make
+    :return: None on an unsolvable puzzle, a solved Puzzle object, or a puzzle.BudgetExceeded object when the search
+             ran past timeout or max_nodes. The search stops at the first solution it finds, so a puzzle with multiple
+             solutions is returned solved as one of them; use count_solutions() (--unique) to tell them apart.
+             When stats is given, a (result, SolveStats object) tuple, the BudgetExceeded object's stats being the
+             partial counts of the search
     """
+    if stats is True:
+        stats = pzl.SolveStats()
+    puzzle_string = None
+    if cache is not None:
+        puzzle_string = str(puzzle)
+        solution = cache.get(puzzle_string)
+        if solution:
+            puzzle = pzl.Puzzle(solution)
+            return (puzzle, stats) if stats is not None else puzzle
+    puzzle.stats = stats
+    if timeout is not None or max_nodes is not None:
+        puzzle.budget = pzl.Budget(timeout, max_nodes)
     try:
-        alg.update_clue_peers(puzzle)
-        alg.basic_solve(puzzle)
-        if not puzzle.solved:
-            puzzle = alg.guess_and_check(puzzle)
+        if method == 'dlx':
+            puzzle = dlx.solve(puzzle)
+        elif pipeline:
+            puzzle = pipeline.run(puzzle)
+        else:
+            alg.update_clue_peers(puzzle)
+            alg.basic_solve(puzzle)
+            if not puzzle.solved:
+                puzzle = alg.guess_and_check(puzzle)
 
     except pzl.SolutionError:
+        if stats is not None:
+            stats.errors += 1
         puzzle = None
+    except pzl.BudgetExceeded as err:
+        err.stats = stats
+        puzzle = err
 
+    if cache is not None and isinstance(puzzle, pzl.Puzzle) and puzzle.solved:
+        cache.put(puzzle_string, str(puzzle))
+    if stats is not None:
+        return puzzle, stats
     return puzzle
 
 
-def main(infile=None, check=False, quiet=False):
+def parse_line(line):
+    """Return the puzzle string on one line of a batch file, or None if the line doesn't hold one valid puzzle.
+
+    :param line: str or bytes with 81 significant chars, see parsing.parse_grid()
+    """
+    grid, num_clues = parsing.parse_grid(line)
+    if not grid or num_clues < 17:
+        return None
+    return grid.decode('ascii')
+
+
+def batch_puzzle_strings(puzzle_strings):
+    """Yield the puzzle string of every line of a batch file, like parse_line(), skipping blank and comment lines.
+
+    :param puzzle_strings: iterable of strs or bytes holding one puzzle each, or a batch file opened in binary
+                           mode, which is parsed a chunk at a time, see parsing.parse_batch()
+    """
+    for grid, num_clues in parsing.parse_batch(puzzle_strings):
+        yield grid.decode('ascii') if grid and num_clues >= 17 else None
+
+
+def solve_many(puzzle_strings, method='guess', stats=None, cache=None, timeout=None, max_nodes=None):
+    """Solve puzzles one at a time as they are read.
+
+    Blank lines and lines starting with '#' are skipped, so an open batch file can be passed in directly.
+
+    :param puzzle_strings: iterable of strs or bytes holding one puzzle each, or a batch file opened in binary mode
+    :param method: solving engine, see solve()
+    :param stats: optional puzzle.SolveStats object to add every puzzle's counts to
+    :param cache: optional canonical.SolutionCache or store.SolutionStore to look each puzzle string up in before it
+                  is solved, and to add its solution to
+    :param timeout: optional number of seconds each puzzle may take, see solve()
+    :param max_nodes: optional number of guesses each puzzle's search may make
+    :return: generator yielding an 81 char solution string for each puzzle, None when the puzzle is unsolvable
+             or not in a valid format, or a puzzle.BudgetExceeded object when its search ran past its budget
+    """
+    for puzzle_string in batch_puzzle_strings(puzzle_strings):
+        if not puzzle_string:
+            yield None
+            continue
+        if cache is not None:
+            solution = cache.get(puzzle_string)
+            if solution:
+                yield solution
+                continue
+        if stats is not None:
+            puzzle, _ = solve(pzl.Puzzle(puzzle_string), method, stats=stats, timeout=timeout, max_nodes=max_nodes)
+        else:
+            puzzle = solve(pzl.Puzzle(puzzle_string), method, timeout=timeout, max_nodes=max_nodes)
+        if isinstance(puzzle, pzl.BudgetExceeded):
+            yield puzzle
+        elif puzzle and puzzle.solved:
+            if cache is not None:
+                cache.put(puzzle_string, str(puzzle))
+            yield str(puzzle)
+        else:
+            yield None
+
+
+def batch_main(infile, check=False, method='guess', workers=1, ordered=True, vectorize=False, stats=None,
+               cache=None, timeout=None, max_nodes=None):
+    """Solve a batch file with one puzzle per line, printing one line of output for each puzzle as it is solved.
+
+    :param infile: name of the batch file
+    :param check: True to only print whether each puzzle is solvable
+    :param method: solving engine, see solve()
+    :param workers: number of processes to solve puzzles in, see parallel.solve_parallel()
+    :param ordered: False to print results as they finish, prefixed by the puzzle's index, when workers > 1
+    :param vectorize: True to propagate puzzles in batches with NumPy before solving the rest one at a time
+    :param stats: optional puzzle.SolveStats object to add every puzzle's counts to, when workers is 1 and
+                  vectorize is False
+    :param cache: optional canonical.SolutionCache or store.SolutionStore to look puzzles up in, when workers is 1
+                  and vectorize is False
+    :param timeout: optional number of seconds each puzzle may take, when vectorize is False. Puzzles that run
+                    past it, or past max_nodes, are printed as BUDGET_EXCEEDED
+    :param max_nodes: optional number of guesses each puzzle's search may make, when vectorize is False
+    """
+    try:
+        batch_file = open(infile, 'rb')
+    except OSError:
+        print('File {} not found.'.format(infile))
+        return
+
+    with batch_file:
+        if workers > 1:
+            chunk_size = 1024 if vectorize else 64
+            results = parallel.solve_parallel(batch_file, workers, chunk_size, ordered, method, vectorize=vectorize,
+                                              timeout=timeout, max_nodes=max_nodes)
+        elif vectorize:
+            results = enumerate(vectorized.solve_many(batch_file, method))
+        else:
+            results = enumerate(solve_many(batch_file, method, stats, cache, timeout, max_nodes))
+        for index, solution in results:
+            if isinstance(solution, pzl.BudgetExceeded):
+                output = BUDGET_EXCEEDED
+            elif check:
+                output = 'solvable' if solution else 'unsolvable'
+            else:
+                output = solution or 'unsolvable'
+            if ordered:
+                print(output)
+            else:
+                print(index, output)
+
+
+def parallel_main(infiles, workers, check=False, method='guess', timeout=None, max_nodes=None):
+    """Solve puzzle files in a pool of worker processes and print the results in the order the files were given.
+
+    :param infiles: list of file names
+    :param workers: number of worker processes
+    :param check: True to only print whether each puzzle is solvable
+    :param method: solving engine, see solve()
+    :param timeout: optional number of seconds each puzzle may take, see solve()
+    :param max_nodes: optional number of guesses each puzzle's search may make
+    """
+    file_names = []
+    puzzle_strings = []
+    for file_name in infiles:
+        try:
+            puzzle_string = parse_file(file_name)
+        except ClueError as err:
+            print('{} is unsolvable'.format(err.file_name))
+            continue
+        except OSError:
+            print('File {} not found.'.format(file_name))
+            continue
+        if puzzle_string:
+            file_names.append(file_name)
+            puzzle_strings.append(puzzle_string)
+
+    for index, solution in parallel.solve_parallel(puzzle_strings, workers, chunk_size=1, method=method,
+                                                   timeout=timeout, max_nodes=max_nodes):
+        file_name = file_names[index]
+        if isinstance(solution, pzl.BudgetExceeded):
+            print('{}: {}'.format(file_name, solution))
+        elif check:
+            print('{} is {}'.format(file_name, 'solvable' if solution else 'unsolvable'))
+        elif solution:
+            print('{} solved:'.format(file_name))
+            pzl.Puzzle(solution).print_puzzle()
+        else:
+            print('{} doesn\'t have a solution!'.format(file_name))
+
+
+def _solve_board(text, board_geometry, timeout=None, max_nodes=None):
+    """Return the solved board.Board of a puzzle's text, None if it has no solution, or a puzzle.BudgetExceeded
+    object if its search ran past its budget.
+
+    :raise ValueError: if the text doesn't hold a puzzle of the geometry
+    """
+    budget = pzl.Budget(timeout, max_nodes) if timeout is not None or max_nodes is not None else None
+    try:
+        return board.solve(board.Board.from_string(text, board_geometry), budget)
+    except pzl.BudgetExceeded as err:
+        return err
+
+
+def board_main(infiles, board_geometry, check=False, batch=False, timeout=None, max_nodes=None):
+    """Solve puzzles of any geometry with the board engine, see board.Board.
+
+    :param infiles: list of file names
+    :param board_geometry: geometry.Geometry of the puzzles
+    :param check: True to only print whether each puzzle is solvable
+    :param batch: True if the files have one puzzle per line. One line of output is printed for each puzzle
+    :param timeout: optional number of seconds each puzzle may take, see puzzle.Budget
+    :param max_nodes: optional number of guesses each puzzle's search may make
+    """
+    for file_name in infiles:
+        try:
+            puzzle_file = open(file_name)
+        except OSError:
+            print('File {} not found.'.format(file_name))
+            continue
+        with puzzle_file:
+            if batch:
+                # the file is read a line at a time, so a big batch file isn't held in memory
+                for line in parsing.puzzle_lines(puzzle_file):
+                    try:
+                        solution = _solve_board(line, board_geometry, timeout, max_nodes)
+                    except ValueError:
+                        solution = None
+                    if isinstance(solution, pzl.BudgetExceeded):
+                        print(BUDGET_EXCEEDED)
+                    elif check:
+                        print('solvable' if solution else 'unsolvable')
+                    else:
+                        print(solution or 'unsolvable')
+                continue
+            text = puzzle_file.read()
+        try:
+            solution = _solve_board(text, board_geometry, timeout, max_nodes)
+        except ValueError as err:
+            print('{} in incorrect format: {}.\nSee README.md for accepted puzzle formats.'.format(file_name, err))
+            continue
+        if isinstance(solution, pzl.BudgetExceeded):
+            print('{}: {}'.format(file_name, solution))
+        elif check:
+            print('{} is {}'.format(file_name, 'solvable' if solution else 'unsolvable'))
+        elif solution:
+            print('{} solved:'.format(file_name))
+            print(board_geometry.format_grid(solution.masks))
+        else:
+            print('{} doesn\'t have a solution!'.format(file_name))
+
+
+def count_solutions(puzzle, limit=2):
+    """Count the solutions of a puzzle, stopping as soon as 'limit' have been found.
+
+    :param puzzle: Puzzle object, left unchanged
+    :param limit: number of solutions to stop counting at. 2 is enough to tell if a solution is unique
+    :return: number of solutions, at most limit
+    """
+    try:
+        return dlx.count_solutions(puzzle, limit)
+    except pzl.SolutionError:
+        return 0
+
+
+def _uniqueness(puzzle_string):
+    """Return 'unique', 'multiple' or 'unsolvable' for a puzzle string, or 'unsolvable' if it is None."""
+    if not puzzle_string:
+        return 'unsolvable'
+    num_solutions = count_solutions(pzl.Puzzle(puzzle_string))
+    return ['unsolvable', 'unique', 'multiple'][num_solutions]
+
+
+def validate_main(infiles, batch=False):
+    """Print whether each puzzle's clues are consistent, without solving it, see validate.check().
+
+    :param infiles: list of file names
+    :param batch: True if the files have one puzzle per line. One line of output is printed for each puzzle
+    """
+    for file_name in infiles:
+        if batch:
+            try:
+                batch_file = open(file_name, 'rb')
+            except OSError:
+                print('File {} not found.'.format(file_name))
+                continue
+            with batch_file:
+                for grid, _ in parsing.parse_batch(batch_file):
+                    print(validate.check(grid))
+            continue
+        try:
+            grid, _ = parsing.read_grid(file_name)
+        except OSError:
+            print('File {} not found.'.format(file_name))
+            continue
+        print('{}: {}'.format(file_name, validate.check(grid)))
+
+
+def verify_main(infiles):
+    """Check that every line of solutions files is a valid solved grid, see validate.check_lines().
+
+    Prints the number of grids and of invalid ones in each file, and the index of each invalid grid, counting from 0
+    and skipping blank and comment lines.
+
+    :param infiles: list of file names
+    :return: True if every grid of every file was valid
+    """
+    all_valid = True
+    for file_name in infiles:
+        try:
+            solutions_file = open(file_name, 'rb')
+        except OSError:
+            print('File {} not found.'.format(file_name))
+            all_valid = False
+            continue
+        num_grids = 0
+        invalid = []
+        with solutions_file:
+            for index, valid in enumerate(validate.check_lines(solutions_file)):
+                if not valid:
+                    invalid.append(index)
+                num_grids = index + 1
+        for index in invalid:
+            print('{}: grid {} is invalid'.format(file_name, index))
+        print('{}: {} grids, {} invalid'.format(file_name, num_grids, len(invalid)))
+        all_valid = all_valid and not invalid
+    return all_valid
+
+
+def unique_main(infiles, batch=False):
+    """Print whether each puzzle has a unique solution, multiple solutions or none.
+
+    :param infiles: list of file names
+    :param batch: True if the files have one puzzle per line
+    """
+    for file_name in infiles:
+        if batch:
+            try:
+                batch_file = open(file_name, 'rb')
+            except OSError:
+                print('File {} not found.'.format(file_name))
+                continue
+            with batch_file:
+                for puzzle_string in batch_puzzle_strings(batch_file):
+                    print(_uniqueness(puzzle_string))
+            continue
+        try:
+            puzzle_string = parse_file(file_name)
+        except ClueError as err:
+            print('{}: unsolvable'.format(err.file_name))
+            continue
+        except OSError:
+            print('File {} not found.'.format(file_name))
+            continue
+        print('{}: {}'.format(file_name, _uniqueness(puzzle_string)))
+
+
+def main(infile=None, check=False, quiet=False, method='guess', strategy_names=None, show_stats=False, cache=None,
+         timeout=None, max_nodes=None):
     puzzle, file_name = read_file(infile, check)
     if not puzzle:
         return  # user either quit program or the puzzle had less than 17 clues and the --check flag was passed.
@@ -103,7 +463,11 @@ def main(infile=None, check=False, quiet=False):
 
     t0 = time.time()
 
-    puzzle = solve(puzzle)
+    pipeline = strategies.Pipeline(strategy_names) if strategy_names else None
+    if show_stats:
+        puzzle, stats = solve(puzzle, method, pipeline, stats=True, cache=cache, timeout=timeout, max_nodes=max_nodes)
+    else:
+        puzzle, stats = solve(puzzle, method, pipeline, cache=cache, timeout=timeout, max_nodes=max_nodes), None
 
     if quiet:
         return
@@ -111,19 +475,33 @@ def main(infile=None, check=False, quiet=False):
     t1 = time.time()
     total_time = t1 - t0
 
-    if puzzle and puzzle.solved:
+    if isinstance(puzzle, pzl.BudgetExceeded):
+        if not check:
+            print('Gave up on the puzzle: {}'.format(puzzle))
+        else:
+            print('{}: {}'.format(file_name, puzzle))
+    elif puzzle and puzzle.solved:
         if not check:
             print('Solved puzzle:')
             puzzle.print_puzzle()
             print('Time to solve: {0:.4f}'.format(total_time))
+            if pipeline:
+                print(pipeline.report())
         else:
             print('{} is solvable'.format(file_name))
+    elif puzzle and pipeline and not check:
+        print('The strategies got stuck. Partly solved puzzle:')
+        puzzle.print_puzzle()
+        print('Time to get stuck: {0:.4f}'.format(total_time))
+        print(pipeline.report())
     else:
         if not check:
             print('This puzzle doesn\'t have a solution!')
             print('Time it took to realize this: {0:.4f}'.format(total_time))
         else:
             print('{} is unsolvable'.format(file_name))
+    if stats is not None:
+        print(stats.report())
 
 
 if __name__ == '__main__':
@@ -132,9 +510,136 @@ if __name__ == '__main__':
     parser = argparse.ArgumentParser()
     parser.add_argument('input', nargs='*', help='File(s) with sudoku puzzle')
     parser.add_argument('-c', '--check', action='store_true', help='Only check if the puzzle(s) are solvable')
+    parser.add_argument('-m', '--method', choices=METHODS, default='guess',
+                        help='Solving engine, guess and check or Dancing Links, defaults to guess')
+    parser.add_argument('-b', '--batch', action='store_true',
+                        help='Input file(s) have one puzzle per line. Print one solution per line')
+    parser.add_argument('-w', '--workers', type=int, default=1,
+                        help='Number of processes to solve puzzles in, defaults to 1')
+    parser.add_argument('-u', '--unordered', action='store_true',
+                        help='With --batch and --workers, print results as they finish, prefixed by their index')
+    parser.add_argument('-V', '--vectorize', action='store_true',
+                        help='With --batch, propagate puzzles in batches with NumPy before solving the rest')
+    parser.add_argument('--unique', action='store_true',
+                        help='Only check if the puzzle(s) have exactly one solution')
+    parser.add_argument('--validate', action='store_true',
+                        help='Only check that no row, column or block of the puzzle(s) repeats a value, without '
+                             'solving. Prints valid, invalid or solved for each puzzle')
+    parser.add_argument('--verify', action='store_true',
+                        help='Input file(s) hold solved grids, one per line. Print how many are valid solutions and '
+                             'which aren\'t, and exit with status 1 if any aren\'t')
+    parser.add_argument('--stats', action='store_true',
+                        help='Print the number of guesses, failed branches, search depth, eliminations per technique '
+                             'and SolutionErrors of the solve. With --batch, totals for each file')
+    parser.add_argument('--cache', type=int, default=0, metavar='SIZE',
+                        help='Cache up to SIZE solutions, so puzzles that are symmetries of an earlier one are looked '
+                             'up instead of solved. Hits and misses are printed to stderr at the end')
+    parser.add_argument('--store', metavar='FILE',
+                        help='Look puzzles up in a solution store file before solving them, and add the solutions of '
+                             'the ones that weren\'t there. The file is created if it doesn\'t exist')
+    parser.add_argument('-s', '--strategies', type=lambda names: names.split(','),
+                        help='Comma separated list of techniques to solve with, in order, and print the time and '
+                             'eliminations of each. Choose from: {}'.format(', '.join(strategies.STRATEGIES)))
+    parser.add_argument('--box', type=geometry.parse_box, metavar='RxC',
+                        help='Solve puzzles with boxes of R rows and C columns, e.g. 2x3 for 6x6 or 5x5 for 25x25, or '
+                             'give the board size, e.g. 16, for the most nearly square boxes')
+    parser.add_argument('--alphabet',
+                        help='With --box, the chars of the values in order, defaults to 1-9 then A-Z')
+    parser.add_argument('-t', '--timeout', type=float,
+                        help='Seconds each puzzle\'s solve may take before its search is given up on')
+    parser.add_argument('--max-nodes', type=int,
+                        help='Number of guesses each puzzle\'s search may make before it is given up on')
     arguments = parser.parse_args()
-    if arguments.input:
+    if arguments.workers < 1:
+        parser.error('workers must be greater than 0')
+    if arguments.vectorize and vectorized.np is None:
+        parser.error('--vectorize requires numpy')
+    if arguments.stats and (arguments.unique or arguments.workers > 1 or arguments.vectorize):
+        parser.error('--stats can\'t be combined with --unique, --workers or --vectorize')
+    if arguments.cache < 0:
+        parser.error('cache size can\'t be negative')
+    if (arguments.cache or arguments.store) and (arguments.unique or arguments.workers > 1 or arguments.vectorize):
+        parser.error('--cache and --store can\'t be combined with --unique, --workers or --vectorize')
+    if arguments.cache and arguments.store:
+        parser.error('--cache and --store can\'t be combined')
+    if arguments.strategies:
+        if arguments.method != 'guess':
+            parser.error('--strategies can\'t be combined with --method {}'.format(arguments.method))
+        try:
+            strategies.Pipeline(arguments.strategies)
+        except ValueError as err:
+            parser.error(str(err))
+    if arguments.timeout is not None and arguments.timeout <= 0:
+        parser.error('timeout must be greater than 0')
+    if arguments.max_nodes is not None and arguments.max_nodes < 0:
+        parser.error('max-nodes can\'t be negative')
+    if (arguments.timeout is not None or arguments.max_nodes is not None) and (arguments.unique or arguments.vectorize):
+        parser.error('--timeout and --max-nodes can\'t be combined with --unique or --vectorize')
+    if arguments.validate or arguments.verify:
+        if (arguments.validate and arguments.verify or arguments.check or arguments.method != 'guess'
+                or arguments.workers > 1 or arguments.unordered or arguments.vectorize or arguments.unique
+                or arguments.stats or arguments.cache or arguments.store or arguments.strategies or arguments.box
+                or arguments.timeout is not None or arguments.max_nodes is not None
+                or arguments.verify and arguments.batch):
+            parser.error('--validate can only be combined with --batch, and --verify with nothing else')
+        if not arguments.input:
+            parser.error('--validate and --verify require at least one input file')
+    board_geometry = None
+    if arguments.alphabet and not arguments.box:
+        parser.error('--alphabet requires --box')
+    if arguments.box:
+        if (arguments.method != 'guess' or arguments.workers > 1 or arguments.vectorize or arguments.unique
+                or arguments.stats or arguments.cache or arguments.store or arguments.strategies):
+            parser.error('--box can only be combined with --check, --batch, --timeout and --max-nodes')
+        if not arguments.input:
+            parser.error('--box requires at least one input file')
+        try:
+            board_geometry = geometry.Geometry(*arguments.box, alphabet=arguments.alphabet)
+        except ValueError as err:
+            parser.error(str(err))
+    solution_cache = None
+    if arguments.cache:
+        solution_cache = canonical.SolutionCache(arguments.cache)
+    elif arguments.store:
+        try:
+            solution_cache = store.SolutionStore(arguments.store)
+        except (OSError, ValueError) as err:
+            parser.error(str(err))
+    if arguments.validate:
+        validate_main(arguments.input, arguments.batch)
+    elif arguments.verify:
+        if not verify_main(arguments.input):
+            sys.exit(1)
+    elif board_geometry:
+        board_main(arguments.input, board_geometry, arguments.check, arguments.batch, arguments.timeout,
+                   arguments.max_nodes)
+    elif arguments.unique:
+        if not arguments.input:
+            parser.error('--unique requires at least one input file')
+        unique_main(arguments.input, arguments.batch)
+    elif arguments.batch:
+        if not arguments.input:
+            parser.error('--batch requires at least one input file')
+        for input_file in arguments.input:
+            batch_stats = pzl.SolveStats() if arguments.stats else None
+            batch_main(input_file, arguments.check, arguments.method, arguments.workers, not arguments.unordered,
+                       arguments.vectorize, batch_stats, solution_cache, arguments.timeout, arguments.max_nodes)
+            if batch_stats is not None:
+                print(batch_stats.report())
+    elif arguments.input and arguments.workers > 1:
+        parallel_main(arguments.input, arguments.workers, arguments.check, arguments.method, arguments.timeout,
+                      arguments.max_nodes)
+    elif arguments.input:
         for input_file in arguments.input:
-            main(input_file, arguments.check)
+            main(input_file, arguments.check, method=arguments.method, strategy_names=arguments.strategies,
+                 show_stats=arguments.stats, cache=solution_cache, timeout=arguments.timeout,
+                 max_nodes=arguments.max_nodes)
     else:
-        main(check=arguments.check)
+        main(check=arguments.check, method=arguments.method, strategy_names=arguments.strategies,
+             show_stats=arguments.stats, cache=solution_cache, timeout=arguments.timeout,
+             max_nodes=arguments.max_nodes)
+    if arguments.cache:
+        print('Solution cache: {} hits, {} misses'.format(solution_cache.hits, solution_cache.misses),
+              file=sys.stderr)
+    elif solution_cache is not None:
+        solution_cache.close()
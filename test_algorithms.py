@@ -0,0 +1,28 @@
+import unittest
+
+import puzzle as pzl
+import sudoku_solver
+
+# needs several guesses, with either method
+HARD = '7.....4...2..7..8...3..8.799..5..3...6..2..9...1.97..6...3..9...3..4..6...9..1.35'
+
+
+class SearchStatsTest(unittest.TestCase):
+    def test_depth_after_budget_exceeded(self):
+        for method in sudoku_solver.METHODS:
+            with self.subTest(method):
+                result, stats = sudoku_solver.solve(pzl.Puzzle(HARD), method, stats=True, max_nodes=1)
+                self.assertIsInstance(result, pzl.BudgetExceeded)
+                self.assertGreater(stats.max_depth, 0)
+                self.assertEqual(stats.depth, 0)
+
+    def test_depth_after_solve(self):
+        for method in sudoku_solver.METHODS:
+            with self.subTest(method):
+                result, stats = sudoku_solver.solve(pzl.Puzzle(HARD), method, stats=True)
+                self.assertTrue(result.solved)
+                self.assertEqual(stats.depth, 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
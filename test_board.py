@@ -0,0 +1,51 @@
+import random
+import unittest
+
+import board
+import geometry
+import puzzle as pzl
+
+
+def random_puzzle(board_geometry, empty, rng):
+    """Return the text of a puzzle made by shuffling a full board of the geometry and emptying each of its cells
+    with probability 'empty'."""
+    size, box_rows, box_cols = board_geometry.size, board_geometry.box_rows, board_geometry.box_cols
+    # rows and columns shuffled within their bands and stacks, and the bands, stacks and values shuffled too
+    rows = [band * box_rows + row for band in rng.sample(range(box_cols), box_cols)
+            for row in rng.sample(range(box_rows), box_rows)]
+    cols = [stack * box_cols + col for stack in rng.sample(range(box_rows), box_rows)
+            for col in rng.sample(range(box_cols), box_cols)]
+    values = rng.sample(board_geometry.alphabet, size)
+    cells = [values[(box_cols * (row % box_rows) + row // box_rows + col) % size] for row in rows for col in cols]
+    return ''.join('.' if rng.random() < empty else value for value in cells)
+
+
+class SolveTest(unittest.TestCase):
+    def assert_solves(self, size, empty, seed):
+        board_geometry = geometry.Geometry.of_size(size)
+        text = random_puzzle(board_geometry, empty, random.Random(seed))
+        solution = board.solve(board.Board.from_string(text, board_geometry), pzl.Budget(60))
+        self.assertIsNotNone(solution)
+        self.assertTrue(solution.solved)
+        for clue, value in zip(text, str(solution)):
+            if clue != '.':
+                self.assertEqual(clue, value)
+
+    def test_16x16(self):
+        self.assert_solves(16, 0.55, 16)
+
+    def test_25x25(self):
+        self.assert_solves(25, 0.45, 25)
+
+    def test_unsolvable(self):
+        board_geometry = geometry.Geometry.of_size(16)
+        text = random_puzzle(board_geometry, 0.5, random.Random(16))
+        clue = next(index for index, char in enumerate(text) if char != '.')
+        # a clue repeated in the next empty cell of its row
+        empty = next(index for index in range(clue, clue + 16 - clue % 16) if text[index] == '.')
+        text = text[:empty] + text[clue] + text[empty + 1:]
+        self.assertIsNone(board.solve(board.Board.from_string(text, board_geometry)))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,41 @@
+import asyncio
+import unittest
+from unittest import mock
+
+import server
+
+HARD = b'7.....4...2..7..8...3..8.799..5..3...6..2..9...1.97..6...3..9...3..4..6...9..1.35'
+
+
+class SolveServerTest(unittest.TestCase):
+    # asyncio.run() rather than IsolatedAsyncioTestCase, whose debug mode slows the server down enough that
+    # puzzles never queue up
+    def test_queued_puzzles_dont_time_out(self):
+        count = 400
+        responses = asyncio.run(self._send_puzzles(HARD, count))
+        self.assertEqual(len(responses), count)
+        self.assertNotIn(server.TIMEOUT.encode('ascii'), {result for _, result in responses})
+
+    @staticmethod
+    async def _send_puzzles(puzzle, count):
+        """Send a puzzle 'count' times at once to a server with fewer workers, a short timeout and every puzzle
+        read at once, and return the split response lines."""
+        solve_server = server.SolveServer(workers=2, connection_limit=count)
+        address = (await solve_server.start())[0]
+        try:
+            # start the workers before the timeout is shortened, so their start up isn't counted
+            await asyncio.gather(*[solve_server.solve(puzzle.decode('ascii')) for _ in range(solve_server.workers)])
+            solve_server.timeout = 0.1
+            with mock.patch.object(server, 'GRACE', 0.1):
+                reader, writer = await asyncio.open_connection(*address)
+                writer.write((puzzle + b'\n') * count)
+                writer.write_eof()
+                responses = [line.split() async for line in reader]
+                writer.close()
+            return responses
+        finally:
+            await solve_server.close()
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,41 @@
+import io
+import unittest
+
+import parsing
+import validate
+
+SOLUTION = b'987654321246173985351928746128537694634892157795461832519286473472319568863745219'
+# a valid solution, and one with a repeated value in its last row
+GRIDS = SOLUTION + b'\n' + SOLUTION[:80] + b'1' + b'\n'
+
+# Buffers that are a multiple of 82 bytes long, with a newline every 82 bytes, but aren't all 81 char grid lines
+BUFFERS = {
+    'blank lines': b'\n' * 82,
+    'short lines': (b'1' * 40 + b'\n') * 2,
+    'comment line': b'#' + b' ' * 80 + b'\n' + SOLUTION + b'\n',
+    'whitespace line': b' ' * 81 + b'\n' + SOLUTION + b'\n',
+    'grid lines': GRIDS,
+}
+
+
+class CheckBufferTest(unittest.TestCase):
+    def test_matches_parsed_lines(self):
+        for name, data in BUFFERS.items():
+            grids = [grid for grid, _ in parsing.parse_lines(data)]
+            for solved in (True, False):
+                with self.subTest(name, solved=solved):
+                    self.assertEqual(validate._check_buffer(data, solved), validate.check_grids(grids, solved))
+
+    def test_grid_counts(self):
+        counts = {'blank lines': 0, 'short lines': 2, 'comment line': 1, 'whitespace line': 1, 'grid lines': 2}
+        for name, data in BUFFERS.items():
+            with self.subTest(name):
+                results = list(validate.check_lines(io.BufferedReader(io.BytesIO(data))))
+                self.assertEqual(len(results), counts[name])
+
+    def test_grid_lines(self):
+        self.assertEqual(validate._check_buffer(GRIDS, True), [True, False])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,194 @@
+import io
+import itertools
+
+import parsing
+import puzzle as pzl
+
+# numpy is only needed to check many grids at once, so single grids are checked without it
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+# Results of check()
+INVALID = 'invalid'
+VALID = 'valid'
+SOLVED = 'solved'
+# Candidate mask of each byte of a grid, 0 for anything but 1-9
+_BYTE_MASKS = [0] * 256
+for _digit, _mask in pzl.DIGIT_MASKS.items():
+    _BYTE_MASKS[ord(_digit)] = _mask
+# (row, column, block) unit of each cell, numbered 0-8 within their kind
+_CELL_UNITS = [(row, col, row // 3 * 3 + col // 3) for row in range(9) for col in range(9)]
+# number of grids checked at once by check_lines()
+BATCH_SIZE = 1 << 16
+# length of a batch file line holding nothing but a grid
+_LINE = 82
+_NEWLINE = ord('\n')
+
+# Value of each byte of a grid for the checks of many grids at once. Bits 0-8 are a digit's mask, _FILLED counts
+# the unit's digits, and any byte that isn't a puzzle char gets _FOREIGN, which no valid unit's sum reaches
+_FILLED = 1 << 10
+_FOREIGN = 1 << 14
+_CELL_VALUES = [mask + _FILLED if mask else 0 if char in parsing.PUZZLE_CHARS else _FOREIGN
+                for char, mask in enumerate(_BYTE_MASKS)]
+
+if np is not None:
+    # as floats, so the values of every unit of many grids can be summed with one matrix product, which is exact
+    # for sums this small
+    _NP_CELL_VALUES = np.array(_CELL_VALUES, dtype=np.float32)
+    # _INCIDENCE[cell, unit] is 1 when the cell is in the unit
+    _INCIDENCE = np.zeros((81, 27), dtype=np.float32)
+    for _unit_index, _unit in enumerate(pzl.UNITS):
+        _INCIDENCE[_unit, _unit_index] = 1
+    # whether each sum of 9 cell values is a unit without a repeated value
+    _CONSISTENT_SUMS = np.array([total < _FOREIGN and bin(total % _FILLED).count('1') == total // _FILLED
+                                 for total in range(9 * _FOREIGN + 1)], dtype=bool)
+    # sum of a complete unit
+    _SOLVED_SUM = pzl.ALL_CANDIDATES + 9 * _FILLED
+    # whether each byte is a puzzle char
+    _PUZZLE_BYTES = np.zeros(256, dtype=bool)
+    _PUZZLE_BYTES[list(parsing.PUZZLE_CHARS)] = True
+
+
+def _as_bytes(grid):
+    return grid.encode('ascii', 'replace') if isinstance(grid, str) else grid
+
+
+def consistent(grid):
+    """Return True if no row, column or block of a grid repeats a value.
+
+    The values seen in each of the cell's units are accumulated as bitmasks in one pass over the cells, so a grid
+    is checked without building a Puzzle.
+
+    :param grid: 81 char str or 81 bytes, with anything but 1-9 for unknown cells, e.g. from parsing.parse_grid()
+    """
+    rows = [0] * 9
+    cols = [0] * 9
+    blocks = [0] * 9
+    byte_masks = _BYTE_MASKS
+    for char, (row, col, block) in zip(_as_bytes(grid), _CELL_UNITS):
+        mask = byte_masks[char]
+        if (rows[row] | cols[col] | blocks[block]) & mask:
+            return False
+        rows[row] |= mask
+        cols[col] |= mask
+        blocks[block] |= mask
+    return True
+
+
+def is_solution(grid, puzzle_grid=None):
+    """Return True if a grid is a valid solution: every cell is 1-9 and no unit repeats a value.
+
+    :param grid: 81 char str or 81 bytes
+    :param puzzle_grid: optional puzzle the grid should solve, as 81 chars or bytes. Its clues have to match the grid
+    """
+    grid = _as_bytes(grid)
+    if len(grid) != 81 or grid.strip(b'123456789'):
+        return False
+    if puzzle_grid is not None:
+        for char, clue in zip(grid, _as_bytes(puzzle_grid)):
+            if _BYTE_MASKS[clue] and clue != char:
+                return False
+    return consistent(grid)
+
+
+def check(grid):
+    """Return SOLVED for a valid solution, VALID for a grid with unknown cells and no repeated values in a unit,
+    or INVALID.
+
+    :param grid: 81 char str or 81 bytes, or None for a line that didn't hold a grid
+    """
+    if grid is None or len(grid) != 81 or not consistent(grid):
+        return INVALID
+    return VALID if _as_bytes(grid).strip(b'123456789') else SOLVED
+
+
+def _check_cells(cells, solved):
+    """Check an (N, 81) uint8 array of grid bytes, see check_grids().
+
+    The digits' masks in a unit are distinct powers of two exactly when their sum has as many set bits as the unit
+    has digits, since a repeated value carries into another bit. Both are read off the sum of the unit's
+    _CELL_VALUES. A unit is complete when the masks' sum is all 9 bits.
+
+    :return: (N,) bool array
+    """
+    sums = _NP_CELL_VALUES[cells] @ _INCIDENCE
+    if solved:
+        return (sums == _SOLVED_SUM).all(axis=1)
+    return _CONSISTENT_SUMS[sums.astype(np.intp)].all(axis=1)
+
+
+def check_grids(grids, solved=False):
+    """Check a list of grids at once.
+
+    With numpy, the masks of every unit of every grid are summed with one matrix product, see _check_cells().
+    Without it, the grids are checked one at a time with consistent() or is_solution().
+
+    :param grids: list of 81 byte grids, None for a line that didn't hold one, e.g. from parsing.parse_lines()
+    :param solved: True to check that each grid is a valid solution, False that it's consistent
+    :return: list of True or False for each grid
+    """
+    if np is None:
+        checker = is_solution if solved else consistent
+        return [grid is not None and len(grid) == 81 and checker(grid) for grid in grids]
+    parsed = np.array([grid is not None and len(grid) == 81 for grid in grids], dtype=bool)
+    if parsed.all():
+        data = b''.join(grids)
+    else:
+        blank = b'.' * 81
+        data = b''.join(grid if ok else blank for grid, ok in zip(grids, parsed))
+    cells = np.frombuffer(data, dtype=np.uint8).reshape(-1, 81)
+    return (_check_cells(cells, solved) & parsed).tolist()
+
+
+def _check_buffer(data, solved):
+    """Check the grids of a buffer of whole batch file lines.
+
+    A buffer of nothing but lines of 81 puzzle chars, the usual solutions file, is checked as one array without
+    being split into lines. Anything else, including blank, comment and shorter lines that happen to add up to a
+    multiple of 82 bytes, is parsed first, see parsing.parse_lines().
+
+    :return: list of True or False for each grid
+    """
+    if np is not None and len(data) % _LINE == 0:
+        lines = np.frombuffer(data, dtype=np.uint8).reshape(-1, _LINE)
+        cells = lines[:, :81]
+        if (lines[:, 81] == _NEWLINE).all() and _PUZZLE_BYTES[cells].all():
+            return _check_cells(cells, solved).tolist()
+    return check_grids([grid for grid, _ in parsing.parse_lines(data)], solved)
+
+
+def check_lines(source, solved=True, batch_size=BATCH_SIZE):
+    """Check every grid of a batch file, about 'batch_size' grids at a time.
+
+    Blank lines and lines starting with '#' are skipped, and a line that doesn't hold a grid fails the check.
+
+    :param source: file opened in binary mode, which is read in chunks, or any iterable of bytes or strs holding one
+                   grid each, see parsing.parse_batch()
+    :param solved: True to check that each grid is a valid solution, False that it's consistent
+    :param batch_size: number of grids checked at once
+    :return: generator yielding True or False for each grid
+    """
+    if isinstance(source, io.BufferedIOBase):
+        rest = b''
+        while True:
+            chunk = source.read(batch_size * _LINE)
+            if not chunk:
+                break
+            # a line cut off at the end of the chunk is checked with the next one
+            end = chunk.rfind(b'\n') + 1
+            if not end:
+                rest += chunk
+                continue
+            yield from _check_buffer(rest + chunk[:end], solved)
+            rest = chunk[end:]
+        if rest:
+            yield from _check_buffer(rest, solved)
+        return
+    grids = (grid for grid, _ in parsing.parse_batch(source))
+    while True:
+        batch = list(itertools.islice(grids, batch_size))
+        if not batch:
+            return
+        yield from check_grids(batch, solved)
@@ -0,0 +1,148 @@
+import itertools
+
+import puzzle as pzl
+import sudoku_solver
+
+# numpy is only needed for vectorized solving, so the rest of the solver works without it
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+if np is not None:
+    _POPCOUNT = np.array(pzl.POPCOUNT, dtype=np.uint8)
+    _UNITS = np.array(pzl.UNITS, dtype=np.intp)
+    _PEERS = np.array(pzl.PEERS, dtype=np.intp)
+    _CELL_UNITS = np.array(pzl.CELL_UNITS, dtype=np.intp)
+    # char code of every candidate mask, '.' for masks that aren't a single value
+    _MASK_CHARS = np.array([ord(pzl.MASK_DIGITS[mask]) if pzl.POPCOUNT[mask] == 1 else ord('.')
+                            for mask in range(pzl.ALL_CANDIDATES + 1)], dtype=np.uint8)
+    # candidate mask of every char code, all candidates for anything but 1-9
+    _CHAR_MASKS = np.full(256, pzl.ALL_CANDIDATES, dtype=np.uint16)
+    for _digit, _mask in pzl.DIGIT_MASKS.items():
+        _CHAR_MASKS[ord(_digit)] = _mask
+
+
+def _require_numpy():
+    if np is None:
+        raise ImportError('vectorized solving requires numpy. Install it with "pip install numpy".')
+
+
+def masks_from_strings(puzzle_strings):
+    """Return an (N, 81) uint16 array of candidate masks for a list of N 81 char puzzle strings."""
+    _require_numpy()
+    chars = np.frombuffer(''.join(puzzle_strings).encode('ascii'), dtype=np.uint8)
+    return _CHAR_MASKS[chars].reshape(-1, 81)
+
+
+def strings_from_masks(masks):
+    """Return a list of 81 char puzzle strings for an (N, 81) array of candidate masks, '.' for unsolved cells."""
+    _require_numpy()
+    text = _MASK_CHARS[masks].tobytes().decode('ascii')
+    return [text[start:start + 81] for start in range(0, len(text), 81)]
+
+
+def _find_invalid(masks):
+    """Return a bool array of the puzzles in a batch that can't be solved from their current candidates.
+
+    A puzzle is invalid if a cell has no candidates, a unit has a value with nowhere to go, or two solved cells in a
+    unit share a value.
+    """
+    unit_masks = masks[:, _UNITS]
+    invalid = (masks == 0).any(axis=1)
+    invalid |= (np.bitwise_or.reduce(unit_masks, axis=2) != pzl.ALL_CANDIDATES).any(axis=1)
+    solved_masks = np.where(_POPCOUNT[unit_masks] == 1, unit_masks, 0)
+    num_solved = (solved_masks != 0).sum(axis=2)
+    invalid |= (_POPCOUNT[np.bitwise_or.reduce(solved_masks, axis=2)] != num_solved).any(axis=1)
+    return invalid
+
+
+def propagate(masks, max_passes=81):
+    """Remove solved values from their peers and solve hidden singles in every puzzle of a batch, until nothing
+    changes.
+
+    This is the logic of algorithms.update_peers() and algorithms.find_hidden_singles(), applied to every cell of
+    every puzzle at once.
+
+    :param masks: (N, 81) uint16 array of candidate masks, updated in place
+    :param max_passes: limit on the number of passes
+    :return: bool array of the puzzles found to be invalid. Their masks are left as they were when that was found
+    """
+    _require_numpy()
+    invalid = np.zeros(len(masks), dtype=bool)
+    for _ in range(max_passes):
+        active = ~invalid
+        old_masks = masks.copy()
+
+        # peer elimination: every unsolved cell loses the values of its solved peers
+        solved = _POPCOUNT[masks] == 1
+        solved_vals = np.where(solved, masks, 0).astype(np.uint16)
+        peer_vals = np.bitwise_or.reduce(solved_vals[:, _PEERS], axis=2)
+        masks[active] = np.where(solved, masks, masks & ~peer_vals)[active]
+
+        # hidden singles: values with only one place left in a unit
+        unit_masks = masks[:, _UNITS]
+        seen_once = np.zeros(unit_masks.shape[:2], dtype=np.uint16)
+        seen_twice = np.zeros_like(seen_once)
+        for position in range(9):
+            cell_masks = unit_masks[:, :, position]
+            seen_twice |= seen_once & cell_masks
+            seen_once |= cell_masks
+        singles = seen_once & ~seen_twice
+        cell_singles = np.bitwise_or.reduce(singles[:, _CELL_UNITS] & masks[:, :, np.newaxis], axis=2)
+        # a cell that is the only place for two values can't be both
+        invalid |= (_POPCOUNT[cell_singles] > 1).any(axis=1)
+        active = ~invalid
+        masks[active] = np.where(cell_singles != 0, cell_singles, masks)[active]
+
+        invalid |= _find_invalid(masks)
+        masks[invalid] = old_masks[invalid]
+        if np.array_equal(masks, old_masks):
+            break
+    return invalid
+
+
+def solve_batch(puzzle_strings, method='guess'):
+    """Solve a list of valid 81 char puzzle strings, propagating all of them at once first.
+
+    Only the puzzles that propagation leaves unsolved are handed to sudoku_solver.solve() one at a time.
+
+    :param puzzle_strings: list of 81 char puzzle strings, see sudoku_solver.parse_line()
+    :param method: solving engine for the puzzles propagation can't solve, see sudoku_solver.solve()
+    :return: list with an 81 char solution string for each puzzle, or None when it is unsolvable
+    """
+    if not puzzle_strings:
+        return []
+    masks = masks_from_strings(puzzle_strings)
+    invalid = propagate(masks)
+    solved = (_POPCOUNT[masks] == 1).all(axis=1) & ~invalid
+    solutions = []
+    for partial, is_invalid, is_solved in zip(strings_from_masks(masks), invalid, solved):
+        if is_invalid:
+            solutions.append(None)
+        elif is_solved:
+            solutions.append(partial)
+        else:
+            puzzle = sudoku_solver.solve(pzl.Puzzle(partial), method)
+            solutions.append(str(puzzle) if puzzle and puzzle.solved else None)
+    return solutions
+
+
+def solve_many(puzzle_strings, method='guess', batch_size=4096):
+    """Solve puzzles like sudoku_solver.solve_many(), but propagate them 'batch_size' at a time with NumPy.
+
+    :param puzzle_strings: iterable of strs or bytes holding one puzzle each, or a batch file opened in binary mode
+    :param method: solving engine for the puzzles propagation can't solve, see sudoku_solver.solve()
+    :param batch_size: number of puzzles read and propagated at once
+    :return: generator yielding an 81 char solution string for each puzzle, or None when the puzzle is unsolvable
+             or not in a valid format
+    """
+    _require_numpy()
+    puzzles = sudoku_solver.batch_puzzle_strings(puzzle_strings)
+    while True:
+        batch = list(itertools.islice(puzzles, batch_size))
+        if not batch:
+            return
+        solutions = iter(solve_batch([puzzle_string for puzzle_string in batch if puzzle_string], method))
+        for puzzle_string in batch:
+            yield next(solutions) if puzzle_string else None